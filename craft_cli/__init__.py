@@ -20,18 +20,40 @@ __version__ = "0.1.0"
 
 # names included here only to be exposed as external API; the particular order of imports
 # is to break cyclic dependencies
-from .messages import EmitterMode, emit  # noqa: F401 ; isort:skip
-from .dispatcher import BaseCommand, CommandGroup, Dispatcher, GlobalArgument  # noqa: F401
-from .errors import ArgumentParsingError, CraftError, ProvideHelpException  # noqa: F401
+from .messages import EmitterMode, RunResult, emit  # noqa: F401 ; isort:skip
+from .dispatcher import (  # noqa: F401
+    BaseCommand,
+    BatchResult,
+    CommandArgument,
+    CommandGroup,
+    Dispatcher,
+    GlobalArgument,
+    LazyCommand,
+)
+from .errors import (  # noqa: F401
+    ArgumentParsingError,
+    CraftError,
+    ProvideExportException,
+    ProvideHelpException,
+)
+from .sinks import LogSink, SinkRecord, SyslogSink  # noqa: F401
 
 __all__ = [
     "ArgumentParsingError",
     "BaseCommand",
+    "BatchResult",
+    "CommandArgument",
     "CommandGroup",
     "CraftError",
     "Dispatcher",
     "EmitterMode",
     "GlobalArgument",
+    "LazyCommand",
+    "LogSink",
+    "ProvideExportException",
     "ProvideHelpException",
+    "RunResult",
+    "SinkRecord",
+    "SyslogSink",
     "emit",
 ]
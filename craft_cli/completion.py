@@ -0,0 +1,234 @@
+#
+# Copyright 2022 Canonical Ltd.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+"""Shell completion support.
+
+The completion table (global options, commands, and each command's options) is derived
+from the Dispatcher, which implies instantiating every command and filling its parser, so
+it's persisted in a cache file that is only regenerated when the application version or
+the set of commands change.
+
+The produced shell scripts have the table embedded, so the completion itself (on each
+TAB press) is resolved by the shell, without running the application at all.
+"""
+
+__all__ = [
+    "get_completion_script",
+    "get_completion_table",
+]
+
+import json
+import os
+import pathlib
+import re
+import shlex
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+import platformdirs
+
+from craft_cli.dispatcher import _get_command_class
+
+if TYPE_CHECKING:
+    from craft_cli.dispatcher import Dispatcher
+
+# the version of the cache structure, to invalidate it if the format changes
+_CACHE_FORMAT = 1
+
+# the shells for which a completion script can be produced
+SHELLS = ("bash", "zsh")
+
+BASH_TEMPLATE = """\
+_{funcname}_complete() {{
+    local cur prev word cmd="" skip=0 i words
+    cur="${{COMP_WORDS[COMP_CWORD]}}"
+    prev="${{COMP_WORDS[COMP_CWORD-1]}}"
+
+    # find the command, skipping the global options (and their values)
+    for ((i = 1; i < COMP_CWORD; i++)); do
+        word="${{COMP_WORDS[i]}}"
+        if ((skip)); then
+            skip=0
+            continue
+        fi
+        case "$word" in
+{global_value_options_case}            -*) ;;
+            *) cmd="$word"; break ;;
+        esac
+    done
+
+    case "$cmd" in
+{commands_case}    esac
+    COMPREPLY=($(compgen -W "$words" -- "$cur"))
+}}
+complete -o default -F _{funcname}_complete {appname}
+"""
+
+# zsh runs the bash completion function through bashcompinit, which needs the completion
+# system already initiated by the user (compinit, normally in ~/.zshrc); it's not initiated
+# here as doing it again is slow and would discard the user's completion setup
+ZSH_PREFIX = """\
+if (( $+functions[compdef] )); then
+(( $+functions[complete] )) || { autoload -U +X bashcompinit && bashcompinit; }
+"""
+ZSH_SUFFIX = """\
+fi
+"""
+
+
+def _get_cache_filepath(appname: str) -> pathlib.Path:
+    """Provide the default path for the completion cache."""
+    return pathlib.Path(platformdirs.user_cache_dir(appname)) / "completion.json"
+
+
+def _build_table(dispatcher: "Dispatcher") -> Dict[str, Any]:
+    """Build the completion table from the Dispatcher's information."""
+    global_options = []
+    global_value_options = []
+    for arg in dispatcher.global_arguments:
+        global_options.extend([arg.short_option, arg.long_option])
+        if arg.type == "option":
+            global_value_options.extend([arg.short_option, arg.long_option])
+
+    commands = {}
+    for name, command_info in dispatcher.commands.items():
+        options: List[str] = []
+        value_options: List[str] = []
+        cmd_class = _get_command_class(command_info)
+        if cmd_class.has_static_arguments():
+            # no need to instantiate the command nor build its parser
+            for argument in cmd_class.arguments:
+                if argument.is_option:
+                    options.extend(argument.names)
+                    if argument.takes_value:
+                        value_options.extend(argument.names)
+            commands[name] = {"options": options, "value_options": value_options}
+            continue
+
+        try:
+            command = cmd_class(None)
+            parser = dispatcher._get_command_parser(  # pylint: disable=protected-access
+                command, add_help=False
+            )
+        except Exception:  # pylint: disable=broad-except
+            # the command can not be introspected (e.g. it needs a real config), complete
+            # it without options instead of breaking the completion for all
+            commands[name] = {"options": options, "value_options": value_options}
+            continue
+
+        for action in parser._actions:  # pylint: disable=protected-access
+            options.extend(action.option_strings)
+            if action.option_strings and action.nargs != 0:
+                value_options.extend(action.option_strings)
+        commands[name] = {"options": options, "value_options": value_options}
+
+    return {
+        "global_options": global_options,
+        "global_value_options": global_value_options,
+        "commands": commands,
+    }
+
+
+def get_completion_table(
+    dispatcher: "Dispatcher",
+    version: str,
+    *,
+    cache_filepath: Optional[pathlib.Path] = None,
+) -> Dict[str, Any]:
+    """Return the completion table for the Dispatcher's application.
+
+    The table is taken from the cache if still valid (same application version and set of
+    commands), otherwise it's built and stored in the cache for the next time.
+    """
+    if cache_filepath is None:
+        cache_filepath = _get_cache_filepath(dispatcher.appname)
+    key = f"{_CACHE_FORMAT}-{dispatcher.get_definition_hash(version)}"
+
+    try:
+        cached = json.loads(cache_filepath.read_text(encoding="utf8"))
+    except (OSError, ValueError):
+        cached = None
+    if isinstance(cached, dict) and cached.get("key") == key:
+        return cached["table"]
+
+    table = _build_table(dispatcher)
+
+    # write it atomically, other process may be reading it
+    cache_filepath.parent.mkdir(parents=True, exist_ok=True)
+    temp_filepath = cache_filepath.with_name(f"{cache_filepath.name}.{os.getpid()}")
+    temp_filepath.write_text(json.dumps({"key": key, "table": table}), encoding="utf8")
+    temp_filepath.replace(cache_filepath)
+    return table
+
+
+def _case_pattern(words: List[str]) -> str:
+    """Build a shell case pattern for the given words."""
+    return "|".join(shlex.quote(word) for word in words)
+
+
+def _build_bash_script(appname: str, table: Dict[str, Any]) -> str:
+    """Build the bash completion script for the given table."""
+    global_value_options_case = ""
+    if table["global_value_options"]:
+        pattern = _case_pattern(table["global_value_options"])
+        global_value_options_case = f"            {pattern}) skip=1 ;;\n"
+
+    global_options = table["global_options"]
+    command_names = sorted(table["commands"])
+
+    # what to complete if there is no command yet, or when requesting help
+    commands_case = [
+        f'        "") words="{" ".join(global_options + command_names + ["help"])}" ;;',
+        f'        help) words="{" ".join(command_names + ["--all"])}" ;;',
+    ]
+    for name in command_names:
+        info = table["commands"][name]
+        lines = [f"        {shlex.quote(name)})"]
+        if info["value_options"]:
+            # a value is expected after the option: let the shell complete files
+            pattern = _case_pattern(info["value_options"])
+            lines.append(f'            case "$prev" in {pattern}) return 0 ;; esac')
+        lines.append(f'            words="{" ".join(global_options + info["options"])}" ;;')
+        commands_case.extend(lines)
+    commands_case.append('        *) words="" ;;')
+
+    return BASH_TEMPLATE.format(
+        funcname=re.sub(r"\W", "_", appname),
+        appname=shlex.quote(appname),
+        global_value_options_case=global_value_options_case,
+        commands_case="\n".join(commands_case) + "\n",
+    )
+
+
+def get_completion_script(
+    dispatcher: "Dispatcher",
+    shell: str,
+    version: str,
+    *,
+    cache_filepath: Optional[pathlib.Path] = None,
+) -> str:
+    """Produce the completion script for the indicated shell.
+
+    The script should be loaded by the user's shell (e.g. ``eval "$(myapp completion bash)"``
+    in the shell's init file).
+    """
+    if shell not in SHELLS:
+        raise ValueError(f"Shell not supported for completion: {shell!r}")
+    table = get_completion_table(dispatcher, version, cache_filepath=cache_filepath)
+    script = _build_bash_script(dispatcher.appname, table)
+    if shell == "zsh":
+        # zsh can use bash completion functions directly
+        script = ZSH_PREFIX + script + ZSH_SUFFIX
+    return script
@@ -0,0 +1,138 @@
+#
+# Copyright 2022 Canonical Ltd.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+"""Produce compressed bundles with the information needed to diagnose an error."""
+
+import os
+import pathlib
+import platform
+import sys
+import threading
+import zipfile
+from typing import Callable, Dict, Optional, Union
+
+# how much of the log is included in the bundle (the last lines, up to a max size)
+LOG_TAIL_LINES = 1000
+LOG_TAIL_MAX_BYTES = 1024 * 1024
+
+# the size of the blocks read from the end of the log
+_READ_BLOCK_SIZE = 64 * 1024
+
+# the content of a bundle member, or a function to produce it
+MemberContent = Union[str, bytes, Callable[[], Union[str, bytes]]]
+
+
+def get_file_tail(
+    filepath: pathlib.Path, max_lines: int = LOG_TAIL_LINES, max_bytes: int = LOG_TAIL_MAX_BYTES
+) -> bytes:
+    """Return the last lines of the file, up to the given size.
+
+    The file is read backwards from its end, in blocks, only until enough lines are found,
+    so the time spent does not depend on the size of the file.
+    """
+    blocks = []
+    newlines = 0
+    with open(filepath, "rb") as fh:
+        position = end = fh.seek(0, os.SEEK_END)
+        # one newline more than the needed lines, as the last line ends with one
+        while position > 0 and newlines <= max_lines and end - position < max_bytes:
+            size = min(_READ_BLOCK_SIZE, position)
+            position -= size
+            fh.seek(position)
+            block = fh.read(size)
+            blocks.append(block)
+            newlines += block.count(b"\n")
+
+    lines = b"".join(reversed(blocks)).splitlines(keepends=True)
+    tail = b"".join(lines[-max_lines:])
+    if len(tail) > max_bytes:
+        # too big, keep only the complete lines that fit
+        tail = tail[-max_bytes:].split(b"\n", 1)[-1]
+    return tail
+
+
+def get_environment_info() -> Dict[str, Union[str, list]]:
+    """Return information about the Python and platform running the application."""
+    return {
+        "python_version": sys.version,
+        "python_implementation": platform.python_implementation(),
+        "python_executable": sys.executable,
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "argv": sys.argv,
+    }
+
+
+class _BundleWriter(threading.Thread):
+    """Write the bundle in the background, which may be abandoned if it takes too long.
+
+    The bundle is written in a temporary file which is only renamed to the final path
+    if the writing was not abandoned.
+    """
+
+    def __init__(self, bundle_filepath: pathlib.Path, members: Dict[str, MemberContent]):
+        super().__init__(daemon=True)
+        self.bundle_filepath = bundle_filepath
+        self.members = members
+        self.error: Optional[Exception] = None
+        self._lock = threading.Lock()
+        self._abandoned = False
+        self._written = False
+
+    def run(self) -> None:
+        """Write the bundle."""
+        temp_filepath = self.bundle_filepath.with_name(f"{self.bundle_filepath.name}.partial")
+        try:
+            with zipfile.ZipFile(temp_filepath, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+                for name, content in self.members.items():
+                    if callable(content):
+                        content = content()
+                    zf.writestr(name, content)
+        except Exception as exc:  # pylint: disable=broad-except
+            self.error = exc
+            temp_filepath.unlink(missing_ok=True)
+            return
+
+        with self._lock:
+            if self._abandoned:
+                temp_filepath.unlink(missing_ok=True)
+            else:
+                temp_filepath.replace(self.bundle_filepath)
+                self._written = True
+
+    def finish(self) -> bool:
+        """Abandon the writing if not done yet, and return if the bundle was written."""
+        with self._lock:
+            self._abandoned = True
+            return self._written
+
+
+def write_bundle(
+    bundle_filepath: pathlib.Path, members: Dict[str, MemberContent], timeout: float
+) -> bool:
+    """Write a zip file with the given members (name and content).
+
+    The content of each member can also be a function to produce it, which is called when
+    the bundle is written. The writing happens in the background, waiting for it no
+    more than the indicated timeout (in seconds); if not finished by then, the bundle is
+    not produced at all.
+
+    Return if the bundle was written.
+    """
+    writer = _BundleWriter(bundle_filepath, members)
+    writer.start()
+    writer.join(timeout)
+    return writer.finish()
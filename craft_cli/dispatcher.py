@@ -16,13 +16,42 @@
 """Argument processing and command dispatching functionality."""
 
 import argparse
-import difflib
+import hashlib
+import importlib
+import json
+import pathlib
+import shlex
+import sys
+import time
 from collections import namedtuple
-from typing import Any, Dict, List, Optional, Tuple, Type
+from types import MappingProxyType
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    TextIO,
+    Tuple,
+    Type,
+    Union,
+)
+
+import platformdirs
 
 from craft_cli import EmitterMode, emit
-from craft_cli.errors import ArgumentParsingError, ProvideHelpException
-from craft_cli.helptexts import HelpBuilder
+from craft_cli.errors import (
+    ArgumentParsingError,
+    CraftError,
+    ProvideExportException,
+    ProvideHelpException,
+)
+from craft_cli.helptexts import HelpBuilder, HelpCache
+from craft_cli.search import SearchIndex
+from craft_cli.suggestions import SuggestionIndex, join_suggestions
 
 CommandGroup = namedtuple("CommandGroup", "name commands")
 """Definition of a command group.
@@ -31,7 +60,8 @@ A list of these is what is passed to the ``Dispatcher`` to run commands as part
 of the application.
 
 :param name: identifier of the command group (to be used in help texts).
-:param commands: a list of the commands in this group.
+:param commands: a list of the commands in this group (the command classes themselves, or
+    ``LazyCommand`` definitions for commands to be imported only when needed).
 """
 
 GlobalArgument = namedtuple("GlobalArgument", "name type short_option long_option help_message")
@@ -45,6 +75,76 @@ GlobalArgument = namedtuple("GlobalArgument", "name type short_option long_optio
 :param long_option: the long form of the argument (two dashes and a name, e.g. ``--secure``).
 :param help_message: the one-line text that describes the argument, for building the help texts.
 """
+
+BatchResult = namedtuple("BatchResult", "command_line retcode duration")
+"""The result of each command executed by ``Dispatcher.run_batch``.
+
+:param command_line: the command line as read from the batch source.
+:param retcode: the code returned by the command (or the error code, if it failed).
+:param duration: the seconds it took to run the command.
+"""
+
+# the hidden global option to export the commands tree
+_EXPORT_TREE_OPTION = "--export-commands-json"
+
+# the relevance of each command's text when searching
+_SEARCH_WEIGHTS = {
+    "name": 5,
+    "help_msg": 3,
+    "overview": 1,
+    "arguments": 1,
+}
+
+# the argparse actions that don't take a value after the option
+_NO_VALUE_ACTIONS = (
+    "store_const",
+    "store_true",
+    "store_false",
+    "append_const",
+    "count",
+    "help",
+    "version",
+)
+
+
+class CommandArgument(namedtuple("CommandArgument", "names options")):
+    """Static definition of a command's argument.
+
+    It receives the same parameters than argparse's ``add_argument``, e.g.::
+
+        CommandArgument("--output", "-o", help="Where to put the result")
+
+    :param names: the option strings (e.g. ``-o`` and ``--output``) or the parameter name.
+    :param options: all the keyword arguments (e.g. ``help``, ``type``, ``action``, etc.).
+    """
+
+    __slots__ = ()
+
+    def __new__(cls, *names: str, **options: Any):
+        """Create the argument from the names and options, as ``add_argument`` receives them."""
+        return super().__new__(cls, names, options)
+
+    @property
+    def is_option(self) -> bool:
+        """Tell if the argument is an option (instead of a positional parameter)."""
+        return self.names[0].startswith("-")
+
+    @property
+    def takes_value(self) -> bool:
+        """Tell if the option needs a value after it."""
+        if self.options.get("action") in _NO_VALUE_ACTIONS:
+            return False
+        return self.options.get("nargs") != 0
+
+    def get_help_item(self) -> Tuple[str, str]:
+        """Return the (title, description) pair to show the argument in the help texts."""
+        if self.is_option:
+            title = ", ".join(self.names)
+        else:
+            title = self.options.get("metavar") or self.options.get("dest") or self.names[0]
+        return title, self.options.get("help") or ""
+
+
 _DEFAULT_GLOBAL_ARGS = [
     GlobalArgument(
         "help",
@@ -77,6 +177,14 @@ _DEFAULT_GLOBAL_ARGS = [
 ]
 
 
+def _validate_command_attributes(command: Any) -> None:
+    """Validate that the mandatory attributes are defined in the command (class or instance)."""
+    mandatory = ("name", "help_msg", "overview")
+    for attr_name in mandatory:
+        if getattr(command, attr_name) is None:
+            raise ValueError(f"Bad command configuration: missing value in '{attr_name}'.")
+
+
 class BaseCommand:
     """Base class to build application commands.
 
@@ -88,11 +196,15 @@ class BaseCommand:
 
     - overview: a longer multi-line text with the whole command description
 
-    Also it may override the following one to change its default:
+    Also it may override the following ones to change their defaults:
 
     - common: if it's a common/starter command, which are prioritized in the help (default to
       False)
 
+    - arguments: a sequence of ``CommandArgument`` declaring statically the command's
+      parameters and options (default to none); these are used to fill the parser and
+      also to build help texts and completion without instantiating the command
+
     It also must/can override some methods for the proper command behaviour (see each
     method's docstring).
 
@@ -104,15 +216,16 @@ class BaseCommand:
     name: Optional[str] = None
     help_msg: Optional[str] = None
     overview: Optional[str] = None
+    arguments: Sequence[CommandArgument] = ()
 
     def __init__(self, config: Optional[Dict[str, Any]]):
         self.config = config
+        _validate_command_attributes(self)
 
-        # validate attributes
-        mandatory = ("name", "help_msg", "overview")
-        for attr_name in mandatory:
-            if getattr(self, attr_name) is None:
-                raise ValueError(f"Bad command configuration: missing value in '{attr_name}'.")
+    @classmethod
+    def has_static_arguments(cls) -> bool:
+        """Tell if all the command's arguments are declared in the ``arguments`` attribute."""
+        return cls.fill_parser is BaseCommand.fill_parser
 
     def fill_parser(self, parser: "_CustomArgumentParser") -> None:
         """Specify command's specific parameters.
@@ -120,8 +233,12 @@ class BaseCommand:
         Each command parameters are independent of other commands, but note there are some
         global ones (see `main.Dispatcher._build_argument_parser`).
 
-        If this method is not overridden, the command will not have any parameters.
+        If this method is not overridden, the command will have the parameters declared
+        in the ``arguments`` attribute (if any); if overridden, the declared arguments are
+        only included if this method is called from the override.
         """
+        for argument in self.arguments:
+            parser.add_argument(*argument.names, **argument.options)
 
     def run(self, parsed_args: argparse.Namespace) -> Optional[int]:
         """Execute command's actual functionality.
@@ -135,34 +252,176 @@ class BaseCommand:
         raise NotImplementedError()
 
 
+class LazyCommand(
+    namedtuple("LazyCommand", "import_path name help_msg common", defaults=(False,))
+):
+    """Definition of a command that is imported only when needed.
+
+    It can be used in a ``CommandGroup`` instead of the command class, so the module where
+    the command is defined (and all its dependencies) is only imported if the command is
+    selected to run or its help is requested; the rest of the information used by the
+    Dispatcher (e.g. to build the general help texts) is taken from here.
+
+    :param import_path: the full dotted path to the command class (e.g.
+        ``myapp.commands.MyCommand``).
+    :param name: the identifier in the command line (must be the same of the command class).
+    :param help_msg: a one line help for user documentation.
+    :param common: if it's a common/starter command (defaults to False).
+    """
+
+    __slots__ = ()
+
+    def load(self) -> Type[BaseCommand]:
+        """Import and return the command class."""
+        module_name, _, class_name = self.import_path.rpartition(".")
+        cmd_class = getattr(importlib.import_module(module_name), class_name)
+        if cmd_class.name != self.name:
+            raise RuntimeError(
+                f"Bad lazy command definition: {self.import_path} has name "
+                f"{cmd_class.name!r} but was declared as {self.name!r}"
+            )
+        return cmd_class
+
+
+def _get_command_class(command: Union[Type[BaseCommand], LazyCommand]) -> Type[BaseCommand]:
+    """Return the command class, importing it if it's a lazy command."""
+    if isinstance(command, LazyCommand):
+        return command.load()
+    return command
+
+
+# how argparse starts the error message for unknown arguments
+_UNRECOGNIZED_PREFIX = "unrecognized arguments: "
+
+
 class _CustomArgumentParser(argparse.ArgumentParser):
     """ArgumentParser with custom error manager.."""
 
     def __init__(self, help_builder, *args, **kwargs):
         self._help_builder = help_builder
+        self._options_suggestions: Optional[SuggestionIndex] = None
         super().__init__(*args, **kwargs)
 
+    def _get_options_suggestions(self, message: str) -> str:
+        """Build a text suggesting the right options for the unrecognized ones (if any)."""
+        if not message.startswith(_UNRECOGNIZED_PREFIX):
+            return ""
+        if self._options_suggestions is None:
+            options = self._option_string_actions.keys()  # pylint: disable=no-member
+            self._options_suggestions = SuggestionIndex(options)
+
+        suggestions = []
+        for arg in message.replace(_UNRECOGNIZED_PREFIX, "", 1).split():
+            if not arg.startswith("-"):
+                continue
+            option = arg.split("=", 1)[0]
+            similar = self._options_suggestions.suggest(option)
+            if similar:
+                suggestions.append(f"{option!r}: maybe you meant {join_suggestions(similar)}")
+        if not suggestions:
+            return ""
+        return " (" + "; ".join(suggestions) + ")"
+
     def error(self, message: str):
         """Show the usage, the error message, and no more."""
+        message += self._get_options_suggestions(message)
         full_msg = self._help_builder.get_usage_message(message, command=self.prog)
         raise ArgumentParsingError(full_msg)
 
 
-def _get_commands_info(commands_groups: List[CommandGroup]) -> Dict[str, Type[BaseCommand]]:
-    """Process the commands groups structure for easier programmatic access."""
-    commands: Dict[str, Type[BaseCommand]] = {}
+def _get_command_id(command: Union[Type[BaseCommand], LazyCommand]) -> str:
+    """Return an identification of the command for error messages (without importing it)."""
+    if isinstance(command, LazyCommand):
+        return command.import_path
+    return command.__name__
+
+
+def _get_parser_arguments(parser: argparse.ArgumentParser) -> List[CommandArgument]:
+    """Return the parser's arguments as the equivalent static definitions."""
+    arguments = []
+    for action in parser._actions:  # pylint: disable=protected-access
+        if action.option_strings:
+            arguments.append(
+                CommandArgument(*action.option_strings, help=action.help, nargs=action.nargs)
+            )
+        else:
+            # parameters are shown with their metavar (if any), otherwise it's just the dest
+            assert action.metavar is None or isinstance(
+                action.metavar, str
+            )  # tuple is for options
+            arguments.append(
+                CommandArgument(action.dest, metavar=action.metavar, help=action.help)
+            )
+    return arguments
+
+
+def _get_class_arguments_definition(cmd_class: Type[BaseCommand]) -> List[Any]:
+    """Return what defines the command's arguments, only from its class (not instantiated).
+
+    It includes the declared arguments and, if the command fills the parser itself, the
+    identification of the class where that method is defined.
+    """
+    definition: List[Any] = [
+        [list(argument.names), argument.get_help_item(), argument.takes_value]
+        for argument in cmd_class.arguments
+    ]
+    if not cmd_class.has_static_arguments():
+        filler = next(klass for klass in cmd_class.__mro__ if "fill_parser" in vars(klass))
+        definition.append(f"{filler.__module__}.{filler.__qualname__}")
+    return definition
+
+
+def _get_commands_info(
+    commands_groups: List[CommandGroup],
+) -> Dict[str, Union[Type[BaseCommand], LazyCommand]]:
+    """Process the commands groups structure for easier programmatic access.
+
+    Note that lazy commands are not imported here.
+    """
+    commands: Dict[str, Union[Type[BaseCommand], LazyCommand]] = {}
     for command_group in commands_groups:
         for _cmd_class in command_group.commands:
             if _cmd_class.name in commands:
                 _stored_class = commands[_cmd_class.name]
                 raise RuntimeError(
                     "Multiple commands with same name: "
-                    f"{_cmd_class.__name__} and {_stored_class.__name__}"
+                    f"{_get_command_id(_cmd_class)} and {_get_command_id(_stored_class)}"
                 )
             commands[_cmd_class.name] = _cmd_class
     return commands
 
 
+_GlobalArgsGrammar = namedtuple("_GlobalArgsGrammar", "per_option defaults options_with_equal")
+"""The global arguments structure, prepared to be used when parsing the command line.
+
+:param per_option: a mapping of each short and long option to its global argument.
+:param defaults: a tuple of (name, default value) pairs for all the global arguments.
+:param options_with_equal: a tuple of the long options that may be given as ``--option=value``.
+"""
+
+
+def _compile_global_args(global_arguments: List[GlobalArgument]) -> _GlobalArgsGrammar:
+    """Validate the global arguments and prepare them for fast parsing."""
+    per_option: Dict[str, GlobalArgument] = {}
+    defaults: List[Tuple[str, Any]] = []
+    options_with_equal = []
+    for arg in global_arguments:
+        per_option[arg.short_option] = arg
+        per_option[arg.long_option] = arg
+        if arg.type == "flag":
+            defaults.append((arg.name, False))
+        elif arg.type == "option":
+            defaults.append((arg.name, None))
+            options_with_equal.append(arg.long_option + "=")
+        else:
+            raise ValueError("Bad global args structure.")
+    return _GlobalArgsGrammar(
+        per_option=MappingProxyType(per_option),
+        defaults=tuple(defaults),
+        options_with_equal=tuple(options_with_equal),
+    )
+
+
 class Dispatcher:  # pylint: disable=too-many-instance-attributes
     """Set up infrastructure and let the needed command run.
 
@@ -174,6 +433,8 @@ class Dispatcher:  # pylint: disable=too-many-instance-attributes
     :param extra_global_args: other automatic global arguments than the ones
         provided automatically
     :param default_command: the command to run if none was specified in the command line
+    :param version: the version of the application; if given, the help texts are cached
+        on disk (and only rendered again when the version or the commands change)
     """
 
     def __init__(
@@ -183,16 +444,27 @@ class Dispatcher:  # pylint: disable=too-many-instance-attributes
         *,
         summary: str = "",
         extra_global_args: Optional[List[GlobalArgument]] = None,
-        default_command: Optional[Type[BaseCommand]] = None,
+        default_command: Union[Type[BaseCommand], LazyCommand, None] = None,
+        version: Optional[str] = None,
     ):
+        self.appname = appname
         self._default_command = default_command
         self._help_builder = HelpBuilder(appname, summary, commands_groups)
+        self._version = version
+        self._help_cache: Optional[HelpCache] = None
 
         self.global_arguments = _DEFAULT_GLOBAL_ARGS[:]
         if extra_global_args is not None:
             self.global_arguments.extend(extra_global_args)
+        self._global_args_grammar = _compile_global_args(self.global_arguments)
+
+        # the parsers already built for each command class (and if including help or not);
+        # only for commands with static arguments, as others may depend on the config
+        self._parsers: Dict[Tuple[Type[BaseCommand], bool], _CustomArgumentParser] = {}
 
         self.commands = _get_commands_info(commands_groups)
+        self._command_suggestions: Optional[SuggestionIndex] = None
+        self._search_index: Optional[SearchIndex] = None
         self._command_class: Optional[Type[BaseCommand]] = None
         self._command_args: Optional[List[str]] = None
         self._loaded_command: Optional[BaseCommand] = None
@@ -207,12 +479,165 @@ class Dispatcher:  # pylint: disable=too-many-instance-attributes
         self._loaded_command = self._command_class(app_config)
 
         # load and parse the command specific options/params
-        parser = _CustomArgumentParser(self._help_builder, prog=self._loaded_command.name)
-        self._loaded_command.fill_parser(parser)
+        parser = self._get_command_parser(self._loaded_command, add_help=True)
         self._parsed_command_args = parser.parse_args(self._command_args)
         emit.trace(f"Command parsed sysargs: {self._parsed_command_args}")
         return self._loaded_command
 
+    def _get_command_parser(
+        self, command: BaseCommand, *, add_help: bool
+    ) -> _CustomArgumentParser:
+        """Return the parser for the command.
+
+        If the command's arguments are declared statically the parser is only built the
+        first time, otherwise it's filled every time, as it may depend on the command's config.
+        """
+        cmd_class = type(command)
+        if not cmd_class.has_static_arguments():
+            return self._build_command_parser(command, add_help=add_help)
+
+        key = (cmd_class, add_help)
+        parser = self._parsers.get(key)
+        if parser is None:
+            parser = self._build_command_parser(command, add_help=add_help)
+            self._parsers[key] = parser
+        return parser
+
+    def _build_command_parser(
+        self, command: BaseCommand, *, add_help: bool
+    ) -> _CustomArgumentParser:
+        """Build the parser for the command, filled with its arguments."""
+        parser = _CustomArgumentParser(self._help_builder, prog=command.name, add_help=add_help)
+        command.fill_parser(parser)
+        return parser
+
+    def get_definition_hash(self, version: str) -> str:
+        """Return a hash of everything that defines the application's commands and texts.
+
+        This is useful to invalidate caches built from the commands information, so it's built
+        only from the commands' classes, without instantiating them. It includes the overview
+        and declared arguments of each command; for those filling the parser themselves only
+        that method is identified, and for the lazy commands (not imported for this) only the
+        information in their ``LazyCommand`` is used, so the version needs to change if
+        anything else changes in them.
+        """
+        groups = []
+        for command_group in self._help_builder.command_groups:
+            commands = []
+            for command in command_group.commands:
+                if isinstance(command, LazyCommand):
+                    command_id = command.import_path
+                    details = None
+                else:
+                    command_id = f"{command.__module__}.{command.__qualname__}"
+                    details = [command.overview, _get_class_arguments_definition(command)]
+                commands.append(
+                    [command.name, command_id, command.help_msg, command.common, details]
+                )
+            groups.append([command_group.name, commands])
+        definition = [
+            self.appname,
+            version,
+            self._help_builder.general_summary,
+            groups,
+            [list(arg) for arg in self.global_arguments],
+        ]
+        return hashlib.sha256(json.dumps(definition).encode("utf8")).hexdigest()
+
+    def _get_command_arguments(self, cmd_class: Type[BaseCommand]) -> List[CommandArgument]:
+        """Return the command's arguments, as declared or taken from its parser."""
+        if cmd_class.has_static_arguments():
+            _validate_command_attributes(cmd_class)
+            return list(cmd_class.arguments)
+        parser = self._get_command_parser(cmd_class(None), add_help=False)
+        return _get_parser_arguments(parser)
+
+    def get_command_tree(self) -> Dict[str, Any]:
+        """Return the whole structure of the application's commands.
+
+        It includes the command groups, each command with its information and arguments,
+        and the global arguments; everything in plain structures that can be serialized
+        to JSON. Note that all the lazy commands are imported for this.
+        """
+        groups = []
+        for command_group in self._help_builder.command_groups:
+            commands = []
+            for command_info in command_group.commands:
+                cmd_class = _get_command_class(command_info)
+                arguments = self._get_command_arguments(cmd_class)
+                commands.append(
+                    {
+                        "name": cmd_class.name,
+                        "help_msg": cmd_class.help_msg,
+                        "overview": cmd_class.overview,
+                        "common": cmd_class.common,
+                        "arguments": [
+                            {
+                                "names": list(argument.names),
+                                "help": argument.options.get("help") or "",
+                                "option": argument.is_option,
+                                "takes_value": argument.takes_value,
+                            }
+                            for argument in arguments
+                        ],
+                    }
+                )
+            groups.append({"name": command_group.name, "commands": commands})
+
+        tree: Dict[str, Any] = {
+            "appname": self.appname,
+            "summary": self._help_builder.general_summary,
+            "global_arguments": [arg._asdict() for arg in self.global_arguments],
+            "groups": groups,
+        }
+        if self._version is not None:
+            tree["version"] = self._version
+            tree["definition_hash"] = self.get_definition_hash(self._version)
+        return tree
+
+    def _get_command_tree_json(self) -> str:
+        """Return the commands tree serialized to JSON."""
+        return json.dumps(self.get_command_tree(), indent=2)
+
+    def _build_search_index(self) -> SearchIndex:
+        """Build the index to search commands by their texts."""
+        documents: Dict[str, Iterable[Tuple[str, float]]] = {}
+        for name, command_info in self.commands.items():
+            cmd_class = _get_command_class(command_info)
+            fields: List[Tuple[str, float]] = [
+                (name, _SEARCH_WEIGHTS["name"]),
+                (cmd_class.help_msg or "", _SEARCH_WEIGHTS["help_msg"]),
+                (cmd_class.overview or "", _SEARCH_WEIGHTS["overview"]),
+            ]
+            for argument in self._get_command_arguments(cmd_class):
+                text = " ".join(argument.get_help_item())
+                fields.append((text, _SEARCH_WEIGHTS["arguments"]))
+            documents[name] = fields
+        return SearchIndex.from_documents(documents)
+
+    def _get_search_help(self, terms: List[str]) -> str:
+        """Produce the help with the commands found for the given terms."""
+        if self._search_index is None:
+            # the index is cached as the help texts, so it's only built once per definition
+            serialized = self._get_help_text(
+                "search-index", lambda: self._build_search_index().to_json()
+            )
+            self._search_index = SearchIndex.from_json(serialized)
+
+        query = " ".join(terms)
+        found = self._search_index.search(query)
+        commands = [(name, self.commands[name].help_msg or "") for name in found]
+        return self._help_builder.get_search_help(query, commands)
+
+    def _get_help_text(self, name: str, builder: Callable[[], str]) -> str:
+        """Return the help text, from the cache if the application's version was given."""
+        if self._version is None:
+            return builder()
+        if self._help_cache is None:
+            cache_dir = pathlib.Path(platformdirs.user_cache_dir(self.appname))
+            self._help_cache = HelpCache(cache_dir, self.get_definition_hash(self._version))
+        return self._help_cache.get(name, builder)
+
     def _get_global_options(self) -> List[Tuple[str, str]]:
         """Return the global flags ready to present in the help messages as options."""
         options = []
@@ -224,9 +649,13 @@ class Dispatcher:  # pylint: disable=too-many-instance-attributes
         """Produce the general application help."""
         options = self._get_global_options()
         if detailed:
-            help_text = self._help_builder.get_detailed_help(options)
+            help_text = self._get_help_text(
+                "detailed", lambda: self._help_builder.get_detailed_help(options)
+            )
         else:
-            help_text = self._help_builder.get_full_help(options)
+            help_text = self._get_help_text(
+                "full", lambda: self._help_builder.get_full_help(options)
+            )
         return help_text
 
     def _get_requested_help(self, parameters):
@@ -234,6 +663,16 @@ class Dispatcher:  # pylint: disable=too-many-instance-attributes
         if len(parameters) == 0:
             # provide a general text when help was requested without parameters
             return self._get_general_help(detailed=False)
+
+        # search the commands by their texts (unless a "search" command help is requested)
+        if parameters[0] == "search" and (len(parameters) > 1 or "search" not in self.commands):
+            terms = parameters[1:]
+            if not terms:
+                msg = "Nothing to search; pass the terms after 'search'"
+                text = self._help_builder.get_usage_message(msg)
+                raise ArgumentParsingError(text)
+            return self._get_search_help(terms)
+
         if len(parameters) > 1:
             # too many parameters: provide a specific guiding error
             msg = (
@@ -251,48 +690,50 @@ class Dispatcher:  # pylint: disable=too-many-instance-attributes
 
         # at this point the parameter should be a command
         try:
-            cmd_class = self.commands[param]
+            command_info = self.commands[param]
         except KeyError:
-            msg = f"command {param!r} not found to provide help for"
+            extra_similar = self._get_similar_commands_text(param)
+            msg = f"command {param!r} not found to provide help for{extra_similar}"
             text = self._help_builder.get_usage_message(msg)
             raise ArgumentParsingError(text)  # pylint: disable=raise-missing-from
+        return self._get_help_text(
+            f"command:{param}", lambda: self._get_command_help(command_info)
+        )
+
+    def _get_command_help(self, command_info: Union[Type[BaseCommand], LazyCommand]) -> str:
+        """Produce the help for the command."""
+        cmd_class = _get_command_class(command_info)
+        options = self._get_global_options()
+
+        # if the arguments are declared statically, there is no need to instantiate the
+        # command nor build its parser
+        if cmd_class.has_static_arguments():
+            _validate_command_attributes(cmd_class)
+            options.extend(argument.get_help_item() for argument in cmd_class.arguments)
+            return self._help_builder.get_command_help(cmd_class, options)
 
-        # instantiate the command and fill its arguments
+        # instantiate the command and get its arguments
         command = cmd_class(None)
-        parser = _CustomArgumentParser(self._help_builder, prog=command.name, add_help=False)
-        command.fill_parser(parser)
+        parser = self._get_command_parser(command, add_help=False)
 
         # produce the complete help message for the command
-        options = self._get_global_options()
-        for action in parser._actions:  # pylint: disable=protected-access
-            # store the different options if present, otherwise it's just the dest
-            help_text = "" if action.help is None else action.help
-            if action.option_strings:
-                options.append((", ".join(action.option_strings), help_text))
-            else:
-                if action.metavar is None:
-                    dest = action.dest
-                else:
-                    assert isinstance(action.metavar, str)  # may be a tuple, but only for options
-                    dest = action.metavar
-                options.append((dest, help_text))
+        options.extend(argument.get_help_item() for argument in _get_parser_arguments(parser))
 
         help_text = self._help_builder.get_command_help(command, options)
         return help_text
 
+    def _get_similar_commands_text(self, missing_command: str) -> str:
+        """Build a text suggesting the commands similar to the missing one (if any)."""
+        if self._command_suggestions is None:
+            self._command_suggestions = SuggestionIndex(self.commands.keys())
+        similar = self._command_suggestions.suggest(missing_command)
+        if len(similar) == 0:
+            return ""
+        return f", maybe you meant {join_suggestions(similar)}"
+
     def _build_no_command_error(self, missing_command: str) -> str:
         """Build the error help text for missing command, providing options."""
-        all_alternatives = self.commands.keys()
-        similar = difflib.get_close_matches(missing_command, all_alternatives)
-        if len(similar) == 0:
-            extra_similar = ""
-        else:
-            if len(similar) == 1:
-                similar_text = repr(similar[0])
-            else:
-                *previous, last = similar
-                similar_text = ", ".join(repr(x) for x in previous) + f" or {last!r}"
-            extra_similar = f", maybe you meant {similar_text}"
+        extra_similar = self._get_similar_commands_text(missing_command)
         msg = f"no such command {missing_command!r}{extra_similar}"
         return self._help_builder.get_usage_message(msg)
 
@@ -310,20 +751,11 @@ class Dispatcher:  # pylint: disable=too-many-instance-attributes
         - validate that command is correct (NOT loading and parsing its arguments)
         """
         # get all arguments (default to what's specified) and those per options, to filter sysargs
-        global_args: Dict[str, Any] = {}
-        arg_per_option = {}
-        options_with_equal = []
-        for arg in self.global_arguments:
-            arg_per_option[arg.short_option] = arg
-            arg_per_option[arg.long_option] = arg
-            if arg.type == "flag":
-                global_args[arg.name] = False
-            elif arg.type == "option":
-                global_args[arg.name] = None
-                options_with_equal.append(arg.long_option + "=")
-            else:
-                raise ValueError("Bad global args structure.")
+        arg_per_option: Mapping[str, GlobalArgument] = self._global_args_grammar.per_option
+        options_with_equal = self._global_args_grammar.options_with_equal
+        global_args: Dict[str, Any] = dict(self._global_args_grammar.defaults)
 
+        export_tree = False
         filtered_sysargs = []
         sysargs_it = iter(sysargs)
         for sysarg in sysargs_it:
@@ -338,7 +770,9 @@ class Dispatcher:  # pylint: disable=too-many-instance-attributes
                         raise ArgumentParsingError(  # pylint: disable=raise-missing-from
                             f"The {arg.name!r} option expects one argument."
                         )
-            elif sysarg.startswith(tuple(options_with_equal)):
+            elif sysarg == _EXPORT_TREE_OPTION:
+                export_tree = True
+            elif sysarg.startswith(options_with_equal):
                 option, value = sysarg.split("=", 1)
                 arg = arg_per_option[option]
                 if not value:
@@ -360,6 +794,10 @@ class Dispatcher:  # pylint: disable=too-many-instance-attributes
             emit.set_mode(EmitterMode.TRACE)
         emit.trace(f"Raw pre-parsed sysargs: args={global_args} filtered={filtered_sysargs}")
 
+        # the commands tree is exported to be written to stdout (cached as the help texts)
+        if export_tree:
+            raise ProvideExportException(self._get_help_text("tree", self._get_command_tree_json))
+
         # handle requested help through -h/--help options
         if global_args["help"]:
             help_text = self._get_requested_help(filtered_sysargs)
@@ -384,10 +822,11 @@ class Dispatcher:  # pylint: disable=too-many-instance-attributes
 
         self._command_args = cmd_args
         try:
-            self._command_class = self.commands[command]
+            command_info = self.commands[command]
         except KeyError:
             help_text = self._build_no_command_error(command)
             raise ArgumentParsingError(help_text)  # pylint: disable=raise-missing-from
+        self._command_class = _get_command_class(command_info)
 
         emit.trace(f"General parsed sysargs: command={ command!r} args={cmd_args}")
         return global_args
@@ -398,3 +837,72 @@ class Dispatcher:  # pylint: disable=too-many-instance-attributes
             raise RuntimeError("Need to load the command (call 'load_command') before running it.")
         assert self._parsed_command_args is not None
         return self._loaded_command.run(self._parsed_command_args)
+
+    def _run_batch_command(self, sysargs: List[str], app_config: Any) -> int:
+        """Run one command from a batch, reporting any error but not stopping the emitter."""
+        self._command_class = None
+        self._command_args = None
+        self._loaded_command = None
+        self._parsed_command_args = None
+        try:
+            self.pre_parse_args(sysargs)
+            self.load_command(app_config)
+            retcode = self.run()
+        except ProvideExportException as err:
+            print(err, flush=True)
+            return 0
+        except ProvideHelpException as err:
+            print(err, file=sys.stderr, flush=True)  # to stderr, as argparse normally does
+            return 0
+        except ArgumentParsingError as err:
+            emit.report_error(CraftError(str(err)))
+            return 1
+        except CraftError as err:
+            emit.report_error(err)
+            return err.retcode
+        except Exception as exc:  # pylint: disable=broad-except
+            error = CraftError(f"Application internal error: {exc!r}")
+            error.__cause__ = exc
+            emit.report_error(error)
+            return 1
+        return 0 if retcode is None else retcode
+
+    def run_batch(self, source: TextIO, app_config: Any) -> List[BatchResult]:
+        """Run many commands in the same process, one per line of the given source.
+
+        Each line holds the arguments as they would be given in the command line (shell
+        quoted, without the application name); empty lines and those starting with '#'
+        are ignored. All commands use the same application config and the already initiated
+        emitter, being delimited in the log with their return code and duration. Errors are
+        reported and the batch continues with the next command.
+
+        Return the results of each command.
+        """
+        initial_mode = emit.get_mode()
+        results = []
+        for line_number, line in enumerate(source, 1):
+            command_line = line.strip()
+            if not command_line or command_line.startswith("#"):
+                continue
+
+            emit.trace(f"Batch command in line {line_number} started: {command_line}")
+            t_start = time.monotonic()
+            try:
+                sysargs = shlex.split(command_line)
+            except ValueError as exc:
+                error = CraftError(f"Bad command line in batch, line {line_number}: {exc}")
+                emit.report_error(error)
+                retcode = error.retcode
+            else:
+                retcode = self._run_batch_command(sysargs, app_config)
+            duration = time.monotonic() - t_start
+
+            # global options may have changed the emitter mode, restore it for the next one
+            if emit.get_mode() != initial_mode:
+                emit.set_mode(initial_mode)
+            emit.trace(
+                f"Batch command in line {line_number} finished: "
+                f"retcode={retcode} duration={duration:.3f}s"
+            )
+            results.append(BatchResult(command_line, retcode, duration))
+        return results
@@ -83,3 +83,7 @@ class ArgumentParsingError(Exception):
 
 class ProvideHelpException(Exception):
     """Exception used to provide help to the user."""
+
+
+class ProvideExportException(ProvideHelpException):
+    """Exception used to provide a machine-readable export (to be written to stdout)."""
@@ -15,15 +15,20 @@
 
 """Provide all help texts."""
 
+import functools
+import json
+import os
+import pathlib
+import shutil
 import textwrap
 from operator import attrgetter
-from typing import TYPE_CHECKING, List, Tuple
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, List, Optional, Tuple, Type, Union
 
 if TYPE_CHECKING:
     from craft_cli.dispatcher import BaseCommand, CommandGroup
 
 
-# max columns used in the terminal
+# columns used if the terminal width can not be known
 TERMINAL_WIDTH = 72
 
 # generic intro and outro texts
@@ -40,27 +45,148 @@ Error: {error_message}
 """
 
 
-def _build_item(title: str, text: str, title_space: int) -> List[str]:
-    """Show an item in the help, generically a title and a text aligned.
+# the space taken in an item by everything but the title: the first 4 spaces, the ':', and
+# the two spaces to separate title and text
+_NOT_TITLE_SPACE = 7
 
-    The title starts in column 4 with an extra ':'. The text starts in
-    4 plus the title space; if too wide it's wrapped.
+# the minimum width for the text part of the items, even in very narrow terminals
+_MIN_TEXT_SPACE = 20
+
+# how many help cache files (one per definition) are kept, the least recently written
+# ones are removed (so several installed versions can share the cache directory)
+_HELP_CACHE_MAX_FILES = 5
+
+
+@functools.lru_cache(maxsize=None)
+def _get_terminal_width() -> int:
+    """Return the width used for the help texts: the terminal's (if it can be known)."""
+    return shutil.get_terminal_size((TERMINAL_WIDTH, 24)).columns
+
+
+@functools.lru_cache(maxsize=4096)
+def _wrap(text: str, width: int) -> Tuple[str, ...]:
+    """Wrap the text to the given width, producing the same lines than ``textwrap.wrap``.
+
+    The simple (and usual) case of words separated by single spaces is resolved by a
+    direct word break; anything else (hyphens, other whitespace, too long words) goes
+    through textwrap.
+    """
+    words = text.split(" ")
+    if "-" in text or "" in words or not text.isprintable() or max(map(len, words)) > width:
+        return tuple(textwrap.wrap(text, width))
+
+    lines = []
+    current = words[0]
+    for word in words[1:]:
+        if len(current) + len(word) + 1 <= width:
+            current += " " + word
+        else:
+            lines.append(current)
+            current = word
+    lines.append(current)
+    return tuple(lines)
+
+
+class _HelpPage:
+    """Render a help text, with all its blocks separated by one empty line.
+
+    Column alignment for all the items in the page is fixed at creation, and everything
+    is rendered directly in one buffer.
     """
-    # wrap the general text to the desired max width (discounting the space for the title,
-    # the first 4 spaces, the two spaces to separate title/text, and the ':'
-    not_title_space = 7
-    text_space = TERMINAL_WIDTH - title_space - not_title_space
-    wrapped_lines = textwrap.wrap(text, text_space)
 
-    # first line goes with the title at column 4
-    first = f"    {title:>{title_space}s}:  {wrapped_lines[0]}"
-    result = [first]
+    def __init__(self, titles: Iterable[str]):
+        self.title_space = max(map(len, titles), default=0)
+        width = _get_terminal_width()
+        self.text_space = max(width - self.title_space - _NOT_TITLE_SPACE, _MIN_TEXT_SPACE)
+        self.indent = " " * (self.title_space + _NOT_TITLE_SPACE)
+        self._buffer: List[str] = []
 
-    # the rest (if any) still aligned but without title
-    for line in wrapped_lines[1:]:
-        result.append(" " * (title_space + not_title_space) + line)
+    def add_block(self, text: str) -> None:
+        """Add a block of text (stripped)."""
+        if self._buffer:
+            self._buffer.append("\n\n")
+        self._buffer.append(text.strip())
+
+    def add_items(self, header: str, items: Iterable[Tuple[str, str]]) -> None:
+        """Add a block with a header and the items aligned below it.
+
+        Each item is a title and a text: the title starts in column 4 with an extra ':',
+        the text starts after the title space; if too wide it's wrapped.
+        """
+        self.add_block(header)
+        buffer = self._buffer
+        for title, text in items:
+            first, *rest = _wrap(text, self.text_space)
+
+            # first line goes with the title at column 4, the rest (if any) still aligned
+            buffer.append(f"\n    {title:>{self.title_space}s}:  {first}")
+            for line in rest:
+                buffer.append("\n")
+                buffer.append(self.indent)
+                buffer.append(line)
+
+    def render(self) -> str:
+        """Return the whole text."""
+        self._buffer.append("\n")
+        return "".join(self._buffer)
+
+
+class HelpCache:
+    """Keep the rendered help texts, both in memory and on disk.
+
+    The texts are stored per terminal width in a file whose name includes a hash of
+    everything that defines them (application name and version, commands, etc.), so the
+    stored texts are never used after any of that changes. Only the most recently written
+    files are kept (up to _HELP_CACHE_MAX_FILES).
+    """
 
-    return result
+    def __init__(self, cache_dir: pathlib.Path, definition_hash: str):
+        self._cache_dir = cache_dir
+        self._filepath = cache_dir / f"help-{definition_hash}.json"
+        self._texts: Optional[Dict[str, str]] = None
+
+    def _load(self) -> Dict[str, str]:
+        """Load the texts from disk, only the first time."""
+        if self._texts is None:
+            try:
+                texts = json.loads(self._filepath.read_text(encoding="utf8"))
+            except (OSError, ValueError):
+                texts = None
+            self._texts = texts if isinstance(texts, dict) else {}
+        return self._texts
+
+    def _save(self) -> None:
+        """Store the texts on disk, removing the oldest files for other definitions."""
+        try:
+            self._cache_dir.mkdir(parents=True, exist_ok=True)
+
+            # write it atomically, other process may be reading it
+            temp_filepath = self._filepath.with_name(f"{self._filepath.name}.{os.getpid()}")
+            temp_filepath.write_text(json.dumps(self._texts), encoding="utf8")
+            temp_filepath.replace(self._filepath)
+
+            others = [
+                (filepath.stat().st_mtime, filepath)
+                for filepath in self._cache_dir.glob("help-*.json")
+                if filepath != self._filepath
+            ]
+            others.sort(reverse=True)
+            kept_others = _HELP_CACHE_MAX_FILES - 1
+            for _, filepath in others[kept_others:]:
+                filepath.unlink()
+        except OSError:
+            # the cache is just an optimization, don't break the help for it
+            pass
+
+    def get(self, name: str, builder: Callable[[], str]) -> str:
+        """Return the text of the given name, using the builder if it's not cached."""
+        texts = self._load()
+        key = f"{_get_terminal_width()}:{name}"
+        text = texts.get(key)
+        if text is None:
+            text = texts[key] = builder()
+            self._save()
+        return text
 
 
 class HelpBuilder:
@@ -104,46 +230,39 @@ class HelpBuilder:
         - all commands grouped, just listed
         - more help
         """
-        textblocks = []
-
-        # title
-        textblocks.append(HEADER.format(appname=self.appname))
-
-        # summary
-        textblocks.append("Summary:" + textwrap.indent(self.general_summary, "    "))
-
-        # column alignment is dictated by longest common commands names and groups names
-        max_title_len = 0
-
         # collect common commands
         common_commands = []
         for command_group in self.command_groups:
-            max_title_len = max(len(command_group.name), max_title_len)
             for cmd in command_group.commands:
                 if cmd.common:
                     common_commands.append(cmd)
-                    max_title_len = max(len(cmd.name), max_title_len)
 
-        for title, _ in global_options:
-            max_title_len = max(len(title), max_title_len)
+        # column alignment is dictated by longest common commands names and groups names
+        titles = [command_group.name for command_group in self.command_groups]
+        titles.extend(cmd.name for cmd in common_commands)
+        titles.extend(title for title, _ in global_options)
+        page = _HelpPage(titles)
+
+        # title and summary
+        page.add_block(HEADER.format(appname=self.appname))
+        page.add_block("Summary:" + textwrap.indent(self.general_summary, "    "))
 
-        global_lines = ["Global options:"]
-        for title, text in global_options:
-            global_lines.extend(_build_item(title, text, max_title_len))
-        textblocks.append("\n".join(global_lines))
+        page.add_items("Global options:", global_options)
 
-        common_lines = ["Starter commands:"]
-        for cmd in sorted(common_commands, key=attrgetter("name")):
-            common_lines.extend(_build_item(cmd.name, cmd.help_msg, max_title_len))
-        textblocks.append("\n".join(common_lines))
+        page.add_items(
+            "Starter commands:",
+            ((cmd.name, cmd.help_msg) for cmd in sorted(common_commands, key=attrgetter("name"))),
+        )
 
-        grouped_lines = ["Commands can be classified as follows:"]
-        for command_group in sorted(self.command_groups, key=attrgetter("name")):
-            command_names = ", ".join(sorted(cmd.name for cmd in command_group.commands))
-            grouped_lines.extend(_build_item(command_group.name, command_names, max_title_len))
-        textblocks.append("\n".join(grouped_lines))
+        page.add_items(
+            "Commands can be classified as follows:",
+            (
+                (command_group.name, ", ".join(sorted(cmd.name for cmd in command_group.commands)))
+                for command_group in sorted(self.command_groups, key=attrgetter("name"))
+            ),
+        )
 
-        textblocks.append(
+        page.add_block(
             textwrap.dedent(
                 f"""
             For more information about a command, run '{self.appname} help <command>'.
@@ -151,10 +270,7 @@ class HelpBuilder:
         """
             )
         )
-
-        # join all stripped blocks, leaving ONE empty blank line between
-        text = "\n\n".join(block.strip() for block in textblocks) + "\n"
-        return text
+        return page.render()
 
     def get_detailed_help(self, global_options: List[Tuple[str, str]]) -> str:
         """Produce the text for the detailed help.
@@ -170,53 +286,58 @@ class HelpBuilder:
         - all commands shown with description, grouped
         - more help
         """
-        textblocks = []
+        # column alignment is dictated by longest commands names and global options
+        titles = [
+            cmd.name for command_group in self.command_groups for cmd in command_group.commands
+        ]
+        titles.extend(title for title, _ in global_options)
+        page = _HelpPage(titles)
 
-        # title
-        textblocks.append(HEADER.format(appname=self.appname))
+        # title and summary
+        page.add_block(HEADER.format(appname=self.appname))
+        page.add_block("Summary:" + textwrap.indent(self.general_summary, "    "))
 
-        # summary
-        textblocks.append("Summary:" + textwrap.indent(self.general_summary, "    "))
+        page.add_items("Global options:", global_options)
 
-        # column alignment is dictated by longest common commands names and groups names
-        max_title_len = 0
+        page.add_block("Commands can be classified as follows:")
         for command_group in self.command_groups:
-            for cmd in command_group.commands:
-                max_title_len = max(len(cmd.name), max_title_len)
-        for title, _ in global_options:
-            max_title_len = max(len(title), max_title_len)
+            page.add_items(
+                f"{command_group.name}:",
+                ((cmd.name, cmd.help_msg) for cmd in command_group.commands),
+            )
 
-        global_lines = ["Global options:"]
-        for title, text in global_options:
-            global_lines.extend(_build_item(title, text, max_title_len))
-        textblocks.append("\n".join(global_lines))
+        page.add_block(
+            f"""
+            For more information about a specific command, run '{self.appname} help <command>'.
+        """
+        )
+        return page.render()
 
-        textblocks.append("Commands can be classified as follows:")
+    def get_search_help(self, query: str, commands: List[Tuple[str, str]]) -> str:
+        """Produce the text with the commands found for the query.
 
-        for command_group in self.command_groups:
-            group_lines = [f"{command_group.name}:"]
-            for cmd in command_group.commands:
-                group_lines.extend(_build_item(cmd.name, cmd.help_msg, max_title_len))
-            textblocks.append("\n".join(group_lines))
+        - query: what the user searched for
 
-        textblocks.append(
-            textwrap.dedent(
-                f"""
-            For more information about a specific command, run '{self.appname} help <command>'.
+        - commands: the found commands, most relevant first, with the (name, help_msg)
+          structure
         """
-            )
+        page = _HelpPage(name for name, _ in commands)
+        if commands:
+            page.add_items(f"Commands matching {query!r}:", commands)
+        else:
+            page.add_block(f"No commands found matching {query!r}.")
+        page.add_block(
+            f"For more information about a command, run '{self.appname} help <command>'."
         )
+        return page.render()
 
-        # join all stripped blocks, leaving ONE empty blank line between
-        text = "\n\n".join(block.strip() for block in textblocks) + "\n"
-        return text
-
-    def get_command_help(  # pylint: disable=too-many-locals
-        self, command: "BaseCommand", arguments: List[Tuple[str, str]]
+    def get_command_help(
+        self, command: Union["BaseCommand", Type["BaseCommand"]], arguments: List[Tuple[str, str]]
     ) -> str:
         """Produce the text for each command's help.
 
-        - command: the instantiated command for which help is prepared
+        - command: the command for which help is prepared (instantiated, or just the class
+          if its arguments are declared statically)
 
         - arguments: all command options and parameters, with the (name, description) structure
 
@@ -228,8 +349,6 @@ class HelpBuilder:
         - other related commands
         - footer
         """
-        textblocks = []
-
         # separate all arguments into the parameters and optional ones, just checking
         # if first char is a dash
         parameters = []
@@ -240,8 +359,11 @@ class HelpBuilder:
             else:
                 parameters.append(name)
 
+        # column alignment is dictated by longest options title
+        page = _HelpPage(title for title, _ in options)
+
         joined_params = " ".join(f"<{parameter}>" for parameter in parameters)
-        textblocks.append(
+        page.add_block(
             textwrap.dedent(
                 f"""\
             Usage:
@@ -252,40 +374,28 @@ class HelpBuilder:
 
         assert command.overview is not None  # for typing purposes
         indented_overview = textwrap.indent(command.overview, "    ")
-        textblocks.append(f"Summary:{indented_overview}")
-
-        # column alignment is dictated by longest options title
-        max_title_len = max(len(title) for title, text in options)
+        page.add_block(f"Summary:{indented_overview}")
 
         # command options
-        option_lines = ["Options:"]
-        for title, text in options:
-            option_lines.extend(_build_item(title, text, max_title_len))
-        textblocks.append("\n".join(option_lines))
+        page.add_items("Options:", options)
 
-        # recommend other commands of the same group
+        # recommend other commands of the same group (compared by name, as the group may
+        # hold lazy commands which are not imported)
         for command_group in self.command_groups:
-            if any(isinstance(command, command_class) for command_class in command_group.commands):
+            if any(command.name == command_class.name for command_class in command_group.commands):
                 break
         else:
             raise RuntimeError("Internal inconsistency in commands groups")
         other_command_names = [
             c.name
             for c in command_group.commands  # pylint: disable=undefined-loop-variable
-            if not isinstance(command, c)
+            if c.name != command.name
         ]
         if other_command_names:
             see_also_block = ["See also:"]
             see_also_block.extend(("    " + name) for name in sorted(other_command_names))
-            textblocks.append("\n".join(see_also_block))
+            page.add_block("\n".join(see_also_block))
 
         # footer
-        textblocks.append(
-            f"""
-            For a summary of all commands, run '{self.appname} help --all'.
-        """
-        )
-
-        # join all stripped blocks, leaving ONE empty blank line between
-        text = "\n\n".join(block.strip() for block in textblocks) + "\n"
-        return text
+        page.add_block(f"For a summary of all commands, run '{self.appname} help --all'.")
+        return page.render()
@@ -18,27 +18,44 @@
 
 __all__ = [
     "EmitterMode",
+    "RunResult",
     "TESTMODE",
     "emit",
 ]
 
 import enum
+import heapq
 import itertools
+import json
 import logging
 import math
 import os
 import pathlib
-import queue
-import select
+import selectors
+import shlex
 import shutil
+import subprocess
 import sys
 import threading
 import time
 import traceback
+from collections import deque, namedtuple
 from dataclasses import dataclass, field
 from datetime import datetime
-from functools import lru_cache
-from typing import Literal, Optional, TextIO, Union
+from functools import lru_cache, partial
+from typing import (
+    Callable,
+    Deque,
+    Dict,
+    Iterator,
+    List,
+    Literal,
+    Optional,
+    Sequence,
+    TextIO,
+    Tuple,
+    Union,
+)
 
 import platformdirs
 
@@ -49,7 +66,17 @@ try:
 except ImportError:
     _WINDOWS_MODE = False
 
-from craft_cli import errors
+from craft_cli import diagnostics, errors
+from craft_cli.sinks import LogSink, SinkRecord, SinkWorker
+
+RunResult = namedtuple("RunResult", "returncode duration stdout_size stderr_size")
+"""The result of a subprocess run by ``Emitter.run``.
+
+:param returncode: the code returned by the subprocess.
+:param duration: the seconds it took to run.
+:param stdout_size: how many bytes the subprocess wrote to its stdout.
+:param stderr_size: how many bytes the subprocess wrote to its stderr.
+"""
 
 
 @lru_cache
@@ -69,6 +96,8 @@ class _MessageInfo:  # pylint: disable=too-many-instance-attributes
     use_timestamp: bool = False
     end_line: bool = False
     created_at: datetime = field(default_factory=datetime.now)
+    kind: str = "message"
+    level: Optional[int] = None
 
 
 # the different modes the Emitter can be set
@@ -89,6 +118,70 @@ _SPINNER_DELAY = 0.1
 # the size of bytes chunk that the pipe reader will read at once
 _PIPE_READER_CHUNK_SIZE = 4096
 
+# the max length (in bytes) of the lines from the subprocesses; longer ones are split in
+# segments of this size, which are logged as continuation records
+_PIPE_READER_MAX_LINE_LENGTH = 64 * 1024
+
+# max lines from the subprocesses waiting to be shown in the screen; if it's slower than
+# the subprocesses' output the oldest lines are dropped (they are always logged)
+_SCREEN_QUEUE_SIZE = 1000
+
+# the prefix for the continuation records of the lines longer than the max length
+_CONTINUATION_PREFIX = ":+ "
+
+# the max bytes moved at once from the pipe to the log when capturing the raw output
+_RAW_CAPTURE_CHUNK_SIZE = 1024 * 1024
+
+# the prefixes for the lines from the subprocesses' stdout and stderr, when run by the emitter
+_RUN_STDOUT_PREFIX = ":: "
+_RUN_STDERR_PREFIX = ":! "
+
+# how many of the last lines from the subprocesses run by the emitter are kept for errors
+_RUN_TAIL_LINES = 20
+
+# the raw output is moved by the kernel (without copying it to/from user space) if possible
+_SPLICE_AVAILABLE = hasattr(os, "splice")
+
+# max seconds that the plain output (used when not writing to a terminal) is kept buffered
+_PLAIN_FLUSH_INTERVAL = 0.5
+
+# max size of the plain output buffer before it's forced to be written
+_PLAIN_BUFFER_SIZE = 65536
+
+# seconds of each "frame" in which the output to terminals is accumulated and written at
+# once (if 0, everything is written immediately), and the max size accumulated
+_FRAME_INTERVAL = 0.04
+_FRAME_BUFFER_SIZE = 65536
+
+# min seconds between showing two ephemeral messages in the plain output (the latest one
+# skipped meanwhile is shown anyway before the next permanent message)
+_PLAIN_EPHEMERAL_INTERVAL = 2
+
+# environment variable to force the plain output ("1") or the terminal one ("0")
+_PLAIN_OUTPUT_ENVVAR = "CRAFT_CLI_PLAIN_OUTPUT"
+
+# max frames shown (for each exception) when reporting a traceback in the screen
+_TRACEBACK_MAX_FRAMES = 30
+
+# max chained exceptions shown when reporting a traceback in the screen
+_TRACEBACK_MAX_CHAIN = 5
+
+# max seconds to wait for the diagnostic bundle to be written when finishing with an error
+_DIAGNOSTIC_BUNDLE_TIMEOUT = 2
+
+# the level of the records sent to the log sinks, for each kind of message (the ones
+# coming from the logging module have their own level)
+_KIND_LEVELS = {
+    "message": logging.INFO,
+    "progress": logging.INFO,
+    "trace": logging.DEBUG,
+    "error": logging.ERROR,
+    "subprocess": logging.INFO,
+}
+
+# max seconds to wait for the log sinks to write their pending records when finishing
+_LOG_SINK_STOP_TIMEOUT = 1
+
 # set to true when running *application* tests so some behaviours change
 TESTMODE = False
 
@@ -130,25 +223,207 @@ def _get_log_filepath(appname: str) -> pathlib.Path:
     return basedir / filename
 
 
-def _get_traceback_lines(exc: BaseException):
-    """Get the traceback lines (if any) from an exception."""
-    tback_lines = traceback.format_exception(type(exc), exc, exc.__traceback__)
-    for tback_line in tback_lines:
-        for real_line in tback_line.rstrip().split("\n"):
-            yield real_line
+def _get_exception_chain(exc: BaseException) -> List[Tuple[BaseException, str]]:
+    """Get the exception and those that caused it, with the messages that link them.
+
+    The chain is ordered from the given exception to the first one raised.
+    """
+    chain = []
+    seen = set()
+    current: Optional[BaseException] = exc
+    while current is not None and id(current) not in seen:
+        seen.add(id(current))
+        if current.__cause__ is not None:
+            link = "The above exception was the direct cause of the following exception:"
+            following = current.__cause__
+        elif current.__context__ is not None and not current.__suppress_context__:
+            link = "During handling of the above exception, another exception occurred:"
+            following = current.__context__
+        else:
+            link = ""
+            following = None
+        chain.append((current, link))
+        current = following
+    return chain
+
+
+def _get_bounded_exception_lines(exc: BaseException, max_frames: int) -> List[str]:
+    """Get the traceback lines of only one exception, with no more than the given frames.
+
+    Consecutive repetitions of the same frame (e.g. in a deep recursion) are collapsed, and
+    if still too many frames only those from the beginning and the end are shown.
+    """
+    # group the consecutive repeated frames, just using the frames' code and line
+    runs: List[List] = []
+    for frame, lineno in traceback.walk_tb(exc.__traceback__):
+        if runs and runs[-1][0][0].f_code is frame.f_code and runs[-1][0][1] == lineno:
+            runs[-1][1] += 1
+        else:
+            runs.append([(frame, lineno), 1])
+
+    if len(runs) > max_frames:
+        head_size = max_frames // 2
+        tail_start = len(runs) - (max_frames - head_size)
+        omitted = sum(count for _, count in runs[head_size:tail_start])
+        parts = [runs[:head_size], runs[tail_start:]]
+    else:
+        omitted = 0
+        parts = [runs]
+
+    lines = []
+    if runs:
+        lines.append("Traceback (most recent call last):")
+    for idx, part in enumerate(parts):
+        if idx:
+            lines.append(f"  [{omitted} frames omitted]")
+        # only the shown frames are looked up for their source lines
+        summaries = traceback.StackSummary.extract(frame_info for frame_info, _ in part)
+        for summary, (_, count) in zip(summaries, part):
+            lines.append(f'  File "{summary.filename}", line {summary.lineno}, in {summary.name}')
+            if summary.line:
+                lines.append(f"    {summary.line.strip()}")
+            if count > 1:
+                lines.append(f"  [previous frame repeated {count - 1} times]")
+
+    for exc_line in traceback.format_exception_only(type(exc), exc):
+        lines.extend(exc_line.rstrip().split("\n"))
+    return lines
+
+
+def _get_traceback_lines(
+    exc: BaseException, *, max_frames: Optional[int] = None, max_chain: Optional[int] = None
+):
+    """Get the traceback lines (if any) from an exception.
+
+    If no limits are given the whole traceback is produced; otherwise no more than
+    `max_frames` frames are shown for each exception, and no more than `max_chain`
+    chained exceptions (those that caused the given one, or were being handled).
+    """
+    if max_frames is None and max_chain is None:
+        tback_lines = traceback.format_exception(type(exc), exc, exc.__traceback__)
+        for tback_line in tback_lines:
+            for real_line in tback_line.rstrip().split("\n"):
+                yield real_line
+        return
+
+    chain = _get_exception_chain(exc)
+    if max_chain is not None and len(chain) > max_chain:
+        yield f"[{len(chain) - max_chain} more chained exceptions omitted]"
+        chain = chain[:max_chain]
+    for idx, (chained_exc, link) in enumerate(reversed(chain)):
+        if link and idx:
+            # the message linking this exception with the one that caused it (not for
+            # the first one shown, as the previous may be omitted)
+            yield ""
+            yield link
+        yield from _get_bounded_exception_lines(
+            chained_exc, _TRACEBACK_MAX_FRAMES if max_frames is None else max_frames
+        )
+
+
+class _ScheduledCall:
+    """A call registered in the scheduler, which can be cancelled before it's due."""
+
+    def __init__(self, due: float, callback: Callable[[], None]):
+        self.due = due
+        self.callback = callback
+        self.cancelled = False
+
+    def __lt__(self, other: "_ScheduledCall") -> bool:
+        return self.due < other.due
 
+    def cancel(self) -> None:
+        """Do not call it (if not called yet)."""
+        self.cancelled = True
 
-class _Spinner(threading.Thread):
-    """A supervisor thread that will repeat long-standing messages with a spinner besides it.
 
-    This will be a long-lived single thread that will supervise each message received
-    through the `supervise` method, and when it stays too long, the printer's `spin`
-    will be called with that message and a text to "draw" a spinner, including the elapsed
-    time.
+class _Scheduler(threading.Thread):
+    """A thread that runs all the time-driven actions (e.g. spinning, flushing) when due.
+
+    The scheduled calls are kept in a heap, and the thread just sleeps until the
+    earliest one is due; if there is nothing scheduled it sleeps until something is, so
+    it never wakes up without work to do.
+
+    The thread is started on the first scheduled call, and it's a daemon so it does not
+    hold the application when finishing. The callbacks are run in the thread, so they
+    must be quick and not block.
+    """
+
+    # the clock used for the due times (kept here, so it's not affected if the one in the
+    # time module is replaced)
+    clock = staticmethod(time.monotonic)
+
+    def __init__(self) -> None:
+        super().__init__(daemon=True)
+        self.condition = threading.Condition()
+        self.heap: List[_ScheduledCall] = []
+
+    def call_later(self, delay: float, callback: Callable[[], None]) -> _ScheduledCall:
+        """Schedule the callback to be called after the given seconds."""
+        scheduled = _ScheduledCall(self.clock() + delay, callback)
+        with self.condition:
+            if self.ident is None:
+                self.start()
+            heapq.heappush(self.heap, scheduled)
+            # wake up the thread only if this call is the new earliest one
+            if self.heap[0] is scheduled:
+                self.condition.notify()
+        return scheduled
+
+    def _get_due(self) -> List[_ScheduledCall]:
+        """Wait until there are calls due, and return them."""
+        with self.condition:
+            while True:
+                while self.heap and self.heap[0].cancelled:
+                    heapq.heappop(self.heap)
+                if not self.heap:
+                    self.condition.wait()
+                    continue
+                now = self.clock()
+                if self.heap[0].due > now:
+                    self.condition.wait(self.heap[0].due - now)
+                    continue
+                due = []
+                while self.heap and self.heap[0].due <= now:
+                    due.append(heapq.heappop(self.heap))
+                return due
+
+    def run(self) -> None:
+        while True:
+            for scheduled in self._get_due():
+                if scheduled.cancelled:
+                    continue
+                try:
+                    scheduled.callback()
+                except Exception:  # pylint: disable=broad-except
+                    # report it as any thread would do, but keep running the other calls
+                    threading.excepthook(threading.ExceptHookArgs([*sys.exc_info(), self]))
+
+
+# the scheduler used by all the time-driven actions
+_scheduler = _Scheduler()
+
+
+def _reset_scheduler() -> None:
+    """Use a new scheduler in a forked child, as the thread of the parent's one is not there."""
+    global _scheduler  # pylint: disable=global-statement
+    _scheduler = _Scheduler()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_scheduler)
+
+
+class _Spinner:
+    """A supervisor that will repeat long-standing messages with a spinner besides it.
+
+    Each message received through the `supervise` method is supervised, and when it stays
+    too long, the printer's `spin` will be called with that message and a text to "draw" a
+    spinner, including the elapsed time.
 
     The timing related part of the code uses two constants: _SPINNER_THRESHOLD is how
     many seconds before activating the spinner for the message, and _SPINNER_DELAY is
-    the time between `spin` calls.
+    the time between `spin` calls; those calls are done by the scheduler thread.
 
     When a new message arrives (or None, to indicate that there is nothing to supervise) and
     the previous message was "being spinned", a last `spin` call will be done to clean
@@ -156,87 +431,224 @@ class _Spinner(threading.Thread):
     """
 
     def __init__(self, printer: "_Printer"):
-        super().__init__()
-        # special flag used to stop the spinner thread
-        self.stop_flag = object()
-
-        # daemon mode, so if the app crashes this thread does not holds everything
-        self.daemon = True
-
-        # communication from the printer
-        self.queue: queue.Queue = queue.Queue()
-
         # hold the printer, to make it spin
         self.printer = printer
 
-        # a lock to wait the spinner to stop spinning
-        self.lock = threading.Lock()
+        # the supervised message, since when, and the spinner chars if it's being spinned
+        self.prv_msg: Optional[_MessageInfo] = None
+        self.t_init = time.time()
+        self.spinchars: Optional[Iterator[str]] = None
 
-    def run(self) -> None:
-        prv_msg = None
-        t_init = time.time()
-        while prv_msg is not self.stop_flag:
-            try:
-                new_msg = self.queue.get(timeout=_SPINNER_THRESHOLD)
-            except queue.Empty:
-                # waited too much, start to show a spinner (if have a previous message) until
-                # we have further info
-                if prv_msg is None or prv_msg.end_line:
-                    continue
-                spinchars = itertools.cycle("-\\|/")
-                with self.lock:
-                    while True:
-                        t_delta = time.time() - t_init
-                        spintext = f" {next(spinchars)} ({t_delta:.1f}s)"
-                        self.printer.spin(prv_msg, spintext)
-                        try:
-                            new_msg = self.queue.get(timeout=_SPINNER_DELAY)
-                        except queue.Empty:
-                            # still nothing! keep going
-                            continue
-                        # got a new message: clean the spinner and exit from the spinning state
-                        self.printer.spin(prv_msg, " ")
-                        break
-
-            prv_msg = new_msg
-            t_init = time.time()
+        # the next scheduled spin, and a counter to discard those already superseded (as a
+        # call may be running while a new message arrives)
+        self.scheduled: Optional[_ScheduledCall] = None
+        self.generation = 0
+
+        # a lock to not supervise a new message while spinning
+        self.lock = threading.Lock()
+        self.active = False
+
+    def start(self) -> None:
+        """Start supervising."""
+        self.active = True
+
+    def is_alive(self) -> bool:
+        """Tell if the spinner is supervising messages."""
+        return self.active
+
+    def _reset(self) -> None:
+        """Cancel the spinning of the previous message, cleaning the spinner if shown."""
+        self.generation += 1
+        if self.scheduled is not None:
+            self.scheduled.cancel()
+            self.scheduled = None
+        if self.spinchars is not None:
+            self.printer.spin(self.prv_msg, " ")  # type: ignore
+            self.spinchars = None
+
+    def _schedule(self, delay: float) -> None:
+        """Schedule the next spin for the supervised message."""
+        generation = self.generation
+        self.scheduled = _scheduler.call_later(delay, lambda: self._spin(generation))
+
+    def _spin(self, generation: int) -> None:
+        """Show the spinner besides the supervised message."""
+        with self.lock:
+            if generation != self.generation:
+                return
+            if self.spinchars is None:
+                self.spinchars = itertools.cycle("-\\|/")
+            t_delta = time.time() - self.t_init
+            spintext = f" {next(self.spinchars)} ({t_delta:.1f}s)"
+            self.printer.spin(self.prv_msg, spintext)  # type: ignore
+            self._schedule(_SPINNER_DELAY)
 
     def supervise(self, message: Optional[_MessageInfo]) -> None:
         """Supervise a message to spin it if it remains too long."""
-        self.queue.put(message)
-        # (maybe) wait for the spinner to exit spinning state (which does some cleaning)
-        self.lock.acquire()  # pylint: disable=consider-using-with
-        self.lock.release()
+        with self.lock:
+            self._reset()
+            self.prv_msg = message
+            self.t_init = time.time()
+            if message is not None and not message.end_line:
+                self._schedule(_SPINNER_THRESHOLD)
 
     def stop(self) -> None:
-        """Stop self."""
-        self.queue.put(self.stop_flag)
-        self.join()
+        """Stop supervising."""
+        with self.lock:
+            self._reset()
+            self.active = False
+
+
+class _BufferedWriter:
+    """Accumulate the text to be written to a stream, and write it in chunks.
+
+    The pending text is written when a different stream needs to be used (so the order
+    of the messages between streams is kept), when it exceeds _PLAIN_BUFFER_SIZE, when
+    it's explicitly flushed, or at most after _PLAIN_FLUSH_INTERVAL seconds.
+    """
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.stream: Optional[TextIO] = None
+        self.pending: List[str] = []
+        self.pending_size = 0
+        self.timer: Optional[_ScheduledCall] = None
+
+    def _flush(self) -> None:
+        """Write all the pending text to the stream (the lock must be acquired)."""
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        self._write_pending()
+
+    def _write_pending(self) -> None:
+        """Write the pending text, if any, without touching the timer."""
+        if self.pending:
+            assert self.stream is not None
+            self.stream.write("".join(self.pending))
+            self.stream.flush()
+            self.pending.clear()
+            self.pending_size = 0
+
+    def write(self, stream: TextIO, text: str) -> None:
+        """Buffer the text to be written to the given stream."""
+        with self.lock:
+            if stream is not self.stream:
+                self._flush()
+                self.stream = stream
+
+            self.pending.append(text)
+            self.pending_size += len(text)
+            if self.pending_size >= _PLAIN_BUFFER_SIZE:
+                self._flush()
+            elif self.timer is None:
+                self.timer = _scheduler.call_later(_PLAIN_FLUSH_INTERVAL, self.flush)
+
+    def flush(self) -> None:
+        """Write all the pending text."""
+        with self.lock:
+            self._flush()
+
+
+class _FrameWriter(_BufferedWriter):
+    """Accumulate the text to be written to terminals, and write it once per frame.
+
+    When idle the text is written right away, starting a frame of _FRAME_INTERVAL seconds:
+    all the text written during it is accumulated and written at once when it ends (or
+    before, if it exceeds _FRAME_BUFFER_SIZE, or a different stream needs to be used). So
+    sporadic messages are not delayed, but high rate outputs are written in big chunks.
+
+    As the text is written in the same order it was received (carriage returns included),
+    the final result in the terminal is the same, just without the intermediate states.
+    """
+
+    def write(self, stream: TextIO, text: str) -> None:
+        """Buffer the text to be written to the given stream, or write it if idle."""
+        with self.lock:
+            if stream is not self.stream:
+                self._write_pending()
+                self.stream = stream
+
+            self.pending.append(text)
+            self.pending_size += len(text)
+            if self.timer is None:
+                self._write_pending()
+                if _FRAME_INTERVAL:
+                    self.timer = _scheduler.call_later(_FRAME_INTERVAL, self.flush)
+            elif self.pending_size >= _FRAME_BUFFER_SIZE:
+                # the frame continues, even if this part was written earlier
+                self._write_pending()
 
 
 class _Printer:
     """Handle writing the different messages to the different outputs (out, err and log).
 
+    Messages to terminals are written "in place" (completing the lines, overwriting the
+    ephemeral messages, etc.), while to other streams (a file, a pipe) each message is
+    written in a plain line, buffered (the writes to terminals are also accumulated and done
+    once per frame, see `_FrameWriter`); the plain output can be forced on or off for all streams
+    with the `plain_output` parameter, or the CRAFT_CLI_PLAIN_OUTPUT environment variable.
+
+    The spinner supervisor is started on demand, the first time a message is shown in a
+    terminal; if no message ever goes to a terminal (e.g. when the outputs are pipes) the
+    spinner never supervises anything.
+
     If TESTMODE is True, this class changes its behaviour: the spinner is never started,
-    so there is no thread polluting messages when running tests if they take too long to run.
+    so nothing pollutes the messages when running tests if they take too long to run.
     """
 
-    def __init__(self, log_filepath: pathlib.Path) -> None:
+    def __init__(
+        self,
+        log_filepath: pathlib.Path,
+        plain_output: Optional[bool] = None,
+        log_sinks: Sequence[LogSink] = (),
+    ) -> None:
         self.stopped = False
 
+        # decide the output strategy: forced by the caller, by the environment, or (if None)
+        # later for each stream according to its capabilities
+        if plain_output is None and os.environ.get(_PLAIN_OUTPUT_ENVVAR) in ("0", "1"):
+            plain_output = os.environ[_PLAIN_OUTPUT_ENVVAR] == "1"
+        self.plain_output = plain_output
+
+        # the writer used for the plain output, when the last ephemeral message was shown there,
+        # and the latest one skipped since then, to avoid showing them too frequently
+        self.plain_writer = _BufferedWriter()
+        self.prv_plain_ephemeral_moment: Optional[float] = None
+        self.held_plain_ephemeral: Optional[_MessageInfo] = None
+
+        # the writer used for the output to terminals
+        self.screen_writer = _FrameWriter()
+
         # holder of the previous message
         self.prv_msg: Optional[_MessageInfo] = None
 
         # open the log file (will be closed explicitly later)
         self.log = open(log_filepath, "wt", encoding="utf8")  # pylint: disable=consider-using-with
 
+        # the workers that send the logged records to the other destinations (if any)
+        self.sink_workers = [SinkWorker(sink) for sink in log_sinks]
+        for worker in self.sink_workers:
+            worker.start()
+
         # keep account of output streams with unfinished lines
         self.unfinished_stream: Optional[TextIO] = None
 
-        # run the spinner supervisor
+        # the spinner supervisor, started later only if needed (see `_show`)
         self.spinner = _Spinner(self)
-        if not TESTMODE:
-            self.spinner.start()
+        self.spinner_lock = threading.Lock()
+
+    def _complete_previous_line(self, stream: Optional[TextIO]) -> str:
+        """Complete the line of the previous message.
+
+        If the previous message went to the same stream the newline is returned, to be
+        written together with the new message; otherwise it's written in its stream.
+        """
+        assert self.prv_msg is not None  # for typing purposes
+        if self.prv_msg.stream is stream:
+            return "\n"
+        self.screen_writer.write(self.prv_msg.stream, "\n")  # type: ignore
+        return ""
 
     def _write_line(self, message: _MessageInfo, *, spintext: str = "") -> None:
         """Write a simple line message to the screen."""
@@ -249,17 +661,16 @@ class _Printer:
 
         if spintext:
             # forced to overwrite the previous message to present the spinner
-            maybe_cr = "\r"
+            prefix = "\r"
         elif self.prv_msg is None or self.prv_msg.end_line:
             # first message, or previous message completed the line: start clean
-            maybe_cr = ""
+            prefix = ""
         elif self.prv_msg.ephemeral:
             # the last one was ephemeral, overwrite it
-            maybe_cr = "\r"
+            prefix = "\r"
         else:
             # complete the previous line, leaving that message ok
-            maybe_cr = ""
-            print(flush=True, file=self.prv_msg.stream)
+            prefix = self._complete_previous_line(message.stream)
 
         # fill with spaces until the very end, on one hand to clear a possible previous message,
         # but also to always have the cursor at the very end
@@ -275,29 +686,33 @@ class _Printer:
                 text = text[-remaining_for_last_line:]
                 if len(text) > usable:
                     text = text[: usable - 1] + "…"
-        cleaner = " " * (usable - len(text) % width)
+        # for multiline messages fill all the lines, not only the last one
+        *previous_lines, last_line = text.split("\n")
+        filled = "".join(
+            line + " " * (width - 1 - len(line) % width) + "\n" for line in previous_lines
+        )
+        cleaner = " " * (usable - len(last_line) % width)
 
-        line = maybe_cr + text + spintext + cleaner
-        print(line, end="", flush=True, file=message.stream)
+        line = prefix + filled + last_line + spintext + cleaner
         if message.end_line:
             # finish the just shown line, as we need a clean terminal for some external thing
-            print(flush=True, file=message.stream)
+            line += "\n"
             self.unfinished_stream = None
         else:
             self.unfinished_stream = message.stream
+        self.screen_writer.write(message.stream, line)  # type: ignore
 
     def _write_bar(self, message: _MessageInfo) -> None:
         """Write a progress bar to the screen."""
         if self.prv_msg is None or self.prv_msg.end_line:
             # first message, or previous message completed the line: start clean
-            maybe_cr = ""
+            prefix = ""
         elif self.prv_msg.ephemeral:
             # the last one was ephemeral, overwrite it
-            maybe_cr = "\r"
+            prefix = "\r"
         else:
             # complete the previous line, leaving that message ok
-            maybe_cr = ""
-            print(flush=True, file=self.prv_msg.stream)
+            prefix = self._complete_previous_line(message.stream)
 
         numerical_progress = f"{message.bar_progress}/{message.bar_total}"
         bar_percentage = min(message.bar_progress / message.bar_total, 1)  # type: ignore
@@ -313,12 +728,12 @@ class _Printer:
             completed_width = math.floor(bar_width * min(bar_percentage, 100))
             completed_bar = _PROGRESS_BAR_SYMBOL * completed_width
             empty_bar = " " * (bar_width - completed_width)
-            line = f"{maybe_cr}{message.text} [{completed_bar}{empty_bar}] {numerical_progress}"
+            line = f"{prefix}{message.text} [{completed_bar}{empty_bar}] {numerical_progress}"
         else:
             text = message.text[: terminal_width - 1]  # space for cursor
-            line = f"{maybe_cr}{text}"
+            line = f"{prefix}{text}"
 
-        print(line, end="", flush=True, file=message.stream)
+        self.screen_writer.write(message.stream, line)  # type: ignore
         self.unfinished_stream = message.stream
 
     def _show(self, msg: _MessageInfo) -> None:
@@ -327,22 +742,110 @@ class _Printer:
         if msg.stream is None:
             return
 
+        if self._use_plain_output(msg.stream):
+            # the terminal (if any) is left clean: its unfinished line is completed and
+            # nothing is spinning there anymore
+            if self.spinner.is_alive():
+                self.spinner.supervise(None)
+            if self.unfinished_stream is not None:
+                self.screen_writer.write(self.unfinished_stream, "\n")
+                self.unfinished_stream = None
+            self.prv_msg = None
+            self._write_plain(msg)
+            return
+
+        # the spinner is only useful in a terminal, start it when first needed
+        if not self.spinner.is_alive() and _stream_is_terminal(msg.stream):
+            self._start_spinner()
+        spinner_alive = self.spinner.is_alive()
+
         if msg.bar_progress is None:
             # regular message, send it to the spinner and write it
-            self.spinner.supervise(msg)
+            if spinner_alive:
+                self.spinner.supervise(msg)
             self._write_line(msg)
         else:
             # progress bar, send None to the spinner (as it's not a "spinnable" message)
             # and write it
-            self.spinner.supervise(None)
+            if spinner_alive:
+                self.spinner.supervise(None)
             self._write_bar(msg)
         self.prv_msg = msg
 
+    def _use_plain_output(self, stream: TextIO) -> bool:
+        """Tell if the plain output should be used for the given stream."""
+        if self.plain_output is None:
+            return not _stream_is_terminal(stream)
+        return self.plain_output
+
+    def _write_plain(self, message: _MessageInfo) -> None:
+        """Write a message as a plain line (no padding nor overwriting), buffered.
+
+        Ephemeral messages (including progress bars) are skipped if they come too fast after
+        the last one shown, but the latest skipped one is shown before the next permanent
+        message (or when stopping), and the completion of a progress bar is always shown.
+        """
+        if message.ephemeral:
+            now = time.monotonic()
+            completed = message.bar_progress is not None and (
+                message.bar_progress >= message.bar_total  # type: ignore
+            )
+            prv_moment = self.prv_plain_ephemeral_moment
+            if not completed and prv_moment is not None:
+                if now - prv_moment < _PLAIN_EPHEMERAL_INTERVAL:
+                    self.held_plain_ephemeral = message
+                    return
+            self.prv_plain_ephemeral_moment = now
+            self.held_plain_ephemeral = None
+        else:
+            self._write_held_plain()
+        self._write_plain_line(message)
+
+    def _write_held_plain(self) -> None:
+        """Write the latest ephemeral message skipped in the plain output, if any."""
+        if self.held_plain_ephemeral is not None:
+            self._write_plain_line(self.held_plain_ephemeral)
+            self.held_plain_ephemeral = None
+
+    def _write_plain_line(self, message: _MessageInfo) -> None:
+        """Write the line for the message in the plain output."""
+        if message.use_timestamp:
+            timestamp_str = message.created_at.isoformat(sep=" ", timespec="milliseconds")
+            text = timestamp_str + " " + message.text
+        else:
+            text = message.text
+        if message.bar_progress is not None:
+            text += f" [{message.bar_progress}/{message.bar_total}]"
+
+        assert message.stream is not None  # for typing purposes
+        self.plain_writer.write(message.stream, text + "\n")
+
+    def _start_spinner(self) -> None:
+        """Start the spinner supervisor, if not already started and not in test mode."""
+        if TESTMODE:
+            return
+        with self.spinner_lock:
+            if not self.spinner.is_alive():
+                self.spinner.start()
+
     def _log(self, message: _MessageInfo) -> None:
-        """Write the line message to the log file."""
+        """Write the line message to the log file, and send it to the log sinks."""
         # prepare the text with (maybe) the timestamp
         timestamp_str = message.created_at.isoformat(sep=" ", timespec="milliseconds")
         self.log.write(f"{timestamp_str} {message.text}\n")
+        if self.sink_workers:
+            self._send_to_sinks(message.created_at, [message.text], message.kind, message.level)
+
+    def _send_to_sinks(
+        self, created_at: datetime, lines: List[str], kind: str, level: Optional[int]
+    ) -> None:
+        """Queue the lines as records for all the log sinks."""
+        if level is None:
+            level = _KIND_LEVELS[kind]
+        for line in lines:
+            record = SinkRecord(created_at=created_at, text=line, kind=kind, level=level)
+            for worker in self.sink_workers:
+                worker.put(record)
 
     def spin(self, message: _MessageInfo, spintext: str) -> None:
         """Write a line message including a spin text."""
@@ -358,8 +861,14 @@ class _Printer:
         use_timestamp: bool = False,
         end_line: bool = False,
         avoid_logging: bool = False,
+        kind: str = "message",
+        level: Optional[int] = None,
     ) -> None:
-        """Show a text to the given stream if not stopped."""
+        """Show a text to the given stream if not stopped.
+
+        The kind and level are only used for the records sent to the log sinks (by default
+        the level depends on the kind).
+        """
         if self.stopped:
             return
 
@@ -369,11 +878,52 @@ class _Printer:
             ephemeral=ephemeral,
             use_timestamp=use_timestamp,
             end_line=end_line,
+            kind=kind,
+            level=level,
         )
         self._show(msg)
         if not avoid_logging:
             self._log(msg)
 
+    def show_lines(
+        self,
+        stream: Optional[TextIO],
+        lines: List[str],
+        *,
+        use_timestamp: bool = False,
+        log_lines: Optional[List[str]] = None,
+        kind: str = "message",
+    ) -> None:
+        """Show several lines at once to the given stream if not stopped, and log them.
+
+        All the lines are written to the screen in one go, and also to the log (where
+        different lines may be sent, e.g. a more complete version of the shown ones).
+        """
+        if self.stopped:
+            return
+
+        created_at = datetime.now()
+        timestamp_str = created_at.isoformat(sep=" ", timespec="milliseconds")
+        if lines:
+            if use_timestamp:
+                shown_lines = [f"{timestamp_str} {line}" for line in lines]
+            else:
+                shown_lines = lines
+            msg = _MessageInfo(
+                stream=stream,
+                text="\n".join(line.rstrip() for line in shown_lines),
+                end_line=True,
+                created_at=created_at,
+            )
+            self._show(msg)
+
+        if log_lines is None:
+            log_lines = lines
+        log_lines = [line.rstrip() for line in log_lines]
+        self.log.write("".join(f"{timestamp_str} {line}\n" for line in log_lines))
+        if self.sink_workers:
+            self._send_to_sinks(created_at, log_lines, kind, None)
+
     def progress_bar(
         self,
         stream: Optional[TextIO],
@@ -395,14 +945,29 @@ class _Printer:
         """Stop the printing infrastructure.
 
         In detail:
-        - stop the spinner
-        - add a new line to the screen (if needed)
+        - stop the spinner (if it was started)
+        - write the pending plain output (including a skipped ephemeral message)
+        - add a new line to the screen (if needed) and write the pending output there
+        - stop the log sinks (reporting in the log any problem they had)
         - close the log file
         """
-        if not TESTMODE:
-            self.spinner.stop()
+        with self.spinner_lock:
+            if self.spinner.is_alive():
+                self.spinner.stop()
+        self._write_held_plain()
+        self.plain_writer.flush()
         if self.unfinished_stream is not None:
-            print(flush=True, file=self.unfinished_stream)
+            self.screen_writer.write(self.unfinished_stream, "\n")
+        self.screen_writer.flush()
+        for worker in self.sink_workers:
+            worker.stop()
+        deadline = time.monotonic() + _LOG_SINK_STOP_TIMEOUT
+        for worker in self.sink_workers:
+            worker.wait(max(deadline - time.monotonic(), 0))
+            report = worker.get_report()
+            if report is not None:
+                timestamp_str = datetime.now().isoformat(sep=" ", timespec="milliseconds")
+                self.log.write(f"{timestamp_str} {report}\n")
         self.log.close()
         self.stopped = True
 
@@ -440,22 +1005,193 @@ class _Progresser:
         self.printer.progress_bar(self.stream, self.text, self.accumulated, self.total)
 
 
+class _ScreenFeeder(threading.Thread):
+    """A thread that shows in the screen the lines from a subprocess.
+
+    The lines are queued and shown independently of how they are read (and logged), so a
+    slow terminal never stops the reading of the subprocess output (which would block the
+    subprocess itself when the OS pipe gets full). The queue is bounded: if it's full the
+    oldest lines are dropped, and where they were a line indicating how many were omitted
+    is shown instead.
+    """
+
+    def __init__(self, printer: _Printer, stream: TextIO, queue_size: int = _SCREEN_QUEUE_SIZE):
+        super().__init__(daemon=True)
+        self.printer = printer
+        self.stream = stream
+        self.queue: Deque[str] = deque(maxlen=queue_size)
+        self.omitted = 0
+        self.stop_flag = False
+        self.condition = threading.Condition()
+
+    def put(self, text: str) -> None:
+        """Queue a line to be shown, dropping the oldest one if the queue is full."""
+        with self.condition:
+            if len(self.queue) == self.queue.maxlen:
+                self.omitted += 1
+            self.queue.append(text)
+            self.condition.notify()
+
+    def _get(self) -> Tuple[int, Optional[str]]:
+        """Wait for a line to show (None if stopped), also returning the lines omitted before it."""
+        with self.condition:
+            while not self.queue and not self.stop_flag:
+                self.condition.wait()
+            omitted = self.omitted
+            self.omitted = 0
+            text = self.queue.popleft() if self.queue else None
+        return omitted, text
+
+    def run(self) -> None:
+        """Show the queued lines, until stopped and nothing is left."""
+        while True:
+            omitted, text = self._get()
+            if omitted:
+                omitted_text = f":: … {omitted:,} lines omitted, see log"
+                self.printer.show(self.stream, omitted_text, end_line=True, avoid_logging=True)
+            if text is None:
+                break
+            self.printer.show(
+                self.stream, text, end_line=True, use_timestamp=True, avoid_logging=True
+            )
+
+    def stop(self) -> None:
+        """Stop the thread after showing the lines still in the queue."""
+        with self.condition:
+            self.stop_flag = True
+            self.condition.notify()
+        if self.is_alive():
+            self.join()
+
+
+class _LineAssembler:
+    """Assemble the lines from the chunks of bytes read from an output, and write them.
+
+    Lines longer than `max_line_length` bytes are split in segments of (up to) that size
+    (not splitting multi-byte characters if possible), so the memory used does not depend
+    on the lines' length: the first segment is written as a normal line, the rest as
+    continuations, and when the line ends it's indicated how many bytes were in those.
+    """
+
+    def __init__(
+        self,
+        max_line_length: int,
+        write_line: Callable[[str], None],
+        write_continuation: Callable[[str], None],
+        end_long_line: Callable[[int], None],
+    ):
+        self.max_line_length = max_line_length
+        self.write_line = write_line
+        self.write_continuation = write_continuation
+        self.end_long_line = end_long_line
+
+        # the content read but not written yet (waiting for a newline), and how many bytes of
+        # the current line were written as continuations (None if it's not a long line)
+        self.remaining = b""
+        self.truncated: Optional[int] = None
+
+    def _write_segment(self, segment: bytes) -> None:
+        """Write a line, or a segment of a line longer than the max length."""
+        # a segment may still be invalid UTF-8 (e.g. the max length is less than a character)
+        unicode_segment = segment.decode("utf8", errors="replace")
+        if self.truncated is None:
+            self.write_line(unicode_segment)
+        elif segment:
+            self.write_continuation(unicode_segment)
+            self.truncated += len(segment)
+
+    def _end_line(self) -> None:
+        """Finish the current line, indicating if it was a long one."""
+        if self.truncated is not None:
+            self.end_long_line(self.truncated)
+        self.truncated = None
+
+    def _get_segment_end(self, data: bytes, pointer: int) -> int:
+        """Return where to cut a too long line, not splitting a multi-byte character."""
+        cut = pointer + self.max_line_length
+        while cut > pointer and (data[cut] & 0xC0) == 0x80:
+            cut -= 1
+        if cut == pointer:
+            # no character starts in the segment (too short, or not valid UTF-8), just cut it
+            # at the max length
+            cut = pointer + self.max_line_length
+        return cut
+
+    def feed(self, data: bytes) -> None:
+        """Write the complete lines (or segments of long lines), keep the rest."""
+        pointer = 0
+        data = self.remaining + data
+        while True:
+            # get the position of next newline (find starts in pointer position)
+            newline_position = data.find(b"\n", pointer)
+
+            # the line is too long: write a segment of it (the line continues)
+            line_end = len(data) if newline_position == -1 else newline_position
+            if line_end - pointer > self.max_line_length:
+                segment_end = self._get_segment_end(data, pointer)
+                self._write_segment(data[pointer:segment_end])
+                if self.truncated is None:
+                    self.truncated = 0
+                pointer = segment_end
+                continue
+
+            # no more newlines, store the rest of data for the next time and break
+            if newline_position == -1:
+                self.remaining = data[pointer:]
+                break
+
+            # get the useful line and update pointer for next cycle (plus one, to
+            # skip the new line itself)
+            useful_line = data[pointer:newline_position]
+            pointer = newline_position + 1
+
+            # write the useful line to intended outputs
+            self._write_segment(useful_line)
+            self._end_line()
+
+    def finish(self) -> None:
+        """Write what is left of the last line (if anything), as if it was ended."""
+        if self.remaining or self.truncated is not None:
+            self._write_segment(self.remaining)
+            self.remaining = b""
+            self._end_line()
+
+
 class _PipeReaderThread(threading.Thread):
     """A thread that reads bytes from a pipe and write lines to the Printer.
 
     The core part of reading the pipe and stopping work differently according to the platform:
 
-    - posix: use `select` with a timeout: if has data write it to Printer, if the stop flag
-        is set just quit
+    - posix: wait (without timeout) for data in the pipe or for a byte in a second pipe used
+        to signal the stop; when stopping, write any remaining data and quit
 
     - windows: read in a blocking way, so the `stop` method will write a byte to unblock it
         after setting the stop flag (this extra byte is handled by the reading code)
+
+    If `raw_capture` is True and the lines are not shown in any stream, the output is not
+    split in lines but moved as is to the log (in POSIX systems; using the kernel's splice
+    if available, or just copying the bytes), between two records indicating the capture
+    mode and its size and duration.
+
+    Lines longer than `max_line_length` bytes are split in segments of (up to) that size,
+    so the memory used does not depend on the lines' length: the first segment is shown
+    as a normal line, the rest are only logged as continuation records, and when the line
+    ends a marker with how many bytes were not shown is written to the screen.
+
+    The lines are logged as soon as they are read, but shown in the screen through a
+    `_ScreenFeeder`, so the pipe is always drained at full speed.
     """
 
     # byte used to unblock the reading (under Windows)
     UNBLOCK_BYTE = b"\x00"
 
-    def __init__(self, printer: _Printer, stream: Optional[TextIO]):
+    def __init__(
+        self,
+        printer: _Printer,
+        stream: Optional[TextIO],
+        raw_capture: bool = False,
+        max_line_length: int = _PIPE_READER_MAX_LINE_LENGTH,
+    ):
         super().__init__()
 
         # prepare the pipe pair: the one to read (used in the thread core loop) and the
@@ -469,50 +1205,116 @@ class _PipeReaderThread(threading.Thread):
         else:
             self.read_pipe, self.write_pipe = os.pipe()
 
+            # the "self pipe" to signal the stop, so the thread never wakes up if idle
+            self.stop_read_pipe, self.stop_write_pipe = os.pipe()
+
         # special flag used to stop the pipe reader thread
         self.stop_flag = False
 
-        # where to collect the content that is being read but yet not written (waiting for
-        # a newline)
-        self.remaining_content = b""
-
-        # printer and stream to write the assembled lines
+        # printer and stream to write the assembled lines (through the feeder, if shown)
         self.printer = printer
         self.stream = stream
+        self.screen_feeder = None if stream is None else _ScreenFeeder(printer, stream)
+
+        # to assemble the lines from the content read, and cut them at the max length
+        self.assembler = _LineAssembler(
+            max_line_length, self._write_line, self._write_continuation, self._end_long_line
+        )
+
+        # if the raw output is moved to the log, and how many bytes so far
+        self.raw_capture = raw_capture and stream is None and not _WINDOWS_MODE
+        self.raw_captured = 0
+
+    def _write_line(self, text: str) -> None:
+        """Write a line (or the beginning of a long one)."""
+        text = f":: {text}"
+        self.printer.show(None, text, end_line=True, use_timestamp=True, kind="subprocess")
+        if self.screen_feeder is not None:
+            self.screen_feeder.put(text)
+
+    def _write_continuation(self, text: str) -> None:
+        """Write a continuation segment of a long line, only to the log."""
+        text = f"{_CONTINUATION_PREFIX}{text}"
+        self.printer.show(None, text, end_line=True, use_timestamp=True, kind="subprocess")
+
+    def _end_long_line(self, truncated: int) -> None:
+        """Indicate in the screen that a long line was not completely shown."""
+        if self.screen_feeder is not None:
+            self.screen_feeder.put(f":: [{truncated} bytes truncated]")
 
     def _write(self, data: bytes) -> None:
         """Convert the byte stream into unicode lines and send it to the printer."""
-        pointer = 0
-        data = self.remaining_content + data
-        while True:
-            # get the position of next newline (find starts in pointer position)
-            newline_position = data.find(b"\n", pointer)
+        self.assembler.feed(data)
 
-            # no more newlines, store the rest of data for the next time and break
-            if newline_position == -1:
-                self.remaining_content = data[pointer:]
-                break
+    def _read_available(self) -> bool:
+        """Read and write all the data available in the pipe.
 
-            # get the useful line and update pointer for next cycle (plus one, to
-            # skip the new line itself)
-            useful_line = data[pointer:newline_position]
-            pointer = newline_position + 1
-
-            # write the useful line to intended outputs
-            unicode_line = useful_line.decode("utf8")
-            text = f":: {unicode_line}"
-            self.printer.show(self.stream, text, end_line=True, use_timestamp=True)
+        Return False if the pipe was closed (all its writing ends).
+        """
+        while True:
+            try:
+                if self.raw_capture:
+                    read_size = self._move_raw()
+                else:
+                    data = os.read(self.read_pipe, _PIPE_READER_CHUNK_SIZE)
+                    read_size = len(data)
+                    self._write(data)
+            except BlockingIOError:
+                return True
+            if not read_size:
+                return False
+
+    def _move_raw(self) -> int:
+        """Move the bytes available in the pipe to the log, as they are."""
+        # the log may have pending text written by other threads
+        self.printer.log.flush()
+        log_fd = self.printer.log.fileno()
+        if _SPLICE_AVAILABLE:
+            flags = os.SPLICE_F_MOVE | os.SPLICE_F_NONBLOCK  # type: ignore
+            size = os.splice(self.read_pipe, log_fd, _RAW_CAPTURE_CHUNK_SIZE, flags=flags)  # type: ignore
+        else:
+            data = os.read(self.read_pipe, _RAW_CAPTURE_CHUNK_SIZE)
+            size = len(data)
+            written = 0
+            while written < size:
+                written += os.write(log_fd, data[written:])
+        self.raw_captured += size
+        return size
+
+    def _run_raw_capture(self) -> None:
+        """Run the thread moving the raw output to the log, between descriptive records."""
+        mode = "splice" if _SPLICE_AVAILABLE else "copy"
+        self.printer.show(
+            None, f":: Capturing the raw output in the log (mode: {mode})", kind="subprocess"
+        )
+        start = time.monotonic()
+        self._run_posix()
+        duration = time.monotonic() - start
+
+        if self.raw_captured:
+            # the record must start in its own line, even if the output did not finish one
+            self.printer.log.flush()
+            with open(self.printer.log.name, "rb") as log_file:
+                log_file.seek(-1, os.SEEK_END)
+                if log_file.read(1) != b"\n":
+                    self.printer.log.write("\n")
+        text = f":: Raw output captured: {self.raw_captured} bytes in {duration:.3f} seconds"
+        self.printer.show(None, text, kind="subprocess")
 
     def _run_posix(self) -> None:
         """Run the thread, handling pipes in the POSIX way."""
-        while True:
-            rlist, _, _ = select.select([self.read_pipe], [], [], 0.1)
-            if rlist:
-                data = os.read(self.read_pipe, _PIPE_READER_CHUNK_SIZE)
-                self._write(data)
-            elif self.stop_flag:
-                # only quit when nothing left to read
-                break
+        os.set_blocking(self.read_pipe, False)
+        with selectors.DefaultSelector() as selector:
+            selector.register(self.read_pipe, selectors.EVENT_READ)
+            selector.register(self.stop_read_pipe, selectors.EVENT_READ)
+            while True:
+                ready = [key.fd for key, _ in selector.select()]
+                if self.read_pipe in ready and not self._read_available():
+                    break
+                if self.stop_read_pipe in ready:
+                    # only quit when nothing left to read
+                    self._read_available()
+                    break
 
     def _run_windows(self) -> None:
         """Run the thread, handling pipes in the Windows way."""
@@ -534,35 +1336,200 @@ class _PipeReaderThread(threading.Thread):
 
     def run(self) -> None:
         """Run the thread."""
+        if self.screen_feeder is not None:
+            self.screen_feeder.start()
+
         if _WINDOWS_MODE:
             self._run_windows()
+        elif self.raw_capture:
+            self._run_raw_capture()
         else:
             self._run_posix()
 
+        # a too long line that was not finished still needs its last segment and marker
+        if self.assembler.truncated is not None:
+            self.assembler.finish()
+
     def stop(self) -> None:
         """Stop the thread.
 
         This flag ourselves to quit, but then makes the main thread (which is the one calling
-        this method) to wait ourselves to finish.
+        this method) to wait ourselves to finish; after that all the pipes are closed.
 
-        Under Windows it inserts an extra byte in the pipe to unblock the reading.
+        Under Windows it inserts an extra byte in the pipe to unblock the reading, in other
+        platforms it writes to the pipe that signals the stop.
         """
+        if self.stop_flag:
+            return
         self.stop_flag = True
         if _WINDOWS_MODE:
             os.write(self.write_pipe, self.UNBLOCK_BYTE)
+        else:
+            os.write(self.stop_write_pipe, b"x")
         self.join()
+        if self.screen_feeder is not None:
+            self.screen_feeder.stop()
+
+        os.close(self.read_pipe)
+        os.close(self.write_pipe)
+        if not _WINDOWS_MODE:
+            os.close(self.stop_read_pipe)
+            os.close(self.stop_write_pipe)
+
+
+class _SubprocessRunner:
+    """Run a subprocess, sending the lines of its stdout and stderr to the Printer.
+
+    Both outputs are read in the same thread (waiting on them with a selector) and their
+    lines are shown with different prefixes; the last lines are kept to report errors.
+    As in the `_PipeReaderThread`, lines are logged when read but shown through a
+    `_ScreenFeeder`, so the terminal never slows down the subprocess, and lines longer
+    than `max_line_length` are split in segments (only the first one is shown).
+    """
+
+    def __init__(
+        self,
+        printer: _Printer,
+        stream: Optional[TextIO],
+        tail_lines: int,
+        max_line_length: int = _PIPE_READER_MAX_LINE_LENGTH,
+    ):
+        self.printer = printer
+        self.screen_feeder = None if stream is None else _ScreenFeeder(printer, stream)
+        self.tail: Deque[str] = deque(maxlen=tail_lines)
+        self.timeout: Optional[float] = None
+
+        # the assembler of the lines, and the bytes read, for each output (identified by
+        # its prefix)
+        self.assemblers = {
+            prefix: _LineAssembler(
+                max_line_length,
+                partial(self._write_line, prefix),
+                self._write_continuation,
+                partial(self._end_long_line, prefix),
+            )
+            for prefix in (_RUN_STDOUT_PREFIX, _RUN_STDERR_PREFIX)
+        }
+        self.sizes = {_RUN_STDOUT_PREFIX: 0, _RUN_STDERR_PREFIX: 0}
+
+    def _show(self, text: str) -> None:
+        """Show a line in the screen (if there is a stream) and keep it for errors."""
+        if self.screen_feeder is not None:
+            self.screen_feeder.put(text)
+        self.tail.append(text)
+
+    def _write_line(self, prefix: str, text: str) -> None:
+        """Write a line (or the beginning of a long one)."""
+        text = prefix + text
+        self.printer.show(None, text, end_line=True, use_timestamp=True, kind="subprocess")
+        self._show(text)
+
+    def _write_continuation(self, text: str) -> None:
+        """Write a continuation segment of a long line, only to the log."""
+        text = f"{_CONTINUATION_PREFIX}{text}"
+        self.printer.show(None, text, end_line=True, use_timestamp=True, kind="subprocess")
+
+    def _end_long_line(self, prefix: str, truncated: int) -> None:
+        """Indicate that a long line was not completely shown."""
+        self._show(f"{prefix}[{truncated} bytes truncated]")
+
+    def _write(self, prefix: str, data: bytes) -> None:
+        """Send the complete lines to the printer; an empty data flushes the remaining."""
+        self.sizes[prefix] += len(data)
+        if data:
+            self.assemblers[prefix].feed(data)
+        else:
+            self.assemblers[prefix].finish()
+
+    def _get_timeout_error(self, proc: subprocess.Popen) -> subprocess.TimeoutExpired:
+        """Return the error for the subprocess not finishing in time."""
+        return subprocess.TimeoutExpired(proc.args, self.timeout)  # type: ignore
+
+    def _communicate_posix(self, proc: subprocess.Popen, deadline: Optional[float]) -> None:
+        """Read the outputs as they are written, until closed or the deadline is reached."""
+        with selectors.DefaultSelector() as selector:
+            selector.register(proc.stdout, selectors.EVENT_READ, _RUN_STDOUT_PREFIX)  # type: ignore
+            selector.register(proc.stderr, selectors.EVENT_READ, _RUN_STDERR_PREFIX)  # type: ignore
+            while selector.get_map():
+                timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+                ready = selector.select(timeout)
+                if not ready:
+                    raise self._get_timeout_error(proc)
+                for key, _ in ready:
+                    data = os.read(key.fd, _PIPE_READER_CHUNK_SIZE)
+                    if not data:
+                        selector.unregister(key.fileobj)
+                    self._write(key.data, data)
+
+    def _communicate_windows(self, proc: subprocess.Popen, deadline: Optional[float]) -> None:
+        """Read the outputs when the subprocess finishes (pipes can't be waited on Windows)."""
+        timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+        try:
+            stdout, stderr = proc.communicate(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            raise self._get_timeout_error(proc) from None
+        for prefix, data in ((_RUN_STDOUT_PREFIX, stdout), (_RUN_STDERR_PREFIX, stderr)):
+            self._write(prefix, data)
+            self._write(prefix, b"")
+
+    def _wait(self, proc: subprocess.Popen, deadline: Optional[float]) -> int:
+        """Wait for the subprocess to finish (it may still run after closing its outputs)."""
+        timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+        try:
+            return proc.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            raise self._get_timeout_error(proc) from None
+
+    def run(self, command: List[str], timeout: Optional[float], **popen_kwargs) -> RunResult:
+        """Run the command, raising TimeoutExpired if it doesn't finish in time."""
+        start = time.monotonic()
+        self.timeout = timeout
+        deadline = None if timeout is None else start + timeout
+        if self.screen_feeder is not None:
+            self.screen_feeder.start()
+        try:
+            with subprocess.Popen(
+                command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, **popen_kwargs
+            ) as proc:
+                try:
+                    if _WINDOWS_MODE:
+                        self._communicate_windows(proc, deadline)
+                    else:
+                        self._communicate_posix(proc, deadline)
+                    returncode = self._wait(proc, deadline)
+                except subprocess.TimeoutExpired:
+                    proc.kill()
+                    raise
+        finally:
+            if self.screen_feeder is not None:
+                self.screen_feeder.stop()
+        return RunResult(
+            returncode=returncode,
+            duration=time.monotonic() - start,
+            stdout_size=self.sizes[_RUN_STDOUT_PREFIX],
+            stderr_size=self.sizes[_RUN_STDERR_PREFIX],
+        )
 
 
 class _StreamContextManager:
     """A context manager that provides a pipe for subprocess to write its output."""
 
-    def __init__(self, printer: _Printer, text: str, stream: Optional[TextIO]):
+    def __init__(
+        self,
+        printer: _Printer,
+        text: str,
+        stream: Optional[TextIO],
+        raw_capture: bool = False,
+        max_line_length: int = _PIPE_READER_MAX_LINE_LENGTH,
+    ):
         # show the intended text (explicitly asking for a complete line) before passing the
         # output command to the pip-reading thread
-        printer.show(stream, text, end_line=True, use_timestamp=True)
+        printer.show(stream, text, end_line=True, use_timestamp=True, kind="subprocess")
 
         # enable the thread to read and show what comes through the provided pipe
-        self.pipe_reader = _PipeReaderThread(printer, stream)
+        self.pipe_reader = _PipeReaderThread(
+            printer, stream, raw_capture=raw_capture, max_line_length=max_line_length
+        )
 
     def __enter__(self):
         self.pipe_reader.start()
@@ -598,7 +1565,13 @@ class _Handler(logging.Handler):
         use_timestamp = self.mode in (EmitterMode.VERBOSE, EmitterMode.TRACE)
         threshold = self.mode_to_log_map[self.mode]
         stream = sys.stderr if record.levelno >= threshold else None
-        self.printer.show(stream, record.getMessage(), use_timestamp=use_timestamp)
+        self.printer.show(
+            stream,
+            record.getMessage(),
+            use_timestamp=use_timestamp,
+            kind="logging",
+            level=record.levelno,
+        )
 
 
 def _init_guard(wrapped_func):
@@ -638,21 +1611,50 @@ class Emitter:
     def __init__(self):
         # these attributes will be set at "real init time", with the `init` method below
         self._greeting = None
+        self._greeting_shown = False
         self._printer = None
         self._mode = None
         self._initiated = False
         self._stopped = False
         self._log_filepath = None
         self._log_handler = None
+        self._traceback_max_frames = _TRACEBACK_MAX_FRAMES
+        self._traceback_max_chain = _TRACEBACK_MAX_CHAIN
+        self._diagnostic_bundle = False
+        self._diagnostic_bundle_timeout: float = _DIAGNOSTIC_BUNDLE_TIMEOUT
 
-    def init(
+    def init(  # pylint: disable=too-many-arguments
         self,
         mode: EmitterMode,
         appname: str,
         greeting: str,
         log_filepath: Optional[pathlib.Path] = None,
+        *,
+        plain_output: Optional[bool] = None,
+        traceback_max_frames: int = _TRACEBACK_MAX_FRAMES,
+        traceback_max_chain: int = _TRACEBACK_MAX_CHAIN,
+        diagnostic_bundle: bool = False,
+        diagnostic_bundle_timeout: float = _DIAGNOSTIC_BUNDLE_TIMEOUT,
+        log_sinks: Sequence[LogSink] = (),
     ):
-        """Initialize the emitter; this must be called once and before emitting any messages."""
+        """Initialize the emitter; this must be called once and before emitting any messages.
+
+        By default messages are written "in place" to terminals and in plain buffered lines
+        to other streams (files, pipes); pass `plain_output` as True or False to force one
+        or the other for all streams (the CRAFT_CLI_PLAIN_OUTPUT environment variable can
+        also be set to "1" or "0" for the same purpose).
+
+        When errors are reported, the tracebacks shown in the screen have no more than
+        `traceback_max_frames` frames for each exception, and no more than
+        `traceback_max_chain` chained exceptions (the full traceback is always logged).
+
+        If `diagnostic_bundle` is True, when finishing with an error a compressed bundle
+        with the information to diagnose it is written next to the log file; this is done
+        in the background, waiting for it no more than `diagnostic_bundle_timeout` seconds.
+
+        Besides the log file, the log records can be sent to other destinations, passing
+        them in `log_sinks` (see `LogSink`).
+        """
         if self._initiated:
             if TESTMODE:
                 self._stop()
@@ -660,11 +1662,18 @@ class Emitter:
                 raise RuntimeError("Double Emitter init detected!")
 
         self._greeting = greeting
+        self._greeting_shown = False
+        self._traceback_max_frames = traceback_max_frames
+        self._traceback_max_chain = traceback_max_chain
+        self._diagnostic_bundle = diagnostic_bundle
+        self._diagnostic_bundle_timeout = diagnostic_bundle_timeout
 
         # create a log file, bootstrap the printer, and before anything else send the greeting
         # to the file
         self._log_filepath = _get_log_filepath(appname) if log_filepath is None else log_filepath
-        self._printer = _Printer(self._log_filepath)
+        self._printer = _Printer(
+            self._log_filepath, plain_output=plain_output, log_sinks=log_sinks
+        )
         self._printer.show(None, greeting)
 
         # hook into the logging system
@@ -683,12 +1692,17 @@ class Emitter:
 
     @_init_guard
     def set_mode(self, mode: EmitterMode) -> None:
-        """Set the mode of the emitter."""
+        """Set the mode of the emitter.
+
+        The greeting is shown in the screen the first time a verbose-ish mode is set (not
+        again if the mode changes back and forth).
+        """
         self._mode = mode
         self._log_handler.mode = mode  # type: ignore
 
-        if mode in (EmitterMode.VERBOSE, EmitterMode.TRACE):
+        if mode in (EmitterMode.VERBOSE, EmitterMode.TRACE) and not self._greeting_shown:
             # send the greeting to the screen before any further messages
+            self._greeting_shown = True
             msgs = [
                 self._greeting,
                 f"Logging execution to {str(self._log_filepath)!r}",
@@ -719,7 +1733,7 @@ class Emitter:
         useful for postmortem analysis.
         """
         stream = sys.stderr if self._mode == EmitterMode.TRACE else None
-        self._printer.show(stream, text, use_timestamp=True)  # type: ignore
+        self._printer.show(stream, text, use_timestamp=True, kind="trace")  # type: ignore
 
     @_init_guard
     def progress(self, text: str) -> None:
@@ -746,7 +1760,7 @@ class Emitter:
             use_timestamp = True
             ephemeral = False
 
-        self._printer.show(stream, text, ephemeral=ephemeral, use_timestamp=use_timestamp)  # type: ignore
+        self._printer.show(stream, text, ephemeral=ephemeral, use_timestamp=use_timestamp, kind="progress")  # type: ignore
 
     @_init_guard
     def progress_bar(self, text: str, total: Union[int, float], delta: bool = True) -> _Progresser:
@@ -763,18 +1777,96 @@ class Emitter:
             stream = None
         else:
             stream = sys.stderr
-        self._printer.show(stream, text, ephemeral=True)  # type: ignore
+        self._printer.show(stream, text, ephemeral=True, kind="progress")  # type: ignore
         return _Progresser(self._printer, total, text, stream, delta)  # type: ignore
 
     @_init_guard
-    def open_stream(self, text: str):
-        """Open a stream context manager to get messages from subprocesses."""
+    def open_stream(
+        self,
+        text: str,
+        raw_capture: bool = False,
+        max_line_length: int = _PIPE_READER_MAX_LINE_LENGTH,
+    ):
+        """Open a stream context manager to get messages from subprocesses.
+
+        If `raw_capture` is True, when the messages are not shown in the screen (quiet and
+        normal modes) they are moved to the log file as they are, which is much faster for
+        big outputs (but they are not timestamped nor prefixed).
+
+        Lines longer than `max_line_length` bytes are split: only their beginning is shown,
+        the rest is logged in continuation records.
+        """
         # don't show third party streams if quiet or normal
         if self._mode in (EmitterMode.QUIET, EmitterMode.NORMAL):
             stream = None
         else:
             stream = sys.stderr
-        return _StreamContextManager(self._printer, text, stream)  # type: ignore
+        return _StreamContextManager(
+            self._printer,  # type: ignore
+            text,
+            stream,
+            raw_capture=raw_capture,
+            max_line_length=max_line_length,
+        )
+
+    @_init_guard
+    def run(
+        self,
+        command: List[str],
+        *,
+        text: Optional[str] = None,
+        timeout: Optional[float] = None,
+        tail_lines: int = _RUN_TAIL_LINES,
+        check: bool = True,
+        max_line_length: int = _PIPE_READER_MAX_LINE_LENGTH,
+        **popen_kwargs,
+    ) -> RunResult:
+        """Run a subprocess, showing (according to the mode) and logging its outputs.
+
+        The lines from the subprocess' stdout and stderr are prefixed with ':: ' and ':! '
+        respectively. The `text` is shown before running it (by default, the command itself);
+        extra keyword arguments are passed to ``subprocess.Popen``.
+
+        If `check` is True and the subprocess returns a non-zero code, a CraftError is
+        raised with its last `tail_lines` lines of output in the details; the same happens
+        (always) if it doesn't finish in `timeout` seconds, after killing it.
+
+        Lines longer than `max_line_length` bytes are split: only their beginning is shown,
+        the rest is logged in continuation records.
+        """
+        # don't show third party outputs if quiet or normal
+        if self._mode in (EmitterMode.QUIET, EmitterMode.NORMAL):
+            stream = None
+        else:
+            stream = sys.stderr
+        joined_command = shlex.join(command)
+        if text is None:
+            text = f"Running {joined_command}"
+        self._printer.show(stream, text, end_line=True, use_timestamp=True, kind="subprocess")  # type: ignore
+
+        runner = _SubprocessRunner(
+            self._printer, stream, tail_lines, max_line_length=max_line_length  # type: ignore
+        )
+        try:
+            result = runner.run(command, timeout, **popen_kwargs)
+        except subprocess.TimeoutExpired:
+            raise errors.CraftError(
+                f"Command {joined_command!r} timed out after {timeout} seconds.",
+                details="\n".join(runner.tail) or None,
+            ) from None
+
+        self._printer.show(  # type: ignore
+            None,
+            f"Command finished: retcode={result.returncode} duration={result.duration:.3f}s "
+            f"stdout={result.stdout_size}B stderr={result.stderr_size}B",
+            kind="subprocess",
+        )
+        if check and result.returncode:
+            raise errors.CraftError(
+                f"Command {joined_command!r} failed with exit code {result.returncode}.",
+                details="\n".join(runner.tail) or None,
+            )
+        return result
 
     def _stop(self) -> None:
         """Do all the stopping."""
@@ -798,26 +1890,99 @@ class Emitter:
             full_stream = sys.stderr
 
         # the initial message
-        self._printer.show(sys.stderr, str(error), use_timestamp=use_timestamp, end_line=True)  # type: ignore
+        self._printer.show(sys.stderr, str(error), use_timestamp=use_timestamp, end_line=True, kind="error")  # type: ignore
 
         # detailed information and/or original exception
         if error.details:
             text = f"Detailed information: {error.details}"
-            self._printer.show(full_stream, text, use_timestamp=use_timestamp, end_line=True)  # type: ignore
+            self._printer.show(full_stream, text, use_timestamp=use_timestamp, end_line=True, kind="error")  # type: ignore
         if error.__cause__:
-            for line in _get_traceback_lines(error.__cause__):
-                self._printer.show(full_stream, line, use_timestamp=use_timestamp, end_line=True)  # type: ignore
+            # the whole traceback goes to the log, but it's bounded for the screen
+            full_lines = list(_get_traceback_lines(error.__cause__))
+            if full_stream is None:
+                self._printer.show_lines(None, full_lines, kind="error")  # type: ignore
+            else:
+                shown_lines = list(
+                    _get_traceback_lines(
+                        error.__cause__,
+                        max_frames=self._traceback_max_frames,
+                        max_chain=self._traceback_max_chain,
+                    )
+                )
+                self._printer.show_lines(  # type: ignore
+                    full_stream,
+                    shown_lines,
+                    use_timestamp=use_timestamp,
+                    log_lines=full_lines,
+                    kind="error",
+                )
 
         # hints for the user to know more
         if error.resolution:
             text = f"Recommended resolution: {error.resolution}"
-            self._printer.show(sys.stderr, text, use_timestamp=use_timestamp, end_line=True)  # type: ignore
+            self._printer.show(sys.stderr, text, use_timestamp=use_timestamp, end_line=True, kind="error")  # type: ignore
         if error.docs_url:
             text = f"For more information, check out: {error.docs_url}"
-            self._printer.show(sys.stderr, text, use_timestamp=use_timestamp, end_line=True)  # type: ignore
+            self._printer.show(sys.stderr, text, use_timestamp=use_timestamp, end_line=True, kind="error")  # type: ignore
 
         text = f"Full execution log: {str(self._log_filepath)!r}"
-        self._printer.show(sys.stderr, text, use_timestamp=use_timestamp, end_line=True)  # type: ignore
+        self._printer.show(sys.stderr, text, use_timestamp=use_timestamp, end_line=True, kind="error")  # type: ignore
+
+    def _write_diagnostic_bundle(self, error: errors.CraftError) -> None:
+        """Write a bundle with the information to diagnose the error, next to the log file."""
+        # the bundle includes the end of the log, so all must be written there first
+        self._printer.log.flush()  # type: ignore
+
+        log_filepath = pathlib.Path(self._log_filepath)  # type: ignore
+        bundle_filepath = log_filepath.with_name(f"{log_filepath.stem}.diag.zip")
+        error_info = {
+            "type": f"{type(error).__module__}.{type(error).__qualname__}",
+            "message": str(error),
+            "details": error.details,
+            "resolution": error.resolution,
+            "docs_url": error.docs_url,
+            "reportable": error.reportable,
+            "retcode": error.retcode,
+        }
+        if error.__cause__:
+            tback_lines = list(_get_traceback_lines(error.__cause__))
+        else:
+            tback_lines = []
+        application_info = {
+            "greeting": self._greeting,
+            "mode": self._mode.name.lower(),  # type: ignore
+        }
+
+        # the slower parts are only done in the background, when writing the bundle
+        members: Dict[str, diagnostics.MemberContent] = {
+            "error.json": json.dumps(error_info, indent=4),
+            "traceback.txt": "".join(f"{line}\n" for line in tback_lines),
+            "log-tail.txt": lambda: diagnostics.get_file_tail(log_filepath),
+            "environment.json": lambda: json.dumps(
+                {**application_info, **diagnostics.get_environment_info()}, indent=4
+            ),
+        }
+        written = diagnostics.write_bundle(
+            bundle_filepath, members, timeout=self._diagnostic_bundle_timeout
+        )
+
+        if written:
+            use_timestamp = self._mode in (EmitterMode.VERBOSE, EmitterMode.TRACE)
+            text = f"Diagnostic bundle: {str(bundle_filepath)!r}"
+            self._printer.show(sys.stderr, text, use_timestamp=use_timestamp, end_line=True, kind="error")  # type: ignore
+        else:
+            self._printer.show(None, "The diagnostic bundle could not be written.", kind="error")  # type: ignore
+
+    @_init_guard
+    def report_error(self, error: errors.CraftError) -> None:
+        """Report the indicated error but keep the machinery running.
+
+        Useful when the application continues after the error (e.g. running several
+        commands in batch); otherwise just use `error`.
+        """
+        if self._stopped:
+            return
+        self._report_error(error)
 
     @_init_guard
     def error(self, error: errors.CraftError) -> None:
@@ -825,6 +1990,8 @@ class Emitter:
         if self._stopped:
             return
         self._report_error(error)
+        if self._diagnostic_bundle:
+            self._write_diagnostic_bundle(error)
         self._stop()
 
 
@@ -0,0 +1,103 @@
+#
+# Copyright 2022 Canonical Ltd.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+"""Full text search over the commands' texts."""
+
+import bisect
+import json
+import math
+import re
+from collections import defaultdict
+from typing import DefaultDict, Dict, Iterable, List, Tuple
+
+# how much a term counts if it's just the beginning of a word (instead of the whole word)
+_PREFIX_FACTOR = 0.5
+
+
+def tokenize(text: str) -> List[str]:
+    """Split the text in the words to index or search."""
+    return re.findall(r"[a-z0-9]+", text.lower())
+
+
+class SearchIndex:
+    """An inverted index from words to the documents (e.g. commands) having them.
+
+    Each document is given as a sequence of (text, weight) fields, so a word found in more
+    relevant fields (e.g. the command name) scores more.
+    """
+
+    def __init__(self, index: Dict[str, Dict[str, float]]):
+        self._index = index
+        self._sorted_words = sorted(index)
+
+    @classmethod
+    def from_documents(cls, documents: Dict[str, Iterable[Tuple[str, float]]]) -> "SearchIndex":
+        """Build the index for the given documents."""
+        index: DefaultDict[str, DefaultDict[str, float]] = defaultdict(lambda: defaultdict(float))
+        for doc_id, fields in documents.items():
+            for text, weight in fields:
+                for word in tokenize(text):
+                    index[word][doc_id] += weight
+
+        # words present in many documents are less relevant
+        total = len(documents)
+        return cls(
+            {
+                word: {
+                    doc_id: score * math.log(1 + total / len(scores))
+                    for doc_id, score in scores.items()
+                }
+                for word, scores in index.items()
+            }
+        )
+
+    @classmethod
+    def from_json(cls, serialized: str) -> "SearchIndex":
+        """Load the index from its serialized form."""
+        return cls(json.loads(serialized))
+
+    def to_json(self) -> str:
+        """Serialize the index."""
+        return json.dumps(self._index, sort_keys=True)
+
+    def _get_matching_words(self, term: str) -> Iterable[Tuple[str, float]]:
+        """Return the indexed words matching the term, and how much they count."""
+        if term in self._index:
+            yield term, 1
+        # the words starting with the term are contiguous in the sorted list
+        idx = bisect.bisect_left(self._sorted_words, term)
+        while idx < len(self._sorted_words) and self._sorted_words[idx].startswith(term):
+            if self._sorted_words[idx] != term:
+                yield self._sorted_words[idx], _PREFIX_FACTOR
+            idx += 1
+
+    def search(self, query: str) -> List[str]:
+        """Return the documents matching the query, the most relevant first.
+
+        Documents matching more of the query terms come first, then the ones with higher
+        scores (and ties are sorted by the document id).
+        """
+        matched_terms: DefaultDict[str, int] = defaultdict(int)
+        scores: DefaultDict[str, float] = defaultdict(float)
+        for term in set(tokenize(query)):
+            matched_docs = set()
+            for word, factor in self._get_matching_words(term):
+                for doc_id, score in self._index[word].items():
+                    scores[doc_id] += score * factor
+                    matched_docs.add(doc_id)
+            for doc_id in matched_docs:
+                matched_terms[doc_id] += 1
+        return sorted(scores, key=lambda doc_id: (-matched_terms[doc_id], -scores[doc_id], doc_id))
@@ -0,0 +1,238 @@
+#
+# Copyright 2022 Canonical Ltd.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+"""Optional server mode, to run the application in a warm process reached by a thin client.
+
+The server is a long-lived process (which already imported everything the application
+needs) listening in a per-user UNIX socket. For each request it forks a worker, so
+requests run concurrently and isolated from each other.
+
+The client passes its standard input, output and error file descriptors through the
+socket, together with the command line arguments, the environment and the current
+directory; the worker uses those file descriptors as its own, so everything it writes
+goes directly to the client's streams (with their real terminal capabilities), and the
+application's `main` function initiates the Emitter (with its own log file) as usual.
+Finally the worker sends back the return code.
+
+This is only supported in POSIX systems.
+"""
+
+__all__ = [
+    "get_socket_path",
+    "run_client",
+    "serve",
+]
+
+import array
+import json
+import os
+import pathlib
+import signal
+import socket
+import struct
+import sys
+import traceback
+from typing import Callable, List, Optional, Union
+
+import platformdirs
+
+from craft_cli import messages
+
+# the file descriptors the client passes to the worker: stdin, stdout and stderr
+_PASSED_FDS = (0, 1, 2)
+
+# the format used for the request size, the worker pid and the return code
+_INT_FORMAT = "!i"
+_INT_SIZE = struct.calcsize(_INT_FORMAT)
+
+
+def get_socket_path(appname: str) -> pathlib.Path:
+    """Provide the per-user path for the application's server socket."""
+    basedir = pathlib.Path(platformdirs.user_runtime_dir(appname))
+    basedir.mkdir(mode=0o700, exist_ok=True, parents=True)
+    return basedir / f"{appname}.sock"
+
+
+def _recv_exact(conn: socket.socket, size: int, initial: bytes = b"") -> bytes:
+    """Receive exactly the indicated number of bytes from the connection."""
+    data = initial
+    while len(data) < size:
+        chunk = conn.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("Connection closed unexpectedly.")
+        data += chunk
+    return data
+
+
+def run_client(socket_path: Union[str, pathlib.Path], argv: List[str]) -> Optional[int]:
+    """Run the command line in the server and return its code.
+
+    If the server is not available, None is returned (so the application can just run
+    the command line in the current process). If the worker ends without sending its
+    return code, it's reported and 1 is returned.
+    """
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(str(socket_path))
+    except OSError:
+        client.close()
+        return None
+
+    with client:
+        try:
+            return _run_request(client, argv)
+        except ConnectionError:
+            print("The application server ended the request unexpectedly.", file=sys.stderr)
+            return 1
+
+
+def _run_request(client: socket.socket, argv: List[str]) -> int:
+    """Send the request through the connected client, and wait for the return code."""
+    request = json.dumps({"argv": argv, "env": dict(os.environ), "cwd": os.getcwd()})
+    request_bytes = request.encode("utf8")
+    fds = array.array("i", _PASSED_FDS)
+    client.sendmsg(
+        [struct.pack(_INT_FORMAT, len(request_bytes))],
+        [(socket.SOL_SOCKET, socket.SCM_RIGHTS, fds)],
+    )
+    client.sendall(request_bytes)
+
+    (worker_pid,) = struct.unpack(_INT_FORMAT, _recv_exact(client, _INT_SIZE))
+    while True:
+        try:
+            (retcode,) = struct.unpack(_INT_FORMAT, _recv_exact(client, _INT_SIZE))
+        except KeyboardInterrupt:
+            # the user interrupted the client, pass it to the worker and keep waiting
+            os.kill(worker_pid, signal.SIGINT)
+        else:
+            return retcode
+
+
+def _reap_workers(*args) -> None:  # pylint: disable=unused-argument
+    """Collect the finished workers, so they don't linger as zombies."""
+    while True:
+        try:
+            pid, _ = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            return
+        if pid == 0:
+            return
+
+
+def _is_same_user(conn: socket.socket) -> bool:
+    """Verify that the peer runs with the same user than us (if the platform can tell)."""
+    so_peercred = getattr(socket, "SO_PEERCRED", None)
+    if so_peercred is None:
+        # no credentials to check, the socket permissions must suffice
+        return True
+    creds = conn.getsockopt(socket.SOL_SOCKET, so_peercred, struct.calcsize("3i"))
+    _, uid, _ = struct.unpack("3i", creds)
+    return uid == os.getuid()
+
+
+def _run_worker(conn: socket.socket, main: Callable[[List[str]], Optional[int]]) -> int:
+    """Set up the worker as indicated in the request and run the application in it."""
+    signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+    # get the request size and the client's file descriptors, then the request itself
+    fds = array.array("i")
+    msg, ancdata, _, _ = conn.recvmsg(
+        _INT_SIZE, socket.CMSG_SPACE(len(_PASSED_FDS) * fds.itemsize)
+    )
+    for level, cmsg_type, data in ancdata:
+        if level == socket.SOL_SOCKET and cmsg_type == socket.SCM_RIGHTS:
+            fds.frombytes(data[: len(data) - (len(data) % fds.itemsize)])
+    (size,) = struct.unpack(_INT_FORMAT, _recv_exact(conn, _INT_SIZE, initial=msg))
+    request = json.loads(_recv_exact(conn, size).decode("utf8"))
+
+    # use the client's streams, directory and environment as our own
+    for target_fd, client_fd in zip(_PASSED_FDS, fds):
+        os.dup2(client_fd, target_fd)
+        os.close(client_fd)
+    os.chdir(request["cwd"])
+    os.environ.clear()
+    os.environ.update(request["env"])
+    messages._stream_is_terminal.cache_clear()  # pylint: disable=protected-access
+
+    conn.sendall(struct.pack(_INT_FORMAT, os.getpid()))
+    try:
+        retcode = main(request["argv"])
+    except SystemExit as exc:
+        if exc.code is None or isinstance(exc.code, int):
+            retcode = exc.code
+        else:
+            print(exc.code, file=sys.stderr)
+            retcode = 1
+    except BaseException:  # pylint: disable=broad-except
+        traceback.print_exc()
+        retcode = 1
+    sys.stdout.flush()
+    sys.stderr.flush()
+    return 0 if retcode is None else retcode
+
+
+def serve(
+    socket_path: Union[str, pathlib.Path], main: Callable[[List[str]], Optional[int]]
+) -> None:
+    """Serve the application through the indicated socket, until terminated.
+
+    For each request a worker is forked, which calls the `main` function with the
+    command line arguments (without the application name); it's expected to initiate
+    the Emitter and return the code for the client (None means 0), as if it was run
+    in a separate process.
+
+    Note that the Emitter must not be initiated in the server process itself.
+    """
+    if not hasattr(os, "fork"):
+        raise RuntimeError("The server mode is only supported in POSIX systems.")
+
+    # the socket is prepared in a temporary path and then renamed (also replacing any leftover
+    # from a previous server), so clients never find it before it's really listening
+    socket_path = pathlib.Path(socket_path)
+    temp_path = socket_path.with_name(f"{socket_path.name}.{os.getpid()}")
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(str(temp_path))
+    os.chmod(temp_path, 0o600)
+    server.listen()
+    os.rename(temp_path, socket_path)
+
+    # reap the workers as they finish, and on termination clean the socket before quitting
+    signal.signal(signal.SIGCHLD, _reap_workers)
+    signal.signal(signal.SIGTERM, lambda *args: sys.exit(0))
+
+    try:
+        while True:
+            conn, _ = server.accept()
+            with conn:
+                if not _is_same_user(conn):
+                    continue
+
+                # avoid the worker to repeat anything that is pending to be written
+                sys.stdout.flush()
+                sys.stderr.flush()
+                if os.fork() == 0:
+                    server.close()
+                    retcode = 1
+                    try:
+                        retcode = _run_worker(conn, main)
+                        conn.sendall(struct.pack(_INT_FORMAT, retcode))
+                    finally:
+                        os._exit(retcode)  # pylint: disable=protected-access
+    finally:
+        server.close()
+        if socket_path.exists():
+            socket_path.unlink()
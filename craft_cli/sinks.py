@@ -0,0 +1,270 @@
+#
+# Copyright 2022 Canonical Ltd.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+"""Send the log records to other destinations (sinks) besides the log file."""
+
+import logging
+import os
+import socket
+import threading
+from collections import deque, namedtuple
+from logging.handlers import SysLogHandler
+from typing import Deque, List, Optional
+
+# max records waiting to be written to each sink; if it's full the new ones are dropped
+SINK_QUEUE_SIZE = 10000
+
+# max records passed to a sink in each write
+SINK_BATCH_SIZE = 100
+
+# how many consecutive failed writes disable a sink
+SINK_MAX_FAILURES = 3
+
+# the local syslog socket, and the max size of the messages sent to it (longer ones are
+# truncated)
+SYSLOG_PATH = "/dev/log"
+SYSLOG_MAX_MESSAGE_SIZE = 8192
+
+# the month abbreviations used in the syslog timestamps (not depending on the locale)
+_MONTHS = ("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec")
+
+
+SinkRecord = namedtuple("SinkRecord", "created_at text kind level")
+"""A record sent to the log sinks.
+
+:param created_at: the moment the record was produced (a datetime).
+:param text: the text of the record, as written in the log file (without the timestamp).
+:param kind: what produced the record: "message", "progress", "trace", "error",
+    "subprocess", or "logging".
+:param level: the record's severity, using the levels of the logging module.
+"""
+
+
+class LogSink:
+    """A destination for the log records, besides the log file.
+
+    Subclasses must implement `write`, and may implement `open` and `close`. All of them
+    are called from a thread dedicated to the sink, fed by a queue of `queue_size` records
+    (if it's full, new records are dropped), so a slow sink never delays the application.
+
+    Only the records of `level` or above are sent to the sink. Errors when writing are
+    isolated from the application: the records of the failed write are dropped, and after
+    `max_failures` consecutive failures the sink is disabled (dropping all the rest). How
+    many records were dropped is reported in the log file at the end (sinks that drop
+    records by themselves should count them in `dropped`).
+    """
+
+    def __init__(
+        self,
+        level: int = logging.DEBUG,
+        queue_size: int = SINK_QUEUE_SIZE,
+        max_failures: int = SINK_MAX_FAILURES,
+    ):
+        self.level = level
+        self.queue_size = queue_size
+        self.max_failures = max_failures
+        self.dropped = 0
+
+    @property
+    def name(self) -> str:
+        """The name of the sink for the reports."""
+        return self.__class__.__name__
+
+    def open(self) -> None:
+        """Prepare the sink, before any write."""
+
+    def write(self, records: List[SinkRecord]) -> None:
+        """Write the records (a batch of up to SINK_BATCH_SIZE)."""
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """Release any resource used by the sink, after all the writes."""
+
+
+class SinkWorker(threading.Thread):
+    """A thread that writes the queued records to a sink, in batches."""
+
+    def __init__(self, sink: LogSink):
+        super().__init__(daemon=True)
+        self.sink = sink
+        self.queue: Deque[SinkRecord] = deque()
+        self.condition = threading.Condition()
+        self.stop_flag = False
+        self.disabled = False
+        self.dropped = 0
+        self.failures = 0
+        self.last_error: Optional[Exception] = None
+
+    def put(self, record: SinkRecord) -> None:
+        """Queue the record for the sink, if it's of the sink's level; never blocks."""
+        if record.level < self.sink.level:
+            return
+        with self.condition:
+            if self.disabled or len(self.queue) >= self.sink.queue_size:
+                self.dropped += 1
+                return
+            self.queue.append(record)
+            self.condition.notify()
+
+    def _get_batch(self) -> List[SinkRecord]:
+        """Wait for records to write; an empty batch means the worker was stopped."""
+        with self.condition:
+            while not self.queue and not self.stop_flag:
+                self.condition.wait()
+            size = min(len(self.queue), SINK_BATCH_SIZE)
+            return [self.queue.popleft() for _ in range(size)]
+
+    def _disable(self, error: Exception) -> None:
+        """Disable the sink, dropping what is left in the queue."""
+        self.last_error = error
+        with self.condition:
+            self.disabled = True
+            self.dropped += len(self.queue)
+            self.queue.clear()
+
+    def run(self) -> None:
+        """Write the records to the sink until stopped and nothing is left."""
+        try:
+            self.sink.open()
+        except Exception as exc:  # pylint: disable=broad-except
+            self.failures += 1
+            self._disable(exc)
+            return
+
+        consecutive_failures = 0
+        while True:
+            batch = self._get_batch()
+            if not batch:
+                break
+            try:
+                self.sink.write(batch)
+            except Exception as exc:  # pylint: disable=broad-except
+                self.failures += 1
+                self.dropped += len(batch)
+                self.last_error = exc
+                consecutive_failures += 1
+                if consecutive_failures >= self.sink.max_failures:
+                    self._disable(exc)
+                    break
+            else:
+                consecutive_failures = 0
+
+        try:
+            self.sink.close()
+        except Exception as exc:  # pylint: disable=broad-except
+            self.failures += 1
+            self.last_error = exc
+
+    def stop(self) -> None:
+        """Signal the worker to stop after writing what is queued."""
+        with self.condition:
+            self.stop_flag = True
+            self.condition.notify()
+
+    def wait(self, timeout: float) -> None:
+        """Wait for the worker to finish, no more than the timeout.
+
+        If the sink is still writing by then it's abandoned and the queued records dropped.
+        """
+        self.join(timeout)
+        if self.is_alive():
+            self.failures += 1
+            self._disable(TimeoutError("the sink took too long to finish"))
+
+    def get_report(self) -> Optional[str]:
+        """Return a text explaining the problems with the sink, if any."""
+        dropped = self.dropped + self.sink.dropped
+        if not dropped and not self.failures:
+            return None
+        report = f"Log sink {self.sink.name}: {dropped} records dropped, {self.failures} failures"
+        if self.last_error is not None:
+            report += f" (last error: {self.last_error!r})"
+        return report
+
+
+def _get_syslog_severity(level: int) -> int:
+    """Return the syslog severity for a logging level."""
+    if level >= logging.CRITICAL:
+        return SysLogHandler.LOG_CRIT
+    if level >= logging.ERROR:
+        return SysLogHandler.LOG_ERR
+    if level >= logging.WARNING:
+        return SysLogHandler.LOG_WARNING
+    if level >= logging.INFO:
+        return SysLogHandler.LOG_INFO
+    return SysLogHandler.LOG_DEBUG
+
+
+class SyslogSink(LogSink):
+    """Send the records to the local syslog (or journald) through its UNIX datagram socket.
+
+    Each record is sent in a datagram in the traditional local format, which both syslog
+    daemons and journald understand: the level is mapped to the syslog severity, and the
+    application name and process id to the message identifier and pid; the record kind
+    is included at the beginning of the message between brackets.
+
+    The socket is never waited on: if it's full (the daemon is not keeping up) the records
+    are dropped and counted, to be reported in the log file at the end.
+    """
+
+    def __init__(
+        self,
+        appname: str,
+        path: str = SYSLOG_PATH,
+        facility: int = SysLogHandler.LOG_USER,
+        **kwargs,
+    ):
+        super().__init__(**kwargs)
+        self.appname = appname
+        self.path = path
+        self.facility = facility
+        self._pid = os.getpid()
+        self._socket: Optional[socket.socket] = None
+
+    def open(self) -> None:
+        """Connect to the syslog socket."""
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        try:
+            self._socket.connect(self.path)
+        except OSError:
+            self._socket.close()
+            raise
+        self._socket.setblocking(False)
+
+    def _build_datagram(self, record: SinkRecord) -> bytes:
+        """Build the datagram for the record."""
+        priority = self.facility * 8 + _get_syslog_severity(record.level)
+        created_at = record.created_at
+        timestamp = f"{_MONTHS[created_at.month - 1]} {created_at.day:2d} {created_at:%H:%M:%S}"
+        message = f"<{priority}>{timestamp} {self.appname}[{self._pid}]: [{record.kind}] "
+        datagram = (message + record.text).encode("utf8", errors="replace")
+        return datagram[:SYSLOG_MAX_MESSAGE_SIZE]
+
+    def write(self, records: List[SinkRecord]) -> None:
+        """Send the batch of records, dropping them if the socket is full."""
+        assert self._socket is not None  # for typing purposes
+        for idx, record in enumerate(records):
+            try:
+                self._socket.send(self._build_datagram(record))
+            except BlockingIOError:
+                # no point in trying the rest of the batch now
+                self.dropped += len(records) - idx
+                break
+
+    def close(self) -> None:
+        """Close the syslog socket."""
+        if self._socket is not None:
+            self._socket.close()
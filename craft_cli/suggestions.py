@@ -0,0 +1,79 @@
+#
+# Copyright 2022 Canonical Ltd.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+"""Suggest similar words (commands, options) for the ones the user mistyped."""
+
+import difflib
+from collections import defaultdict
+from typing import DefaultDict, Dict, Iterable, List, Set
+
+# how many candidates (the ones sharing more trigrams) are fully compared with the word
+_MAX_CANDIDATES = 20
+
+
+def _get_trigrams(word: str) -> Set[str]:
+    """Return the trigrams of the word, padded so short words and their edges count too."""
+    padded = f"  {word} "
+    return {a + b + c for a, b, c in zip(padded, padded[1:], padded[2:])}
+
+
+class SuggestionIndex:
+    """A trigram index over a set of words, to find the similar ones to a given word.
+
+    The candidates are the words sharing more trigrams with the given one, which are then
+    ranked using ``difflib``'s similarity ratio (as ``difflib.get_close_matches`` does, but
+    without comparing against all the words).
+    """
+
+    def __init__(self, words: Iterable[str]):
+        self._index: DefaultDict[str, List[str]] = defaultdict(list)
+        for word in set(words):
+            for trigram in _get_trigrams(word):
+                self._index[trigram].append(word)
+
+    def suggest(self, word: str, limit: int = 3, cutoff: float = 0.6) -> List[str]:
+        """Return the most similar words, the best first."""
+        shared: Dict[str, int] = defaultdict(int)
+        for trigram in _get_trigrams(word):
+            for candidate in self._index.get(trigram, ()):
+                shared[candidate] += 1
+        # ties are broken by the words themselves (as in the final ranking), so the candidates
+        # don't depend on the iteration order of the index (which depends on the hash seed)
+        candidates = sorted(shared, key=lambda w: (shared[w], w), reverse=True)[:_MAX_CANDIDATES]
+
+        scored = []
+        matcher = difflib.SequenceMatcher()
+        matcher.set_seq2(word)
+        for candidate in candidates:
+            matcher.set_seq1(candidate)
+            if (
+                matcher.real_quick_ratio() >= cutoff
+                and matcher.quick_ratio() >= cutoff
+                and matcher.ratio() >= cutoff
+            ):
+                scored.append((matcher.ratio(), candidate))
+
+        # same order than difflib: best score first, and ties by the words themselves
+        scored.sort(reverse=True)
+        return [candidate for _, candidate in scored[:limit]]
+
+
+def join_suggestions(similar: List[str]) -> str:
+    """Join the suggestions in a human friendly text, e.g. "'foo', 'bar' or 'baz'"."""
+    if len(similar) == 1:
+        return repr(similar[0])
+    *previous, last = similar
+    return ", ".join(repr(x) for x in previous) + f" or {last!r}"
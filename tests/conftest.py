@@ -22,7 +22,7 @@ import tempfile
 
 import pytest
 
-from craft_cli import messages
+from craft_cli import helptexts, messages
 from craft_cli.messages import _Printer, _Spinner
 
 
@@ -67,10 +67,20 @@ class RecordingPrinter(_Printer):
         self.logged.append(message)
 
 
+@pytest.fixture(autouse=True)
+def help_terminal_width(monkeypatch):
+    """Render the help texts as in a terminal of the default width, whatever the tests run in."""
+    get_terminal_width = helptexts._get_terminal_width
+    monkeypatch.setenv("COLUMNS", str(helptexts.TERMINAL_WIDTH))
+    get_terminal_width.cache_clear()
+    yield
+    get_terminal_width.cache_clear()
+
+
 @pytest.fixture
 def recording_printer(tmp_path):
-    """Provide a recording printer."""
-    recording_printer = RecordingPrinter(tmp_path / "test.log")
+    """Provide a recording printer (forced to use the terminal output)."""
+    recording_printer = RecordingPrinter(tmp_path / "test.log", plain_output=False)
     yield recording_printer
     if not recording_printer.stopped:
         recording_printer.stop()
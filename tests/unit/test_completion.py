@@ -0,0 +1,292 @@
+# Copyright 2022 Canonical Ltd.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+"""Tests for the shell completion support."""
+
+import json
+import shutil
+import subprocess
+import sys
+import textwrap
+from unittest.mock import patch
+
+import pytest
+
+from craft_cli import completion
+from craft_cli.dispatcher import (
+    BaseCommand,
+    CommandArgument,
+    CommandGroup,
+    Dispatcher,
+    GlobalArgument,
+    LazyCommand,
+)
+from tests.factory import create_command
+
+
+class BuildCommand(BaseCommand):
+    """A command with options."""
+
+    name = "build"
+    help_msg = "build help"
+    overview = "build overview"
+
+    def fill_parser(self, parser):
+        parser.add_argument("--output", help="output help")
+        parser.add_argument("-f", "--force", action="store_true", help="force help")
+        parser.add_argument("target", help="target help")
+
+    def run(self, parsed_args):
+        pass
+
+
+@pytest.fixture
+def cache_filepath(tmp_path):
+    """Provide a path for the completion cache."""
+    return tmp_path / "cache" / "completion.json"
+
+
+@pytest.fixture
+def dispatcher():
+    """Provide a dispatcher with some commands."""
+    groups = [CommandGroup("title", [BuildCommand, create_command("clean", "clean help")])]
+    return Dispatcher("testapp", groups)
+
+
+@pytest.fixture
+def lazy_module(tmp_path, monkeypatch):
+    """Provide an importable module with a command, that is not imported yet."""
+    module_name = "test_completion_lazy_module"
+    module_file = tmp_path / f"{module_name}.py"
+    module_file.write_text(
+        textwrap.dedent(
+            """
+            from craft_cli import BaseCommand
+
+            class LazyCommand(BaseCommand):
+                name = "lazycommand"
+                help_msg = "lazy help"
+                overview = "lazy overview"
+
+                def fill_parser(self, parser):
+                    parser.add_argument("--lazy-option")
+
+                def run(self, parsed_args):
+                    pass
+            """
+        )
+    )
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.delitem(sys.modules, module_name, raising=False)
+    yield module_name
+    sys.modules.pop(module_name, None)
+
+
+# -- tests for the completion table
+
+
+def test_table_content(dispatcher, cache_filepath):
+    """The table has the global arguments and the commands with their options."""
+    table = completion.get_completion_table(dispatcher, "1.0", cache_filepath=cache_filepath)
+    assert table == {
+        "global_options": ["-h", "--help", "-v", "--verbose", "-q", "--quiet", "-t", "--trace"],
+        "global_value_options": [],
+        "commands": {
+            "build": {"options": ["--output", "-f", "--force"], "value_options": ["--output"]},
+            "clean": {"options": [], "value_options": []},
+        },
+    }
+
+
+def test_table_global_value_options(cache_filepath):
+    """Global options that need a value are identified."""
+    extra_arg = GlobalArgument("project", "option", "-p", "--project", "project help")
+    groups = [CommandGroup("title", [create_command("clean", "clean help")])]
+    dispatcher = Dispatcher("testapp", groups, extra_global_args=[extra_arg])
+    table = completion.get_completion_table(dispatcher, "1.0", cache_filepath=cache_filepath)
+    assert table["global_options"][-2:] == ["-p", "--project"]
+    assert table["global_value_options"] == ["-p", "--project"]
+
+
+def test_table_command_not_introspectable(cache_filepath):
+    """A command that fails when filling its parser is completed without options."""
+
+    class BrokenCommand(BuildCommand):
+        name = "broken"
+
+        def fill_parser(self, parser):
+            raise ValueError("needs a real config")
+
+    dispatcher = Dispatcher("testapp", [CommandGroup("title", [BuildCommand, BrokenCommand])])
+    table = completion.get_completion_table(dispatcher, "1.0", cache_filepath=cache_filepath)
+    assert table["commands"]["broken"] == {"options": [], "value_options": []}
+    assert table["commands"]["build"]["options"] == ["--output", "-f", "--force"]
+
+
+def test_table_static_arguments(cache_filepath):
+    """Commands with declared arguments are not instantiated to build the table."""
+
+    class StaticCommand(BaseCommand):
+        name = "static"
+        help_msg = "static help"
+        overview = "static overview"
+        arguments = [
+            CommandArgument("target"),
+            CommandArgument("-o", "--output"),
+            CommandArgument("--force", action="store_true"),
+        ]
+
+    dispatcher = Dispatcher("testapp", [CommandGroup("title", [StaticCommand])])
+    with patch.object(StaticCommand, "__init__") as mock_init:
+        table = completion.get_completion_table(dispatcher, "1.0", cache_filepath=cache_filepath)
+    mock_init.assert_not_called()
+    assert table["commands"]["static"] == {
+        "options": ["-o", "--output", "--force"],
+        "value_options": ["-o", "--output"],
+    }
+
+
+def test_table_cached(dispatcher, cache_filepath):
+    """The table is stored in the cache and then reused without introspecting commands."""
+    table1 = completion.get_completion_table(dispatcher, "1.0", cache_filepath=cache_filepath)
+    assert json.loads(cache_filepath.read_text())["table"] == table1
+
+    with patch.object(BuildCommand, "fill_parser") as mock_fill:
+        table2 = completion.get_completion_table(dispatcher, "1.0", cache_filepath=cache_filepath)
+    assert table2 == table1
+    mock_fill.assert_not_called()
+
+
+def test_table_cached_lazy_command_not_imported(lazy_module, cache_filepath):
+    """With a valid cache, lazy commands are not imported."""
+    lazy = LazyCommand(f"{lazy_module}.LazyCommand", "lazycommand", "lazy help")
+    dispatcher = Dispatcher("testapp", [CommandGroup("title", [lazy])])
+    table = completion.get_completion_table(dispatcher, "1.0", cache_filepath=cache_filepath)
+    assert table["commands"]["lazycommand"]["options"] == ["--lazy-option"]
+
+    # same definition in a "new process"
+    del sys.modules[lazy_module]
+    dispatcher = Dispatcher("testapp", [CommandGroup("title", [lazy])])
+    table = completion.get_completion_table(dispatcher, "1.0", cache_filepath=cache_filepath)
+    assert table["commands"]["lazycommand"]["options"] == ["--lazy-option"]
+    assert lazy_module not in sys.modules
+
+
+def test_table_invalidated_by_version(dispatcher, cache_filepath):
+    """A different application version regenerates the table."""
+    completion.get_completion_table(dispatcher, "1.0", cache_filepath=cache_filepath)
+    with patch.object(completion, "_build_table", return_value={"new": "table"}):
+        table = completion.get_completion_table(dispatcher, "2.0", cache_filepath=cache_filepath)
+    assert table == {"new": "table"}
+
+
+def test_table_invalidated_by_commands(dispatcher, cache_filepath):
+    """A different set of commands regenerates the table."""
+    completion.get_completion_table(dispatcher, "1.0", cache_filepath=cache_filepath)
+
+    groups = [CommandGroup("title", [BuildCommand, create_command("other", "other help")])]
+    dispatcher = Dispatcher("testapp", groups)
+    table = completion.get_completion_table(dispatcher, "1.0", cache_filepath=cache_filepath)
+    assert sorted(table["commands"]) == ["build", "other"]
+
+
+def test_table_corrupted_cache(dispatcher, cache_filepath):
+    """A broken cache file is just regenerated."""
+    cache_filepath.parent.mkdir()
+    cache_filepath.write_text("{crap")
+    table = completion.get_completion_table(dispatcher, "1.0", cache_filepath=cache_filepath)
+    assert sorted(table["commands"]) == ["build", "clean"]
+    assert json.loads(cache_filepath.read_text())["table"] == table
+
+
+def test_table_default_cache_location(dispatcher, tmp_path, monkeypatch):
+    """By default the cache is in the user's cache directory for the application."""
+    cache_dir = tmp_path / "usercache"
+    monkeypatch.setattr(completion.platformdirs, "user_cache_dir", lambda appname: cache_dir)
+    completion.get_completion_table(dispatcher, "1.0")
+    assert (cache_dir / "completion.json").exists()
+
+
+# -- tests for the completion scripts
+
+
+def test_script_bad_shell(dispatcher, cache_filepath):
+    """Only some shells are supported."""
+    with pytest.raises(ValueError) as exc_cm:
+        completion.get_completion_script(dispatcher, "fish", "1.0", cache_filepath=cache_filepath)
+    assert str(exc_cm.value) == "Shell not supported for completion: 'fish'"
+
+
+def test_script_bash(dispatcher, cache_filepath):
+    """The bash script has the table embedded."""
+    script = completion.get_completion_script(
+        dispatcher, "bash", "1.0", cache_filepath=cache_filepath
+    )
+    assert "complete -o default -F _testapp_complete testapp" in script
+    assert 'words="-h --help -v --verbose -q --quiet -t --trace build clean help"' in script
+    assert 'help) words="build clean --all"' in script
+    assert 'case "$prev" in --output) return 0 ;; esac' in script
+
+
+def test_script_zsh(dispatcher, cache_filepath):
+    """The zsh script reuses the bash one through bashcompinit, without running compinit."""
+    bash_script = completion.get_completion_script(
+        dispatcher, "bash", "1.0", cache_filepath=cache_filepath
+    )
+    zsh_script = completion.get_completion_script(
+        dispatcher, "zsh", "1.0", cache_filepath=cache_filepath
+    )
+    assert zsh_script == completion.ZSH_PREFIX + bash_script + completion.ZSH_SUFFIX
+    assert "bashcompinit" in zsh_script
+    assert "+X compinit" not in zsh_script
+
+
+@pytest.mark.skipif(shutil.which("bash") is None, reason="bash needed")
+@pytest.mark.parametrize(
+    "words, expected",
+    [
+        (["testapp", ""], "-h --help -v --verbose -q --quiet -t --trace build clean help"),
+        (["testapp", "b"], "build"),
+        (["testapp", "-v", "c"], "clean"),
+        (["testapp", "help", ""], "build clean --all"),
+        (["testapp", "build", "--"], "--help --verbose --quiet --trace --output --force"),
+        (["testapp", "build", "--output", ""], ""),
+        (["testapp", "--project", "foo", "build", "--f"], "--force"),
+        (["testapp", "unknown", ""], ""),
+    ],
+)
+def test_script_run_in_bash(cache_filepath, words, expected):
+    """Really complete using the produced script."""
+    extra_arg = GlobalArgument("project", "option", "-p", "--project", "project help")
+    groups = [CommandGroup("title", [BuildCommand, create_command("clean", "clean help")])]
+    dispatcher = Dispatcher("testapp", groups, extra_global_args=[extra_arg])
+    script = completion.get_completion_script(
+        dispatcher, "bash", "1.0", cache_filepath=cache_filepath
+    )
+
+    quoted_words = " ".join(f"'{word}'" for word in words)
+    check = f"""
+        COMP_WORDS=({quoted_words})
+        COMP_CWORD={len(words) - 1}
+        _testapp_complete
+        echo "${{COMPREPLY[@]}}"
+    """
+    proc = subprocess.run(
+        ["bash", "-c", script + check], capture_output=True, text=True, check=True
+    )
+    result = set(proc.stdout.split())
+    # the global "project" options are offered too, but not relevant for these checks
+    result -= {"-p", "--project"}
+    assert result == set(expected.split())
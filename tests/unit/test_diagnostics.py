@@ -0,0 +1,166 @@
+# Copyright 2022 Canonical Ltd.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+"""Tests for the diagnostic bundles."""
+
+import sys
+import threading
+import zipfile
+from unittest.mock import patch
+
+import pytest
+
+from craft_cli import diagnostics
+
+# -- tests for the file tail
+
+
+@pytest.fixture
+def log_filepath(tmp_path):
+    """Provide a file with numbered lines."""
+    filepath = tmp_path / "test.log"
+    filepath.write_text("".join(f"line {idx}\n" for idx in range(10000)))
+    return filepath
+
+
+def test_tail_last_lines(log_filepath):
+    """The last lines are returned."""
+    tail = diagnostics.get_file_tail(log_filepath, max_lines=3)
+    assert tail == b"line 9997\nline 9998\nline 9999\n"
+
+
+def test_tail_short_file(tmp_path):
+    """The whole file is returned if it has less lines than the requested."""
+    filepath = tmp_path / "test.log"
+    filepath.write_text("line 1\nline 2\n")
+    assert diagnostics.get_file_tail(filepath, max_lines=3) == b"line 1\nline 2\n"
+
+
+def test_tail_empty_file(tmp_path):
+    """Support an empty file."""
+    filepath = tmp_path / "test.log"
+    filepath.write_text("")
+    assert diagnostics.get_file_tail(filepath) == b""
+
+
+def test_tail_unfinished_last_line(tmp_path):
+    """The last line is included even if not finished."""
+    filepath = tmp_path / "test.log"
+    filepath.write_text("line 1\nline 2\nline 3")
+    assert diagnostics.get_file_tail(filepath, max_lines=2) == b"line 2\nline 3"
+
+
+def test_tail_max_bytes(log_filepath):
+    """The tail is limited in size, only including complete lines."""
+    tail = diagnostics.get_file_tail(log_filepath, max_lines=100, max_bytes=25)
+    assert tail == b"line 9998\nline 9999\n"
+
+
+def test_tail_reads_only_the_end(log_filepath, monkeypatch):
+    """The file is read backwards, only what is needed."""
+    monkeypatch.setattr(diagnostics, "_READ_BLOCK_SIZE", 20)
+    read_sizes = []
+    orig_open = open
+
+    def recording_open(*args, **kwargs):
+        fh = orig_open(*args, **kwargs)
+        orig_read = fh.read
+
+        def read(size):
+            read_sizes.append(size)
+            return orig_read(size)
+
+        fh.read = read
+        return fh
+
+    with patch("builtins.open", recording_open):
+        tail = diagnostics.get_file_tail(log_filepath, max_lines=4)
+
+    assert tail == b"line 9996\nline 9997\nline 9998\nline 9999\n"
+    assert read_sizes == [20, 20, 20]
+
+
+# -- tests for the environment info
+
+
+def test_environment_info():
+    """Python and platform information is provided."""
+    info = diagnostics.get_environment_info()
+    assert info["python_version"] == sys.version
+    assert info["python_executable"] == sys.executable
+    assert info["argv"] == sys.argv
+    assert info["platform"]
+    assert info["machine"]
+
+
+# -- tests for writing the bundle
+
+
+def test_bundle_written(tmp_path):
+    """The bundle is a compressed zip file with the given members."""
+    bundle_filepath = tmp_path / "test.diag.zip"
+    members = {
+        "text.txt": "some text " * 100,
+        "binary.bin": b"\x00\x01",
+        "produced.txt": lambda: "produced text",
+    }
+    written = diagnostics.write_bundle(bundle_filepath, members, timeout=10)
+    assert written
+
+    with zipfile.ZipFile(bundle_filepath) as bundle:
+        assert bundle.read("text.txt") == b"some text " * 100
+        assert bundle.read("binary.bin") == b"\x00\x01"
+        assert bundle.read("produced.txt") == b"produced text"
+        assert bundle.getinfo("text.txt").compress_type == zipfile.ZIP_DEFLATED
+    assert list(tmp_path.iterdir()) == [bundle_filepath]
+
+
+def test_bundle_timeout(tmp_path):
+    """The bundle is abandoned if not written in time."""
+    bundle_filepath = tmp_path / "test.diag.zip"
+    release = threading.Event()
+
+    def slow():
+        release.wait()
+        return "slow text"
+
+    writers = []
+    orig_init = diagnostics._BundleWriter.__init__
+
+    def recording_init(self, *args, **kwargs):
+        orig_init(self, *args, **kwargs)
+        writers.append(self)
+
+    with patch.object(diagnostics._BundleWriter, "__init__", recording_init):
+        written = diagnostics.write_bundle(bundle_filepath, {"slow.txt": slow}, timeout=0.05)
+    assert not written
+
+    # let it finish, it must not leave anything behind
+    release.set()
+    (writer,) = writers
+    writer.join()
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_bundle_failure(tmp_path):
+    """A failure when writing the bundle does not leave anything behind."""
+    bundle_filepath = tmp_path / "test.diag.zip"
+
+    def broken():
+        raise OSError("no log")
+
+    written = diagnostics.write_bundle(bundle_filepath, {"broken.txt": broken}, timeout=10)
+    assert not written
+    assert list(tmp_path.iterdir()) == []
@@ -14,6 +14,11 @@
 # Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 
 import argparse
+import io
+import json
+import sys
+import textwrap
+from typing import Any, List, Tuple
 from unittest.mock import patch
 
 import pytest
@@ -22,11 +27,19 @@ from craft_cli import EmitterMode, emit
 from craft_cli.dispatcher import (
     _DEFAULT_GLOBAL_ARGS,
     BaseCommand,
+    BatchResult,
+    CommandArgument,
     CommandGroup,
     Dispatcher,
     GlobalArgument,
+    LazyCommand,
+)
+from craft_cli.errors import (
+    ArgumentParsingError,
+    CraftError,
+    ProvideExportException,
+    ProvideHelpException,
 )
-from craft_cli.errors import ArgumentParsingError
 from tests.factory import create_command
 
 
@@ -440,6 +453,605 @@ def test_dispatcher_global_arguments_extra_arguments():
     assert dispatcher.global_arguments == _DEFAULT_GLOBAL_ARGS + [extra_arg]
 
 
+def test_dispatcher_global_arguments_bad_structure():
+    """The global arguments are validated when the dispatcher is created."""
+    cmd = create_command("somecommand")
+    groups = [CommandGroup("title", [cmd])]
+
+    extra_arg = GlobalArgument("other", "badtype", "-o", "--other", "Other stuff")
+    with pytest.raises(ValueError, match="Bad global args structure."):
+        Dispatcher("appname", groups, extra_global_args=[extra_arg])
+
+
+def test_dispatcher_global_arguments_reused():
+    """The global arguments are prepared once, and many command lines can be parsed."""
+    cmd = create_command("somecommand")
+    groups = [CommandGroup("title", [cmd])]
+    extra_arg = GlobalArgument("other", "option", "-o", "--other", "Other stuff")
+    dispatcher = Dispatcher("appname", groups, extra_global_args=[extra_arg])
+
+    global_args = dispatcher.pre_parse_args(["somecommand", "--other=foo"])
+    assert global_args["other"] == "foo"
+    global_args = dispatcher.pre_parse_args(["somecommand"])
+    assert global_args["other"] is None
+    global_args = dispatcher.pre_parse_args(["-o", "bar", "somecommand"])
+    assert global_args["other"] == "bar"
+
+    with pytest.raises(TypeError):
+        dispatcher._global_args_grammar.per_option["--foo"] = extra_arg
+
+
+def test_dispatcher_command_parser_reused():
+    """The command parser is built only once for many command lines if arguments are static."""
+
+    class MyCommand(BaseCommand):
+        """Command with its arguments declared statically."""
+
+        name = "somecommand"
+        help_msg = "some help"
+        overview = "fake overview"
+        arguments = [CommandArgument("--option", help="option help")]
+
+    groups = [CommandGroup("title", [MyCommand])]
+    dispatcher = Dispatcher("appname", groups)
+
+    with patch.object(BaseCommand, "fill_parser", autospec=True) as mock_fill:
+        mock_fill.side_effect = lambda self, parser: parser.add_argument("--option")
+        dispatcher.pre_parse_args(["somecommand", "--option=foo"])
+        dispatcher.load_command(None)
+        assert dispatcher._parsed_command_args.option == "foo"
+
+        dispatcher.pre_parse_args(["somecommand", "--option=bar"])
+        dispatcher.load_command(None)
+        assert dispatcher._parsed_command_args.option == "bar"
+
+    assert mock_fill.call_count == 1
+
+
+def test_dispatcher_command_parser_dynamic_config():
+    """The parser of commands with a custom fill_parser is filled with each config."""
+
+    class MyCommand(BaseCommand):
+        """Command which arguments depend on the config."""
+
+        name = "somecommand"
+        help_msg = "some help"
+        overview = "fake overview"
+
+        def fill_parser(self, parser):
+            parser.add_argument("target", choices=self.config["targets"])
+
+    groups = [CommandGroup("title", [MyCommand])]
+    dispatcher = Dispatcher("appname", groups)
+
+    dispatcher.pre_parse_args(["somecommand", "a"])
+    dispatcher.load_command({"targets": ["a"]})
+    assert dispatcher._parsed_command_args.target == "a"
+
+    dispatcher.pre_parse_args(["somecommand", "b"])
+    dispatcher.load_command({"targets": ["b"]})
+    assert dispatcher._parsed_command_args.target == "b"
+
+
+# --- Tests for the batch mode
+
+
+class BatchCommand(BaseCommand):
+    """A command to be run in batch, behaving as its arguments indicate."""
+
+    name = "batchcmd"
+    help_msg = "batch help"
+    overview = "batch overview"
+    executed: List[Tuple[str, Any, EmitterMode]] = []
+
+    def fill_parser(self, parser):
+        parser.add_argument("behaviour", help="what to do")
+
+    def run(self, parsed_args):
+        self.executed.append((parsed_args.behaviour, self.config, emit.get_mode()))
+        if parsed_args.behaviour == "craft-error":
+            raise CraftError("bad thing", retcode=7)
+        if parsed_args.behaviour == "crash":
+            raise ValueError("boom")
+        if parsed_args.behaviour == "retcode":
+            return 3
+        return None
+
+
+@pytest.fixture
+def batch_dispatcher():
+    """Provide a dispatcher with a command that records its executions."""
+    BatchCommand.executed = []
+    groups = [CommandGroup("title", [BatchCommand])]
+    return Dispatcher("appname", groups)
+
+
+def test_batch_simple(batch_dispatcher):
+    """Run several commands, with the same config."""
+    source = io.StringIO("batchcmd ok\n\n# a comment\n  batchcmd 'other ok'  \n")
+    results = batch_dispatcher.run_batch(source, "test-config")
+
+    assert [(r.command_line, r.retcode) for r in results] == [
+        ("batchcmd ok", 0),
+        ("batchcmd 'other ok'", 0),
+    ]
+    assert all(isinstance(r, BatchResult) and r.duration >= 0 for r in results)
+    assert BatchCommand.executed == [
+        ("ok", "test-config", EmitterMode.QUIET),
+        ("other ok", "test-config", EmitterMode.QUIET),
+    ]
+
+
+def test_batch_errors_continue(batch_dispatcher):
+    """Errors in a command are reported and the batch continues."""
+    source = io.StringIO(
+        "\n".join(
+            [
+                "batchcmd retcode",
+                "batchcmd craft-error",
+                "batchcmd crash",
+                "batchcmd",  # missing parameter
+                "nonexistent",
+                "batchcmd 'unclosed",
+                "help",
+                "batchcmd ok",
+            ]
+        )
+    )
+    with patch.object(emit, "report_error") as report_mock:
+        results = batch_dispatcher.run_batch(source, None)
+    assert [r.retcode for r in results] == [3, 7, 1, 1, 1, 1, 0, 0]
+
+    reported = [call_args[0][0] for call_args in report_mock.call_args_list]
+    assert len(reported) == 5
+    assert reported[0] == CraftError("bad thing", retcode=7)
+    assert str(reported[1]) == "Application internal error: ValueError('boom')"
+    assert isinstance(reported[1].__cause__, ValueError)
+    assert "the following arguments are required: behaviour" in str(reported[2])
+    assert "no such command 'nonexistent'" in str(reported[3])
+    assert str(reported[4]) == "Bad command line in batch, line 6: No closing quotation"
+
+    # the emitter is still working
+    assert not emit._stopped
+    assert BatchCommand.executed[-1][0] == "ok"
+
+
+def test_batch_help_to_stderr(batch_dispatcher, capsys):
+    """The help requested in batch is written to stderr, as in a single run."""
+    results = batch_dispatcher.run_batch(io.StringIO("help batchcmd\n"), None)
+    assert [result.retcode for result in results] == [0]
+    captured = capsys.readouterr()
+    assert "batch overview" in captured.err
+    assert captured.out == ""
+
+
+def test_batch_mode_restored(batch_dispatcher):
+    """The emitter mode changed by global options applies only to that command."""
+    source = io.StringIO("batchcmd -v first\nbatchcmd second\n")
+    batch_dispatcher.run_batch(source, None)
+    assert BatchCommand.executed == [
+        ("first", None, EmitterMode.VERBOSE),
+        ("second", None, EmitterMode.QUIET),
+    ]
+    assert emit.get_mode() == EmitterMode.QUIET
+
+
+def test_batch_greeting_not_repeated(batch_dispatcher):
+    """Changing and restoring the emitter mode doesn't show the greeting again."""
+    emit.set_mode(EmitterMode.VERBOSE)
+    source = io.StringIO("batchcmd -v first\nbatchcmd --trace second\nbatchcmd third\n")
+    with patch.object(emit._printer, "show") as show_mock:
+        batch_dispatcher.run_batch(source, None)
+    shown = [call_args[0][1] for call_args in show_mock.call_args_list]
+    assert not any(text.startswith("Logging execution to") for text in shown)
+    assert [executed[2] for executed in BatchCommand.executed] == [
+        EmitterMode.VERBOSE,
+        EmitterMode.TRACE,
+        EmitterMode.VERBOSE,
+    ]
+
+
+def test_batch_log_delimiters(batch_dispatcher):
+    """Each command is delimited in the log."""
+    source = io.StringIO("batchcmd ok\n")
+    with patch.object(emit, "trace") as trace_mock:
+        batch_dispatcher.run_batch(source, None)
+    traced = [call_args[0][0] for call_args in trace_mock.call_args_list]
+    assert traced[0] == "Batch command in line 1 started: batchcmd ok"
+    assert traced[-1].startswith("Batch command in line 1 finished: retcode=0 duration=")
+
+
+# --- Tests for the lazy commands
+
+
+@pytest.fixture
+def lazy_module(tmp_path, monkeypatch):
+    """Provide an importable module with a command, that is not imported yet."""
+    module_name = "test_lazy_commands_module"
+    module_file = tmp_path / f"{module_name}.py"
+    module_file.write_text(
+        textwrap.dedent(
+            """
+            from craft_cli import BaseCommand
+
+            class LazyCommand(BaseCommand):
+                name = "lazycommand"
+                help_msg = "lazy help"
+                overview = "lazy overview"
+
+                def fill_parser(self, parser):
+                    parser.add_argument("--lazy-option", help="lazy option help")
+
+                def run(self, parsed_args):
+                    return 42
+            """
+        )
+    )
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.delitem(sys.modules, module_name, raising=False)
+    yield module_name
+    sys.modules.pop(module_name, None)
+
+
+def test_lazycommand_not_imported_if_not_needed(lazy_module):
+    """The lazy command is not imported if other command is run, or general help is requested."""
+    cmd = create_command("somecommand", "some help")
+    lazy = LazyCommand(f"{lazy_module}.LazyCommand", "lazycommand", "lazy help")
+    groups = [CommandGroup("title", [cmd, lazy])]
+    dispatcher = Dispatcher("appname", groups)
+    assert dispatcher.commands["lazycommand"] is lazy
+
+    with pytest.raises(ProvideHelpException) as exc_cm:
+        dispatcher.pre_parse_args(["help", "--all"])
+    assert "lazycommand:  lazy help" in str(exc_cm.value)
+
+    dispatcher.pre_parse_args(["somecommand"])
+    dispatcher.load_command(None)
+    assert lazy_module not in sys.modules
+
+
+def test_lazycommand_run(lazy_module):
+    """The lazy command is imported when selected to run."""
+    lazy = LazyCommand(f"{lazy_module}.LazyCommand", "lazycommand", "lazy help")
+    groups = [CommandGroup("title", [create_command("somecommand"), lazy])]
+    dispatcher = Dispatcher("appname", groups)
+
+    dispatcher.pre_parse_args(["lazycommand", "--lazy-option=foo"])
+    assert lazy_module in sys.modules
+    assert dispatcher._command_class is sys.modules[lazy_module].LazyCommand
+
+    command = dispatcher.load_command("test-config")
+    assert command.config == "test-config"
+    assert dispatcher._parsed_command_args.lazy_option == "foo"
+    assert dispatcher.run() == 42
+
+
+def test_lazycommand_default(lazy_module):
+    """A lazy command can be the default one."""
+    lazy = LazyCommand(f"{lazy_module}.LazyCommand", "lazycommand", "lazy help")
+    groups = [CommandGroup("title", [lazy])]
+    dispatcher = Dispatcher("appname", groups, default_command=lazy)
+    dispatcher.pre_parse_args([])
+    assert dispatcher._command_class is sys.modules[lazy_module].LazyCommand
+
+
+def test_lazycommand_help(lazy_module):
+    """The lazy command is imported when its help is requested."""
+    lazy = LazyCommand(f"{lazy_module}.LazyCommand", "lazycommand", "lazy help")
+    groups = [CommandGroup("title", [create_command("somecommand"), lazy])]
+    dispatcher = Dispatcher("appname", groups)
+
+    with pytest.raises(ProvideHelpException) as exc_cm:
+        dispatcher.pre_parse_args(["help", "lazycommand"])
+    help_text = str(exc_cm.value)
+    assert "lazy overview" in help_text
+    assert "lazy option help" in help_text
+    assert "somecommand" in help_text  # in the "see also" section
+    assert lazy_module in sys.modules
+
+
+def test_lazycommand_bad_name(lazy_module):
+    """The name in the lazy command definition must match the one in the class."""
+    lazy = LazyCommand(f"{lazy_module}.LazyCommand", "othername", "lazy help")
+    dispatcher = Dispatcher("appname", [CommandGroup("title", [lazy])])
+    expected_msg = (
+        f"Bad lazy command definition: {lazy_module}.LazyCommand has name 'lazycommand' "
+        "but was declared as 'othername'"
+    )
+    with pytest.raises(RuntimeError) as exc_cm:
+        dispatcher.pre_parse_args(["othername"])
+    assert str(exc_cm.value) == expected_msg
+
+
+def test_lazycommand_repeated():
+    """Error while loading commands with repeated name, including lazy ones."""
+    Foo = create_command(name="repeated", class_name="Foo")
+    lazy = LazyCommand("some.module.Baz", "repeated", "lazy help")
+
+    groups = [
+        CommandGroup("whatever title", [Foo]),
+        CommandGroup("other title", [lazy]),
+    ]
+    expected_msg = "Multiple commands with same name: some.module.Baz and Foo"
+    with pytest.raises(RuntimeError, match=expected_msg):
+        Dispatcher("appname", groups)
+
+
+def test_lazycommand_defaults():
+    """The lazy command is not common by default."""
+    lazy = LazyCommand("some.module.Baz", "somename", "lazy help")
+    assert lazy.common is False
+
+
+# --- Tests for the statically declared arguments
+
+
+class StaticCommand(BaseCommand):
+    """A command with its arguments declared statically."""
+
+    name = "static"
+    help_msg = "static help"
+    overview = "static overview"
+    arguments = [
+        CommandArgument("target", help="the target"),
+        CommandArgument("-o", "--output", help="where to put it"),
+        CommandArgument("--force", action="store_true", help="force it"),
+    ]
+
+    def run(self, parsed_args):
+        return (parsed_args.target, parsed_args.output, parsed_args.force)
+
+
+def test_commandargument_structure():
+    """The argument keeps the names and options as given."""
+    arg = CommandArgument("-o", "--output", help="test help", type=int)
+    assert arg.names == ("-o", "--output")
+    assert arg.options == {"help": "test help", "type": int}
+
+
+@pytest.mark.parametrize(
+    "argument, is_option, takes_value",
+    [
+        (CommandArgument("target"), False, True),
+        (CommandArgument("--output"), True, True),
+        (CommandArgument("--output", nargs="?"), True, True),
+        (CommandArgument("--force", action="store_true"), True, False),
+        (CommandArgument("--verbose", action="count"), True, False),
+        (CommandArgument("--nothing", nargs=0), True, False),
+    ],
+)
+def test_commandargument_kinds(argument, is_option, takes_value):
+    """Tell the different kinds of arguments."""
+    assert argument.is_option == is_option
+    assert argument.takes_value == takes_value
+
+
+@pytest.mark.parametrize(
+    "argument, expected",
+    [
+        (CommandArgument("target", help="test help"), ("target", "test help")),
+        (CommandArgument("target", metavar="name", help="test help"), ("name", "test help")),
+        (CommandArgument("-o", "--output", help="test help"), ("-o, --output", "test help")),
+        (CommandArgument("--output"), ("--output", "")),
+    ],
+)
+def test_commandargument_help_item(argument, expected):
+    """The title and description for the help texts."""
+    assert argument.get_help_item() == expected
+
+
+def test_static_arguments_parsed():
+    """The declared arguments are used to parse the command line."""
+    dispatcher = Dispatcher("appname", [CommandGroup("title", [StaticCommand])])
+    dispatcher.pre_parse_args(["static", "foo", "--output", "bar", "--force"])
+    dispatcher.load_command(None)
+    assert dispatcher.run() == ("foo", "bar", True)
+
+
+def test_static_arguments_extended_in_fill_parser():
+    """Declared arguments are included if the overridden fill_parser calls the parent."""
+
+    class MixedCommand(StaticCommand):
+        def fill_parser(self, parser):
+            super().fill_parser(parser)
+            parser.add_argument("--extra", default="extra")
+
+        def run(self, parsed_args):
+            return (parsed_args.target, parsed_args.extra)
+
+    assert StaticCommand.has_static_arguments()
+    assert not MixedCommand.has_static_arguments()
+
+    dispatcher = Dispatcher("appname", [CommandGroup("title", [MixedCommand])])
+    dispatcher.pre_parse_args(["static", "foo"])
+    dispatcher.load_command(None)
+    assert dispatcher.run() == ("foo", "extra")
+
+
+def test_static_arguments_help_no_instantiation():
+    """The command is not instantiated to provide its help."""
+    dispatcher = Dispatcher("appname", [CommandGroup("title", [StaticCommand])])
+    with patch.object(StaticCommand, "__init__") as mock_init:
+        with pytest.raises(ProvideHelpException) as exc_cm:
+            dispatcher.pre_parse_args(["help", "static"])
+    mock_init.assert_not_called()
+    assert "-o, --output:  where to put it" in str(exc_cm.value)
+
+
+def test_static_arguments_help_validates_command():
+    """The command attributes are validated even if it's not instantiated."""
+
+    class BadCommand(StaticCommand):
+        overview = None
+
+    dispatcher = Dispatcher("appname", [CommandGroup("title", [BadCommand])])
+    with pytest.raises(ValueError) as exc_cm:
+        dispatcher.pre_parse_args(["help", "static"])
+    assert str(exc_cm.value) == "Bad command configuration: missing value in 'overview'."
+
+
+def test_static_arguments_same_help():
+    """The help is the same than declaring the arguments in fill_parser."""
+
+    class DynamicCommand(StaticCommand):
+        arguments = ()
+
+        def fill_parser(self, parser):
+            parser.add_argument("target", help="the target")
+            parser.add_argument("-o", "--output", help="where to put it")
+            parser.add_argument("--force", action="store_true", help="force it")
+
+    texts = []
+    for cmd in (StaticCommand, DynamicCommand):
+        dispatcher = Dispatcher("appname", [CommandGroup("title", [cmd])])
+        with pytest.raises(ProvideHelpException) as exc_cm:
+            dispatcher.pre_parse_args(["help", "static"])
+        texts.append(str(exc_cm.value))
+    assert texts[0] == texts[1]
+
+
+# --- Tests for the commands tree export
+
+
+def test_command_tree():
+    """The whole commands structure is exported."""
+
+    class DynamicCommand(BaseCommand):
+        name = "dynamic"
+        help_msg = "dynamic help"
+        overview = "dynamic overview"
+        common = True
+
+        def fill_parser(self, parser):
+            parser.add_argument("name", metavar="the-name", help="the name")
+            parser.add_argument("--number", type=int)
+
+    extra_arg = GlobalArgument("project", "option", "-p", "--project", "project help")
+    groups = [
+        CommandGroup("group 1", [StaticCommand]),
+        CommandGroup("group 2", [DynamicCommand]),
+    ]
+    dispatcher = Dispatcher(
+        "appname", groups, summary="app summary", extra_global_args=[extra_arg]
+    )
+    tree = dispatcher.get_command_tree()
+    assert tree["appname"] == "appname"
+    assert tree["summary"] == "app summary"
+    assert "version" not in tree
+    assert tree["global_arguments"][0] == {
+        "name": "help",
+        "type": "flag",
+        "short_option": "-h",
+        "long_option": "--help",
+        "help_message": "Show this help message and exit",
+    }
+    assert tree["global_arguments"][-1]["name"] == "project"
+    assert tree["groups"] == [
+        {
+            "name": "group 1",
+            "commands": [
+                {
+                    "name": "static",
+                    "help_msg": "static help",
+                    "overview": "static overview",
+                    "common": False,
+                    "arguments": [
+                        {
+                            "names": ["target"],
+                            "help": "the target",
+                            "option": False,
+                            "takes_value": True,
+                        },
+                        {
+                            "names": ["-o", "--output"],
+                            "help": "where to put it",
+                            "option": True,
+                            "takes_value": True,
+                        },
+                        {
+                            "names": ["--force"],
+                            "help": "force it",
+                            "option": True,
+                            "takes_value": False,
+                        },
+                    ],
+                },
+            ],
+        },
+        {
+            "name": "group 2",
+            "commands": [
+                {
+                    "name": "dynamic",
+                    "help_msg": "dynamic help",
+                    "overview": "dynamic overview",
+                    "common": True,
+                    "arguments": [
+                        {
+                            "names": ["name"],
+                            "help": "the name",
+                            "option": False,
+                            "takes_value": True,
+                        },
+                        {"names": ["--number"], "help": "", "option": True, "takes_value": True},
+                    ],
+                },
+            ],
+        },
+    ]
+
+
+def test_command_tree_versioned():
+    """If the application version is known, it's included with the definition hash."""
+    dispatcher = Dispatcher("appname", [CommandGroup("title", [StaticCommand])], version="1.2.3")
+    tree = dispatcher.get_command_tree()
+    assert tree["version"] == "1.2.3"
+    assert tree["definition_hash"] == dispatcher.get_definition_hash("1.2.3")
+
+
+def test_command_tree_lazy(lazy_module):
+    """Lazy commands are imported to export them."""
+    lazy = LazyCommand(f"{lazy_module}.LazyCommand", "lazycommand", "lazy help")
+    dispatcher = Dispatcher("appname", [CommandGroup("title", [lazy])])
+    (command,) = dispatcher.get_command_tree()["groups"][0]["commands"]
+    assert command["overview"] == "lazy overview"
+    assert command["arguments"][0]["names"] == ["--lazy-option"]
+
+
+@pytest.mark.parametrize(
+    "sysargs",
+    [
+        ["--export-commands-json"],
+        ["static", "--export-commands-json"],
+        ["-v", "--export-commands-json", "help"],
+    ],
+)
+def test_command_tree_hidden_option(sysargs):
+    """The tree is exported as JSON through a global option."""
+    dispatcher = Dispatcher("appname", [CommandGroup("title", [StaticCommand])])
+    with pytest.raises(ProvideExportException) as exc_cm:
+        dispatcher.pre_parse_args(sysargs)
+    assert json.loads(str(exc_cm.value)) == dispatcher.get_command_tree()
+
+
+def test_command_tree_hidden_option_batch(capsys):
+    """In batch mode the exported tree is written to stdout."""
+    dispatcher = Dispatcher("appname", [CommandGroup("title", [StaticCommand])])
+    results = dispatcher.run_batch(io.StringIO("--export-commands-json\n"), None)
+    assert [result.retcode for result in results] == [0]
+    captured = capsys.readouterr()
+    assert json.loads(captured.out) == dispatcher.get_command_tree()
+    assert captured.err == ""
+
+
+def test_command_tree_hidden_option_not_in_help():
+    """The option to export the tree is not shown in the help."""
+    dispatcher = Dispatcher("appname", [CommandGroup("title", [StaticCommand])])
+    with pytest.raises(ProvideHelpException) as exc_cm:
+        dispatcher.pre_parse_args(["help", "--all"])
+    assert "export" not in str(exc_cm.value)
+
+
 # --- Tests for the base command
 
 
@@ -13,14 +13,16 @@
 # along with this program; if not, write to the Free Software Foundation,
 # Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 
+import os
 import textwrap
 from unittest.mock import patch
 
 import pytest
 
-from craft_cli.dispatcher import CommandGroup, Dispatcher
+from craft_cli import helptexts
+from craft_cli.dispatcher import BaseCommand, CommandArgument, CommandGroup, Dispatcher
 from craft_cli.errors import ArgumentParsingError, ProvideHelpException
-from craft_cli.helptexts import HelpBuilder
+from craft_cli.helptexts import HelpBuilder, HelpCache
 from tests.factory import create_command
 
 
@@ -467,6 +469,54 @@ def test_tool_exec_command_incorrect_similar_several():
     assert str(exc_cm.value) == expected
 
 
+def test_tool_exec_help_on_command_similar():
+    """Ask help for a command that does not exist but is similar to another one."""
+    cmd = create_command("abcdefg", "Command line help.")
+    dispatcher = Dispatcher("testapp", [CommandGroup("group", [cmd])])
+    with pytest.raises(ArgumentParsingError) as exc_cm:
+        dispatcher.pre_parse_args(["help", "abcefg"])
+    assert (
+        "Error: command 'abcefg' not found to provide help for, maybe you meant 'abcdefg'"
+        in str(exc_cm.value)
+    )
+
+
+def test_tool_exec_command_option_similar():
+    """The command option does not exist but is similar to others."""
+
+    def fill_parser(self, parser):  # pylint: disable=unused-argument
+        parser.add_argument("--output")
+        parser.add_argument("--outputs")
+        parser.add_argument("--force", action="store_true")
+
+    cmd = create_command("somecommand", "Command line help.")
+    cmd.fill_parser = fill_parser
+    dispatcher = Dispatcher("testapp", [CommandGroup("group", [cmd])])
+    dispatcher.pre_parse_args(["somecommand", "--outpt=foo", "--forze", "extra", "--xyz"])
+    with pytest.raises(ArgumentParsingError) as exc_cm:
+        dispatcher.load_command(None)
+
+    expected = textwrap.dedent(
+        """\
+        Usage: testapp [options] command [args]...
+        Try 'testapp somecommand -h' for help.
+
+        Error: unrecognized arguments: --outpt=foo --forze extra --xyz ('--outpt': maybe you meant '--output' or '--outputs'; '--forze': maybe you meant '--force')
+        """  # noqa: E501 (line too long)
+    )
+    assert str(exc_cm.value) == expected
+
+
+def test_tool_exec_command_option_not_similar():
+    """The command option does not exist and is not similar to others."""
+    cmd = create_command("somecommand", "Command line help.")
+    dispatcher = Dispatcher("testapp", [CommandGroup("group", [cmd])])
+    dispatcher.pre_parse_args(["somecommand", "--whatever"])
+    with pytest.raises(ArgumentParsingError) as exc_cm:
+        dispatcher.load_command(None)
+    assert "Error: unrecognized arguments: --whatever\n" in str(exc_cm.value)
+
+
 @pytest.mark.parametrize(
     "sysargv",
     [
@@ -544,7 +594,7 @@ def test_tool_exec_command_dash_help_simple(help_option):
 
     # check the given information to the help text builder
     args = mock.call_args[0]
-    assert args[0].__class__ == cmd
+    assert args[0] is cmd  # not instantiated, as it has no dynamic arguments
     assert sorted(x[0] for x in args[1]) == [
         "-h, --help",
         "-q, --quiet",
@@ -570,7 +620,7 @@ def test_tool_exec_command_dash_help_reverse(help_option):
 
     # check the given information to the help text builder
     args = mock.call_args[0]
-    assert args[0].__class__ == cmd
+    assert args[0] is cmd  # not instantiated, as it has no dynamic arguments
     assert sorted(x[0] for x in args[1]) == [
         "-h, --help",
         "-q, --quiet",
@@ -679,7 +729,7 @@ def test_tool_exec_help_command_on_command_ok():
 
     # check the given information to the help text builder
     args = mock.call_args[0]
-    assert isinstance(args[0], cmd)
+    assert args[0] is cmd  # not instantiated, as it has no dynamic arguments
     assert sorted(x[0] for x in args[1]) == [
         "-h, --help",
         "-q, --quiet",
@@ -803,3 +853,403 @@ def test_tool_exec_help_command_all():
         "-t, --trace",
         "-v, --verbose",
     ]
+
+
+# -- the help texts cache
+
+
+def test_helpcache_builds_and_stores(tmp_path):
+    """The text is built the first time, and then reused from memory."""
+    cache = HelpCache(tmp_path, "testhash")
+    builder_calls = []
+
+    def builder():
+        builder_calls.append(True)
+        return "test help"
+
+    assert cache.get("full", builder) == "test help"
+    assert cache.get("full", builder) == "test help"
+    assert len(builder_calls) == 1
+    assert (tmp_path / "help-testhash.json").exists()
+
+
+def test_helpcache_persisted(tmp_path):
+    """The texts are reused from disk by other instances with the same hash."""
+    HelpCache(tmp_path, "testhash").get("full", lambda: "test help")
+
+    cache = HelpCache(tmp_path, "testhash")
+    assert cache.get("full", lambda: pytest.fail("should not be called")) == "test help"
+
+
+def test_helpcache_different_names(tmp_path):
+    """Each text is cached by its own name."""
+    cache = HelpCache(tmp_path, "testhash")
+    cache.get("full", lambda: "full help")
+    cache.get("command:build", lambda: "build help")
+
+    cache = HelpCache(tmp_path, "testhash")
+    assert cache.get("full", lambda: "bad") == "full help"
+    assert cache.get("command:build", lambda: "bad") == "build help"
+
+
+def test_helpcache_per_terminal_width(tmp_path, monkeypatch):
+    """The texts are cached per terminal width."""
+    cache = HelpCache(tmp_path, "testhash")
+    cache.get("full", lambda: "wide help")
+    monkeypatch.setattr("craft_cli.helptexts._get_terminal_width", lambda: 50)
+    assert cache.get("full", lambda: "narrow help") == "narrow help"
+
+
+def test_helpcache_other_hash_kept(tmp_path):
+    """Texts for other definitions are not used, but kept (as other version may use them)."""
+    HelpCache(tmp_path, "oldhash").get("full", lambda: "old help")
+
+    cache = HelpCache(tmp_path, "newhash")
+    assert cache.get("full", lambda: "new help") == "new help"
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        "help-newhash.json",
+        "help-oldhash.json",
+    ]
+    assert HelpCache(tmp_path, "oldhash").get("full", lambda: "bad") == "old help"
+
+
+def test_helpcache_oldest_removed(tmp_path, monkeypatch):
+    """Only the most recently written files are kept."""
+    monkeypatch.setattr(helptexts, "_HELP_CACHE_MAX_FILES", 3)
+    for idx in range(3):
+        HelpCache(tmp_path, f"hash{idx}").get("full", lambda: "test help")
+        # ensure the modification times are different, whatever the filesystem's resolution
+        os.utime(tmp_path / f"help-hash{idx}.json", (1000 + idx, 1000 + idx))
+
+    HelpCache(tmp_path, "newhash").get("full", lambda: "test help")
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        "help-hash1.json",
+        "help-hash2.json",
+        "help-newhash.json",
+    ]
+
+
+def test_helpcache_corrupted(tmp_path):
+    """A broken cache file is ignored."""
+    (tmp_path / "help-testhash.json").write_text("{crap")
+    cache = HelpCache(tmp_path, "testhash")
+    assert cache.get("full", lambda: "test help") == "test help"
+
+
+def test_helpcache_not_writable(tmp_path):
+    """Failing to store the texts doesn't break the help."""
+    cache_dir = tmp_path / "cache"
+    cache_dir.write_text("not a directory")
+    cache = HelpCache(cache_dir, "testhash")
+    assert cache.get("full", lambda: "test help") == "test help"
+
+
+def test_dispatcher_help_not_cached_without_version(tmp_path, monkeypatch):
+    """Without a version the help texts are not cached."""
+    monkeypatch.setattr("platformdirs.user_cache_dir", lambda appname: tmp_path / appname)
+    cmd = create_command("somecommand", "This command does that.")
+    dispatcher = Dispatcher("testapp", [CommandGroup("group", [cmd])])
+    with pytest.raises(ProvideHelpException):
+        dispatcher.pre_parse_args(["help"])
+    assert not (tmp_path / "testapp").exists()
+
+
+@pytest.mark.parametrize(
+    "sysargs, builder_method",
+    [
+        (["help"], "get_full_help"),
+        (["help", "--all"], "get_detailed_help"),
+        (["help", "somecommand"], "get_command_help"),
+    ],
+)
+def test_dispatcher_help_cached(tmp_path, monkeypatch, sysargs, builder_method):
+    """With a version the help texts are cached on disk."""
+    monkeypatch.setattr("platformdirs.user_cache_dir", lambda appname: tmp_path / appname)
+    cmd = create_command("somecommand", "This command does that.")
+    command_groups = [CommandGroup("group", [cmd])]
+
+    dispatcher = Dispatcher("testapp", command_groups, version="1.0")
+    with pytest.raises(ProvideHelpException) as exc_cm:
+        dispatcher.pre_parse_args(sysargs)
+    original_help = str(exc_cm.value)
+
+    # a new dispatcher (as in other run) doesn't build the text again
+    dispatcher = Dispatcher("testapp", command_groups, version="1.0")
+    with patch.object(HelpBuilder, builder_method) as mock:
+        with pytest.raises(ProvideHelpException) as exc_cm:
+            dispatcher.pre_parse_args(sysargs)
+    assert str(exc_cm.value) == original_help
+    mock.assert_not_called()
+
+    # but it's built again for other version
+    dispatcher = Dispatcher("testapp", command_groups, version="2.0")
+    with patch.object(HelpBuilder, builder_method, return_value="new help"):
+        with pytest.raises(ProvideHelpException) as exc_cm:
+            dispatcher.pre_parse_args(sysargs)
+    assert str(exc_cm.value) == "new help"
+
+
+def test_dispatcher_definition_hash():
+    """The definition hash changes with the version and the commands' information."""
+    cmd = create_command("somecommand", "This command does that.")
+    hash1 = Dispatcher("testapp", [CommandGroup("group", [cmd])]).get_definition_hash("1.0")
+    hash2 = Dispatcher("testapp", [CommandGroup("group", [cmd])]).get_definition_hash("1.0")
+    assert hash1 == hash2
+
+    assert (
+        Dispatcher("testapp", [CommandGroup("group", [cmd])]).get_definition_hash("2.0") != hash1
+    )
+    other_cmd = create_command("somecommand", "This command does other thing.")
+    dispatcher = Dispatcher("testapp", [CommandGroup("group", [other_cmd])])
+    assert dispatcher.get_definition_hash("1.0") != hash1
+    dispatcher = Dispatcher("testapp", [CommandGroup("other group", [cmd])])
+    assert dispatcher.get_definition_hash("1.0") != hash1
+
+
+@pytest.mark.parametrize(
+    "attributes",
+    [
+        {"overview": "Other overview."},
+        {"arguments": [CommandArgument("--other", help="Other option.")]},
+        {"arguments": [CommandArgument("--option", help="Other help.")]},
+    ],
+)
+def test_dispatcher_definition_hash_command_details(attributes):
+    """The definition hash changes with the commands' overview and arguments."""
+
+    def get_hash(overview, arguments):
+        cmd = create_command("somecommand", "This command does that.", overview=overview)
+        cmd.arguments = arguments
+        return Dispatcher("testapp", [CommandGroup("group", [cmd])]).get_definition_hash("1.0")
+
+    base_attributes = {
+        "overview": "Some overview.",
+        "arguments": [CommandArgument("--option", help="Some help.")],
+    }
+    assert get_hash(**base_attributes) == get_hash(**base_attributes)
+    assert get_hash(**base_attributes) != get_hash(**{**base_attributes, **attributes})
+
+
+def test_dispatcher_definition_hash_parser_filling():
+    """Commands filling the parser themselves are identified but not instantiated."""
+
+    class ParserCommand(BaseCommand):
+        name = "somecommand"
+        help_msg = "This command does that."
+        overview = "Some overview."
+
+        def __init__(self, config):
+            raise AssertionError("The command should not be instantiated.")
+
+        def fill_parser(self, parser):
+            raise AssertionError("The parser should not be filled.")
+
+    static_cmd = create_command(
+        "somecommand", "This command does that.", overview="Some overview."
+    )
+    static_hash = Dispatcher("testapp", [CommandGroup("group", [static_cmd])]).get_definition_hash(
+        "1.0"
+    )
+    dispatcher = Dispatcher("testapp", [CommandGroup("group", [ParserCommand])])
+    assert dispatcher.get_definition_hash("1.0") != static_hash
+
+
+# -- the layout engine
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "",
+        "short",
+        "Some words that need to be wrapped in several lines because they are a lot.",
+        "A text with hyphenated-words and very-very-long-hyphenated-words to break here.",
+        "Multiple  spaces,\ttabs and\nnewlines are normalized by textwrap.",
+        "Averyveryveryveryveryverylongwordthatneedstobebrokenbecauseitdoesnotfitatall ok",
+        "Exactly twenty chars and exactly twenty chars",
+    ],
+)
+@pytest.mark.parametrize("width", [10, 20, 41])
+def test_wrap_same_as_textwrap(text, width):
+    """The wrapping is the same than textwrap's."""
+    assert helptexts._wrap(text, width) == tuple(textwrap.wrap(text, width))
+
+
+@pytest.mark.parametrize(
+    "columns, expected",
+    [
+        ("50", 50),
+        ("72", 72),
+        ("200", 200),
+    ],
+)
+def test_terminal_width(monkeypatch, columns, expected):
+    """The width used is the terminal's."""
+    monkeypatch.setenv("COLUMNS", columns)
+    helptexts._get_terminal_width.cache_clear()
+    assert helptexts._get_terminal_width() == expected
+
+
+def test_terminal_width_cached(monkeypatch):
+    """The terminal width is only checked once."""
+    monkeypatch.setenv("COLUMNS", "50")
+    helptexts._get_terminal_width.cache_clear()
+    assert helptexts._get_terminal_width() == 50
+    monkeypatch.setenv("COLUMNS", "60")
+    assert helptexts._get_terminal_width() == 50
+
+
+def test_narrow_terminal(monkeypatch):
+    """The help texts are adapted to narrow terminals."""
+    monkeypatch.setattr(helptexts, "_get_terminal_width", lambda: 40)
+    command_groups = [
+        CommandGroup("group", [create_command("cmd", "A help text that is long enough.", True)])
+    ]
+    help_builder = HelpBuilder("testapp", "general summary", command_groups)
+    text = help_builder.get_full_help([("-h, --help", "Show this help message and exit")])
+    assert (
+        textwrap.dedent(
+            """\
+        Global options:
+            -h, --help:  Show this help message
+                         and exit
+
+        Starter commands:
+                   cmd:  A help text that is
+                         long enough.
+        """
+        )
+        in text
+    )
+
+
+def test_wide_terminal(monkeypatch):
+    """The help texts use all the width of wide terminals."""
+    monkeypatch.setenv("COLUMNS", "120")
+    helptexts._get_terminal_width.cache_clear()
+    help_msg = (
+        "A help text that is long enough to be wrapped in the default width of the terminal."
+    )
+    command_groups = [CommandGroup("group", [create_command("cmd", help_msg, True)])]
+    help_builder = HelpBuilder("testapp", "general summary", command_groups)
+    text = help_builder.get_full_help([])
+    assert f" cmd:  {help_msg}\n" in text
+
+
+def test_very_narrow_terminal(monkeypatch):
+    """The texts in the help items are never narrower than a minimum."""
+    monkeypatch.setattr(helptexts, "_get_terminal_width", lambda: 10)
+    page = helptexts._HelpPage(["title"])
+    page.add_items("Header:", [("title", "A help text that is long enough to wrap.")])
+    assert page.render() == textwrap.dedent(
+        """\
+        Header:
+            title:  A help text that is
+                    long enough to wrap.
+        """
+    )
+
+
+# -- searching commands
+
+
+@pytest.fixture
+def search_dispatcher():
+    """Provide a dispatcher with commands to search."""
+
+    def fill_parser(self, parser):  # pylint: disable=unused-argument
+        parser.add_argument("--channel", help="the channel where to release")
+
+    release_cmd = create_command("release", "Release a revision.", overview="Release it.")
+    release_cmd.fill_parser = fill_parser
+    command_groups = [
+        CommandGroup(
+            "group",
+            [
+                create_command("upload", "Upload a charm.", overview="Upload the charm."),
+                create_command("status", "Show the charm status.", overview="Channels info."),
+                release_cmd,
+            ],
+        )
+    ]
+    return Dispatcher("testapp", command_groups)
+
+
+def test_help_search(search_dispatcher):
+    """Search commands by their texts."""
+    with pytest.raises(ProvideHelpException) as exc_cm:
+        search_dispatcher.pre_parse_args(["help", "search", "charm"])
+
+    expected = textwrap.dedent(
+        """\
+        Commands matching 'charm':
+            upload:  Upload a charm.
+            status:  Show the charm status.
+
+        For more information about a command, run 'testapp help <command>'.
+        """
+    )
+    assert str(exc_cm.value) == expected
+
+
+def test_help_search_options_and_overview(search_dispatcher):
+    """The options' help and the overview are also searched."""
+    with pytest.raises(ProvideHelpException) as exc_cm:
+        search_dispatcher.pre_parse_args(["help", "search", "channel"])
+    assert "Commands matching 'channel':\n    release:  Release a revision.\n" in str(exc_cm.value)
+    assert "     status:  Show the charm status.\n" in str(exc_cm.value)
+
+
+def test_help_search_several_terms(search_dispatcher):
+    """Several terms can be searched, ranking first the commands matching more of them."""
+    with pytest.raises(ProvideHelpException) as exc_cm:
+        search_dispatcher.pre_parse_args(["help", "search", "upload", "charm"])
+    assert str(exc_cm.value).startswith(
+        "Commands matching 'upload charm':\n    upload:  Upload a charm.\n"
+    )
+
+
+def test_help_search_nothing_found(search_dispatcher):
+    """Nothing was found."""
+    with pytest.raises(ProvideHelpException) as exc_cm:
+        search_dispatcher.pre_parse_args(["help", "search", "whatever"])
+    assert str(exc_cm.value).startswith("No commands found matching 'whatever'.\n")
+
+
+def test_help_search_no_terms(search_dispatcher):
+    """Some terms are needed to search."""
+    with pytest.raises(ArgumentParsingError) as exc_cm:
+        search_dispatcher.pre_parse_args(["help", "search"])
+    assert "Error: Nothing to search; pass the terms after 'search'" in str(exc_cm.value)
+
+
+def test_help_search_command_named_search():
+    """If there is a 'search' command its help can still be requested."""
+    search_cmd = create_command("search", "Search things.", overview="Search overview.")
+    dispatcher = Dispatcher("testapp", [CommandGroup("group", [search_cmd])])
+    with pytest.raises(ProvideHelpException) as exc_cm:
+        dispatcher.pre_parse_args(["help", "search"])
+    assert "Search overview." in str(exc_cm.value)
+
+    with pytest.raises(ProvideHelpException) as exc_cm:
+        dispatcher.pre_parse_args(["help", "search", "things"])
+    assert "Commands matching 'things':" in str(exc_cm.value)
+
+
+def test_help_search_index_cached(tmp_path, monkeypatch):
+    """The search index is cached on disk, so commands are not loaded again."""
+    monkeypatch.setattr("platformdirs.user_cache_dir", lambda appname: tmp_path / appname)
+    cmd = create_command("upload", "Upload a charm.", overview="Upload the charm.")
+    command_groups = [CommandGroup("group", [cmd])]
+
+    dispatcher = Dispatcher("testapp", command_groups, version="1.0")
+    with pytest.raises(ProvideHelpException) as exc_cm:
+        dispatcher.pre_parse_args(["help", "search", "charm"])
+    original_help = str(exc_cm.value)
+
+    dispatcher = Dispatcher("testapp", command_groups, version="1.0")
+    with patch.object(Dispatcher, "_build_search_index") as mock:
+        with pytest.raises(ProvideHelpException) as exc_cm:
+            dispatcher.pre_parse_args(["help", "search", "charm"])
+    mock.assert_not_called()
+    assert str(exc_cm.value) == original_help
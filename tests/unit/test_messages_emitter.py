@@ -92,7 +92,8 @@ def test_init_quietish(mode, tmp_path, monkeypatch):
 
     assert emitter._mode == mode
     assert mock_printer.mock_calls == [
-        call(fake_logpath),  # the _Printer instantiation, passing the log filepath
+        # the _Printer instantiation, with the log filepath
+        call(fake_logpath, plain_output=None, log_sinks=()),
         call().show(None, "greeting"),  # the greeting, only sent to the log
     ]
 
@@ -123,7 +124,8 @@ def test_init_verboseish(mode, tmp_path, monkeypatch):
     assert emitter._mode == mode
     log_locat = f"Logging execution to {fake_logpath!r}"
     assert mock_printer.mock_calls == [
-        call(fake_logpath),  # the _Printer instantiation, passing the log filepath
+        # the _Printer instantiation, with the log filepath
+        call(fake_logpath, plain_output=None, log_sinks=()),
         call().show(None, "greeting"),  # the greeting, only sent to the log
         call().show(sys.stderr, greeting, use_timestamp=True, end_line=True, avoid_logging=True),
         call().show(sys.stderr, log_locat, use_timestamp=True, end_line=True, avoid_logging=True),
@@ -158,13 +160,23 @@ def test_init_receiving_logfile(tmp_path, monkeypatch):
     # filepath is properly informed and passed to the printer
     log_locat = f"Logging execution to {str(fake_logpath)!r}"
     assert mock_printer.mock_calls == [
-        call(fake_logpath),  # the _Printer instantiation, passing the log filepath
+        # the _Printer instantiation, with the log filepath
+        call(fake_logpath, plain_output=None, log_sinks=()),
         call().show(None, "greeting"),  # the greeting, only sent to the log
         call().show(sys.stderr, greeting, use_timestamp=True, end_line=True, avoid_logging=True),
         call().show(sys.stderr, log_locat, use_timestamp=True, end_line=True, avoid_logging=True),
     ]
 
 
+def test_init_options_keyword_only(tmp_path):
+    """The options after the log filepath can only be passed by keyword."""
+    emitter = Emitter()
+    with patch("craft_cli.messages._Printer"):
+        with pytest.raises(TypeError):
+            emitter.init(EmitterMode.QUIET, "testappname", "greeting", tmp_path / "log", True)
+    assert not emitter._initiated
+
+
 def test_init_double_regular_mode(tmp_path, monkeypatch):
     """Double init in regular usage mode."""
     # ensure it's not using the standard log filepath provider (that pollutes user dirs)
@@ -245,6 +257,23 @@ def test_set_mode_verboseish(get_initiated_emitter, mode):
     assert handler.mode == mode
 
 
+def test_set_mode_greeting_once(get_initiated_emitter):
+    """The greeting is shown only the first time a verbose-ish mode is set."""
+    greeting = "greeting"
+    emitter = get_initiated_emitter(EmitterMode.QUIET, greeting=greeting)
+    emitter.set_mode(EmitterMode.VERBOSE)
+    emitter.set_mode(EmitterMode.QUIET)
+    emitter.set_mode(EmitterMode.TRACE)
+    emitter.set_mode(EmitterMode.VERBOSE)
+
+    assert emitter.get_mode() == EmitterMode.VERBOSE
+    log_locat = f"Logging execution to {emitter._log_filepath!r}"
+    assert emitter.printer_calls == [
+        call().show(sys.stderr, greeting, use_timestamp=True, avoid_logging=True, end_line=True),
+        call().show(sys.stderr, log_locat, use_timestamp=True, avoid_logging=True, end_line=True),
+    ]
+
+
 # -- tests for emitting messages of all kind
 
 
@@ -307,7 +336,7 @@ def test_trace_in_non_trace_modes(get_initiated_emitter, mode):
     emitter.trace("some text")
 
     assert emitter.printer_calls == [
-        call().show(None, "some text", use_timestamp=True),
+        call().show(None, "some text", use_timestamp=True, kind="trace"),
     ]
 
 
@@ -317,7 +346,7 @@ def test_trace_in_trace_mode(get_initiated_emitter):
     emitter.trace("some text")
 
     assert emitter.printer_calls == [
-        call().show(sys.stderr, "some text", use_timestamp=True),
+        call().show(sys.stderr, "some text", use_timestamp=True, kind="trace"),
     ]
 
 
@@ -327,7 +356,7 @@ def test_progress_in_quiet_mode(get_initiated_emitter):
     emitter.progress("some text")
 
     assert emitter.printer_calls == [
-        call().show(None, "some text", use_timestamp=False, ephemeral=True),
+        call().show(None, "some text", use_timestamp=False, ephemeral=True, kind="progress"),
     ]
 
 
@@ -337,7 +366,7 @@ def test_progress_in_normal_mode(get_initiated_emitter):
     emitter.progress("some text")
 
     assert emitter.printer_calls == [
-        call().show(sys.stderr, "some text", use_timestamp=False, ephemeral=True),
+        call().show(sys.stderr, "some text", use_timestamp=False, ephemeral=True, kind="progress"),
     ]
 
 
@@ -354,7 +383,7 @@ def test_progress_in_verboseish_modes(get_initiated_emitter, mode):
     emitter.progress("some text")
 
     assert emitter.printer_calls == [
-        call().show(sys.stderr, "some text", use_timestamp=True, ephemeral=False),
+        call().show(sys.stderr, "some text", use_timestamp=True, ephemeral=False, kind="progress"),
     ]
 
 
@@ -372,7 +401,7 @@ def test_progressbar_in_useful_modes(get_initiated_emitter, mode):
     progresser = emitter.progress_bar("some text", 5000)
 
     assert emitter.printer_calls == [
-        call().show(sys.stderr, "some text", ephemeral=True),
+        call().show(sys.stderr, "some text", ephemeral=True, kind="progress"),
     ]
     assert progresser.total == 5000
     assert progresser.text == "some text"
@@ -393,7 +422,7 @@ def test_progressbar_in_quiet_mode(get_initiated_emitter):
     progresser = emitter.progress_bar("some text", 5000)
 
     assert emitter.printer_calls == [
-        call().show(None, "some text", ephemeral=True),
+        call().show(None, "some text", ephemeral=True, kind="progress"),
     ]
     assert progresser.stream is None
 
@@ -417,7 +446,7 @@ def test_openstream_in_quietish_modes(get_initiated_emitter, mode):
     assert emitter.printer_calls == []
     assert context_manager is instantiated_cm
     assert stream_context_manager_mock.mock_calls == [
-        call(emitter._printer, "some text", None),
+        call(emitter._printer, "some text", None, raw_capture=False, max_line_length=65536),
     ]
 
 
@@ -440,7 +469,7 @@ def test_openstream_in_verboseish_modes(get_initiated_emitter, mode):
     assert emitter.printer_calls == []
     assert context_manager is instantiated_cm
     assert stream_context_manager_mock.mock_calls == [
-        call(emitter._printer, "some text", sys.stderr),
+        call(emitter._printer, "some text", sys.stderr, raw_capture=False, max_line_length=65536),
     ]
 
 
@@ -487,8 +516,10 @@ def test_reporterror_simple_message_only_quietish(mode, get_initiated_emitter):
 
     full_log_message = f"Full execution log: {repr(emitter._log_filepath)}"
     assert emitter.printer_calls == [
-        call().show(sys.stderr, "test message", use_timestamp=False, end_line=True),
-        call().show(sys.stderr, full_log_message, use_timestamp=False, end_line=True),
+        call().show(sys.stderr, "test message", use_timestamp=False, end_line=True, kind="error"),
+        call().show(
+            sys.stderr, full_log_message, use_timestamp=False, end_line=True, kind="error"
+        ),
         call().stop(),
     ]
 
@@ -502,8 +533,8 @@ def test_reporterror_simple_message_only_verboseish(mode, get_initiated_emitter)
 
     full_log_message = f"Full execution log: {repr(emitter._log_filepath)}"
     assert emitter.printer_calls == [
-        call().show(sys.stderr, "test message", use_timestamp=True, end_line=True),
-        call().show(sys.stderr, full_log_message, use_timestamp=True, end_line=True),
+        call().show(sys.stderr, "test message", use_timestamp=True, end_line=True, kind="error"),
+        call().show(sys.stderr, full_log_message, use_timestamp=True, end_line=True, kind="error"),
         call().stop(),
     ]
 
@@ -517,9 +548,13 @@ def test_reporterror_detailed_info_quietish(mode, get_initiated_emitter):
 
     full_log_message = f"Full execution log: {repr(emitter._log_filepath)}"
     assert emitter.printer_calls == [
-        call().show(sys.stderr, "test message", use_timestamp=False, end_line=True),
-        call().show(None, "Detailed information: boom", use_timestamp=False, end_line=True),
-        call().show(sys.stderr, full_log_message, use_timestamp=False, end_line=True),
+        call().show(sys.stderr, "test message", use_timestamp=False, end_line=True, kind="error"),
+        call().show(
+            None, "Detailed information: boom", use_timestamp=False, end_line=True, kind="error"
+        ),
+        call().show(
+            sys.stderr, full_log_message, use_timestamp=False, end_line=True, kind="error"
+        ),
         call().stop(),
     ]
 
@@ -533,9 +568,15 @@ def test_reporterror_detailed_info_verboseish(mode, get_initiated_emitter):
 
     full_log_message = f"Full execution log: {repr(emitter._log_filepath)}"
     assert emitter.printer_calls == [
-        call().show(sys.stderr, "test message", use_timestamp=True, end_line=True),
-        call().show(sys.stderr, "Detailed information: boom", use_timestamp=True, end_line=True),
-        call().show(sys.stderr, full_log_message, use_timestamp=True, end_line=True),
+        call().show(sys.stderr, "test message", use_timestamp=True, end_line=True, kind="error"),
+        call().show(
+            sys.stderr,
+            "Detailed information: boom",
+            use_timestamp=True,
+            end_line=True,
+            kind="error",
+        ),
+        call().show(sys.stderr, full_log_message, use_timestamp=True, end_line=True, kind="error"),
         call().stop(),
     ]
 
@@ -559,15 +600,16 @@ def test_reporterror_chained_exception_quietish(mode, get_initiated_emitter):
 
     full_log_message = f"Full execution log: {repr(emitter._log_filepath)}"
     assert emitter.printer_calls == [
-        call().show(sys.stderr, "test message", use_timestamp=False, end_line=True),
-        call().show(None, "traceback line 1", use_timestamp=False, end_line=True),
-        call().show(None, "traceback line 2", use_timestamp=False, end_line=True),
-        call().show(sys.stderr, full_log_message, use_timestamp=False, end_line=True),
+        call().show(sys.stderr, "test message", use_timestamp=False, end_line=True, kind="error"),
+        call().show_lines(None, ["traceback line 1", "traceback line 2"], kind="error"),
+        call().show(
+            sys.stderr, full_log_message, use_timestamp=False, end_line=True, kind="error"
+        ),
         call().stop(),
     ]
 
-    # check the traceback lines are generated using the original exception
-    tblines_mock.assert_called_with(orig_exception)  # type: ignore
+    # check the traceback lines are generated using the original exception, complete
+    tblines_mock.assert_called_once_with(orig_exception)  # type: ignore
 
 
 @pytest.mark.parametrize("mode", [EmitterMode.VERBOSE, EmitterMode.TRACE])
@@ -589,15 +631,55 @@ def test_reporterror_chained_exception_verboseish(mode, get_initiated_emitter):
 
     full_log_message = f"Full execution log: {repr(emitter._log_filepath)}"
     assert emitter.printer_calls == [
-        call().show(sys.stderr, "test message", use_timestamp=True, end_line=True),
-        call().show(sys.stderr, "traceback line 1", use_timestamp=True, end_line=True),
-        call().show(sys.stderr, "traceback line 2", use_timestamp=True, end_line=True),
-        call().show(sys.stderr, full_log_message, use_timestamp=True, end_line=True),
+        call().show(sys.stderr, "test message", use_timestamp=True, end_line=True, kind="error"),
+        call().show_lines(
+            sys.stderr,
+            ["traceback line 1", "traceback line 2"],
+            use_timestamp=True,
+            log_lines=["traceback line 1", "traceback line 2"],
+            kind="error",
+        ),
+        call().show(sys.stderr, full_log_message, use_timestamp=True, end_line=True, kind="error"),
         call().stop(),
     ]
 
-    # check the traceback lines are generated using the original exception
-    tblines_mock.assert_called_with(orig_exception)  # type: ignore
+    # check the traceback lines are generated using the original exception, complete for
+    # the logs and bounded for the screen
+    assert tblines_mock.mock_calls == [
+        call(orig_exception),
+        call(orig_exception, max_frames=30, max_chain=5),
+    ]
+
+
+def test_reporterror_traceback_limits(tmp_path):
+    """The limits for the traceback shown in the screen can be configured."""
+    emitter = Emitter()
+    with patch("craft_cli.messages._Printer"):
+        emitter.init(
+            EmitterMode.VERBOSE,
+            "testappname",
+            "greeting",
+            log_filepath=tmp_path / "test.log",
+            traceback_max_frames=7,
+            traceback_max_chain=2,
+        )
+    try:
+        try:
+            raise ValueError("original")
+        except ValueError as err:
+            orig_exception = err
+            raise CraftError("test message") from err
+    except CraftError as err:
+        error = err
+
+    with patch("craft_cli.messages._get_traceback_lines") as tblines_mock:
+        tblines_mock.return_value = []
+        emitter.error(error)
+
+    assert tblines_mock.mock_calls == [
+        call(orig_exception),
+        call(orig_exception, max_frames=7, max_chain=2),
+    ]
 
 
 @pytest.mark.parametrize("mode", [EmitterMode.QUIET, EmitterMode.NORMAL])
@@ -609,9 +691,17 @@ def test_reporterror_with_resolution_quietish(mode, get_initiated_emitter):
 
     full_log_message = f"Full execution log: {repr(emitter._log_filepath)}"
     assert emitter.printer_calls == [
-        call().show(sys.stderr, "test message", use_timestamp=False, end_line=True),
-        call().show(sys.stderr, "Recommended resolution: run", use_timestamp=False, end_line=True),
-        call().show(sys.stderr, full_log_message, use_timestamp=False, end_line=True),
+        call().show(sys.stderr, "test message", use_timestamp=False, end_line=True, kind="error"),
+        call().show(
+            sys.stderr,
+            "Recommended resolution: run",
+            use_timestamp=False,
+            end_line=True,
+            kind="error",
+        ),
+        call().show(
+            sys.stderr, full_log_message, use_timestamp=False, end_line=True, kind="error"
+        ),
         call().stop(),
     ]
 
@@ -625,9 +715,15 @@ def test_reporterror_with_resolution_verboseish(mode, get_initiated_emitter):
 
     full_log_message = f"Full execution log: {repr(emitter._log_filepath)}"
     assert emitter.printer_calls == [
-        call().show(sys.stderr, "test message", use_timestamp=True, end_line=True),
-        call().show(sys.stderr, "Recommended resolution: run", use_timestamp=True, end_line=True),
-        call().show(sys.stderr, full_log_message, use_timestamp=True, end_line=True),
+        call().show(sys.stderr, "test message", use_timestamp=True, end_line=True, kind="error"),
+        call().show(
+            sys.stderr,
+            "Recommended resolution: run",
+            use_timestamp=True,
+            end_line=True,
+            kind="error",
+        ),
+        call().show(sys.stderr, full_log_message, use_timestamp=True, end_line=True, kind="error"),
         call().stop(),
     ]
 
@@ -642,9 +738,13 @@ def test_reporterror_with_docs_quietish(mode, get_initiated_emitter):
     full_log_message = f"Full execution log: {repr(emitter._log_filepath)}"
     full_docs_message = "For more information, check out: https://charmhub.io/docs/whatever"
     assert emitter.printer_calls == [
-        call().show(sys.stderr, "test message", use_timestamp=False, end_line=True),
-        call().show(sys.stderr, full_docs_message, use_timestamp=False, end_line=True),
-        call().show(sys.stderr, full_log_message, use_timestamp=False, end_line=True),
+        call().show(sys.stderr, "test message", use_timestamp=False, end_line=True, kind="error"),
+        call().show(
+            sys.stderr, full_docs_message, use_timestamp=False, end_line=True, kind="error"
+        ),
+        call().show(
+            sys.stderr, full_log_message, use_timestamp=False, end_line=True, kind="error"
+        ),
         call().stop(),
     ]
 
@@ -659,9 +759,11 @@ def test_reporterror_with_docs_verboseish(mode, get_initiated_emitter):
     full_log_message = f"Full execution log: {repr(emitter._log_filepath)}"
     full_docs_message = "For more information, check out: https://charmhub.io/docs/whatever"
     assert emitter.printer_calls == [
-        call().show(sys.stderr, "test message", use_timestamp=True, end_line=True),
-        call().show(sys.stderr, full_docs_message, use_timestamp=True, end_line=True),
-        call().show(sys.stderr, full_log_message, use_timestamp=True, end_line=True),
+        call().show(sys.stderr, "test message", use_timestamp=True, end_line=True, kind="error"),
+        call().show(
+            sys.stderr, full_docs_message, use_timestamp=True, end_line=True, kind="error"
+        ),
+        call().show(sys.stderr, full_log_message, use_timestamp=True, end_line=True, kind="error"),
         call().stop(),
     ]
 
@@ -689,13 +791,32 @@ def test_reporterror_full_complete(get_initiated_emitter):
     full_log_message = f"Full execution log: {repr(emitter._log_filepath)}"
     full_docs_message = "For more information, check out: https://charmhub.io/docs/whatever"
     assert emitter.printer_calls == [
-        call().show(sys.stderr, "test message", use_timestamp=True, end_line=True),
-        call().show(sys.stderr, "Detailed information: boom", use_timestamp=True, end_line=True),
-        call().show(sys.stderr, "traceback line 1", use_timestamp=True, end_line=True),
-        call().show(sys.stderr, "traceback line 2", use_timestamp=True, end_line=True),
-        call().show(sys.stderr, "Recommended resolution: run", use_timestamp=True, end_line=True),
-        call().show(sys.stderr, full_docs_message, use_timestamp=True, end_line=True),
-        call().show(sys.stderr, full_log_message, use_timestamp=True, end_line=True),
+        call().show(sys.stderr, "test message", use_timestamp=True, end_line=True, kind="error"),
+        call().show(
+            sys.stderr,
+            "Detailed information: boom",
+            use_timestamp=True,
+            end_line=True,
+            kind="error",
+        ),
+        call().show_lines(
+            sys.stderr,
+            ["traceback line 1", "traceback line 2"],
+            use_timestamp=True,
+            log_lines=["traceback line 1", "traceback line 2"],
+            kind="error",
+        ),
+        call().show(
+            sys.stderr,
+            "Recommended resolution: run",
+            use_timestamp=True,
+            end_line=True,
+            kind="error",
+        ),
+        call().show(
+            sys.stderr, full_docs_message, use_timestamp=True, end_line=True, kind="error"
+        ),
+        call().show(sys.stderr, full_log_message, use_timestamp=True, end_line=True, kind="error"),
         call().stop(),
     ]
 
@@ -718,3 +839,23 @@ def test_reporterror_double_after_error(get_initiated_emitter):
 
     emitter.error(CraftError("test message"))
     assert emitter.printer_calls == []
+
+
+def test_reporterror_without_stopping(get_initiated_emitter):
+    """Report the error but keep the machinery running."""
+    emitter = get_initiated_emitter(EmitterMode.QUIET)
+    with patch.object(emitter, "_report_error") as report_mock:
+        emitter.report_error(CraftError("test message"))
+    assert report_mock.mock_calls == [call(CraftError("test message"))]
+    assert not emitter._stopped
+    assert call().stop() not in emitter.printer_calls
+
+
+def test_reporterror_without_stopping_after_ending(get_initiated_emitter):
+    """Nothing is reported after ending."""
+    emitter = get_initiated_emitter(EmitterMode.TRACE)
+    emitter.ended_ok()
+    emitter.printer_calls.clear()
+
+    emitter.report_error(CraftError("test message"))
+    assert emitter.printer_calls == []
@@ -18,8 +18,10 @@
 
 import datetime
 import logging
+import os
 import re
 import sys
+import threading
 import time
 from unittest.mock import MagicMock, call
 
@@ -35,6 +37,7 @@ from craft_cli.messages import (
     _MessageInfo,
     _Printer,
     _Progresser,
+    _Scheduler,
     _Spinner,
 )
 
@@ -218,6 +221,108 @@ def test_progresser_dont_consume_exceptions():
             raise ValueError()
 
 
+# -- tests for the _Scheduler class
+
+
+@pytest.fixture
+def scheduler():
+    """Provide a scheduler, independent of the one used by the rest of the code."""
+    scheduler = _Scheduler()
+    yield scheduler
+    with scheduler.condition:
+        for scheduled in scheduler.heap:
+            scheduled.cancel()
+
+
+def test_scheduler_daemon(scheduler):
+    """It should be a daemon, started on demand."""
+    assert scheduler.daemon
+    assert not scheduler.is_alive()
+    scheduler.call_later(10, lambda: None)
+    assert scheduler.is_alive()
+
+
+def test_scheduler_calls_in_order(scheduler):
+    """The calls are done when due, independently of the scheduling order."""
+    called = []
+    done = threading.Event()
+    scheduler.call_later(0.03, lambda: (called.append("third"), done.set()))
+    scheduler.call_later(0.01, lambda: called.append("first"))
+    scheduler.call_later(0.02, lambda: called.append("second"))
+    assert done.wait(1)
+    assert called == ["first", "second", "third"]
+
+
+def test_scheduler_not_too_early(scheduler):
+    """The calls are never done before they're due."""
+    done = threading.Event()
+    start = time.monotonic()
+    scheduler.call_later(0.05, done.set)
+    assert done.wait(1)
+    assert time.monotonic() - start >= 0.05
+
+
+def test_scheduler_cancel(scheduler):
+    """Cancelled calls are not done."""
+    called = []
+    done = threading.Event()
+    scheduled = scheduler.call_later(0.01, lambda: called.append("cancelled"))
+    scheduler.call_later(0.02, done.set)
+    scheduled.cancel()
+    assert done.wait(1)
+    assert called == []
+
+
+def test_scheduler_no_idle_wakeups(scheduler):
+    """The thread only wakes up when there is something to do."""
+    clock_calls = []
+
+    def clock():
+        clock_calls.append(None)
+        return time.monotonic()
+
+    scheduler.clock = clock
+    done = threading.Event()
+    scheduler.call_later(0.01, done.set)
+    assert done.wait(1)
+    time.sleep(0.01)  # let the thread get back to wait
+
+    # nothing more to do, so nobody checks the time
+    checked = len(clock_calls)
+    time.sleep(0.2)
+    assert len(clock_calls) == checked
+
+
+def test_scheduler_failing_call(scheduler, monkeypatch):
+    """A failing call is reported, and the rest are done anyway."""
+    reported = []
+    monkeypatch.setattr(threading, "excepthook", reported.append)
+    done = threading.Event()
+    scheduler.call_later(0.01, lambda: 1 / 0)
+    scheduler.call_later(0.02, done.set)
+    assert done.wait(1)
+    (args,) = reported  # pylint: disable=unbalanced-tuple-unpacking
+    assert args.exc_type is ZeroDivisionError
+    assert args.thread is scheduler
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="POSIX only")
+def test_scheduler_after_fork():
+    """A forked child uses its own scheduler, even if the parent's one was already running."""
+    parent_scheduled = messages._scheduler.call_later(10, lambda: None)
+    try:
+        pid = os.fork()
+        if pid == 0:
+            # in the child: exit with 0 only if the scheduled call is done
+            done = threading.Event()
+            messages._scheduler.call_later(0.01, done.set)
+            os._exit(0 if done.wait(1) else 1)
+        _, status = os.waitpid(pid, 0)
+    finally:
+        parent_scheduled.cancel()
+    assert os.WIFEXITED(status) and os.WEXITSTATUS(status) == 0
+
+
 # -- tests for the _Spinner class
 
 
@@ -249,11 +354,6 @@ def spinner(tmp_path):
         spinner.stop()
 
 
-def test_spinner_daemon(spinner):
-    """It should be a daemon."""
-    assert spinner.daemon
-
-
 def test_spinner_working_simple(spinner, monkeypatch):
     """The spinner at work."""
     # set absurdly low times so we can have several spin texts in the test
@@ -385,7 +485,9 @@ def test_handler_emit_full_message(handler):
     logging.getLogger().error("test message %s", 23)
 
     assert handler.printer.mock_calls == [
-        call.show(sys.stderr, "test message 23", use_timestamp=False),
+        call.show(
+            sys.stderr, "test message 23", use_timestamp=False, kind="logging", level=logging.ERROR
+        ),
     ]
 
 
@@ -400,10 +502,14 @@ def test_handler_emit_quiet(handler):
     logger.debug("test debug")
 
     assert handler.printer.mock_calls == [
-        call.show(sys.stderr, "test error", use_timestamp=False),
-        call.show(sys.stderr, "test warning", use_timestamp=False),
-        call.show(None, "test info", use_timestamp=False),
-        call.show(None, "test debug", use_timestamp=False),
+        call.show(
+            sys.stderr, "test error", use_timestamp=False, kind="logging", level=logging.ERROR
+        ),
+        call.show(
+            sys.stderr, "test warning", use_timestamp=False, kind="logging", level=logging.WARNING
+        ),
+        call.show(None, "test info", use_timestamp=False, kind="logging", level=logging.INFO),
+        call.show(None, "test debug", use_timestamp=False, kind="logging", level=logging.DEBUG),
     ]
 
 
@@ -418,10 +524,16 @@ def test_handler_emit_normal(handler):
     logger.debug("test debug")
 
     assert handler.printer.mock_calls == [
-        call.show(sys.stderr, "test error", use_timestamp=False),
-        call.show(sys.stderr, "test warning", use_timestamp=False),
-        call.show(sys.stderr, "test info", use_timestamp=False),
-        call.show(None, "test debug", use_timestamp=False),
+        call.show(
+            sys.stderr, "test error", use_timestamp=False, kind="logging", level=logging.ERROR
+        ),
+        call.show(
+            sys.stderr, "test warning", use_timestamp=False, kind="logging", level=logging.WARNING
+        ),
+        call.show(
+            sys.stderr, "test info", use_timestamp=False, kind="logging", level=logging.INFO
+        ),
+        call.show(None, "test debug", use_timestamp=False, kind="logging", level=logging.DEBUG),
     ]
 
 
@@ -437,10 +549,16 @@ def test_handler_emit_verboseish(handler, mode):
     logger.debug("test debug")
 
     assert handler.printer.mock_calls == [
-        call.show(sys.stderr, "test error", use_timestamp=True),
-        call.show(sys.stderr, "test warning", use_timestamp=True),
-        call.show(sys.stderr, "test info", use_timestamp=True),
-        call.show(sys.stderr, "test debug", use_timestamp=True),
+        call.show(
+            sys.stderr, "test error", use_timestamp=True, kind="logging", level=logging.ERROR
+        ),
+        call.show(
+            sys.stderr, "test warning", use_timestamp=True, kind="logging", level=logging.WARNING
+        ),
+        call.show(sys.stderr, "test info", use_timestamp=True, kind="logging", level=logging.INFO),
+        call.show(
+            sys.stderr, "test debug", use_timestamp=True, kind="logging", level=logging.DEBUG
+        ),
     ]
 
 
@@ -459,3 +577,82 @@ def test_traceback_lines_simple():
     assert tbacklines[1].endswith(", in test_traceback_lines_simple")
     assert tbacklines[2] == '    raise ValueError("pumba")'
     assert tbacklines[3] == "ValueError: pumba"
+
+
+def _recurse(depth):
+    """Help to produce deep tracebacks."""
+    if depth:
+        _recurse(depth - 1)
+    raise ValueError("bottom")
+
+
+def test_traceback_lines_bounded_repeated_frames():
+    """Consecutive repetitions of the same frame are collapsed."""
+    try:
+        _recurse(50)
+    except ValueError as err:
+        tbacklines = list(_get_traceback_lines(err, max_frames=10))
+
+    assert tbacklines[0] == "Traceback (most recent call last):"
+    assert tbacklines[1].endswith(", in test_traceback_lines_bounded_repeated_frames")
+    assert tbacklines[3].endswith(", in _recurse")
+    assert tbacklines[4] == "    _recurse(depth - 1)"
+    assert tbacklines[5] == "  [previous frame repeated 49 times]"
+    assert tbacklines[6].endswith(", in _recurse")
+    assert tbacklines[7] == '    raise ValueError("bottom")'
+    assert tbacklines[8:] == ["ValueError: bottom"]
+
+
+def test_traceback_lines_bounded_frames_omitted():
+    """Only the first and last frames are shown if too many."""
+
+    def deep(depth):
+        # a different line each time, so the frames are not collapsed
+        if depth % 2:
+            deep(depth - 1)
+        elif depth:
+            deep(depth - 1)
+        raise ValueError("bottom")
+
+    try:
+        deep(20)
+    except ValueError as err:
+        full_lines = list(_get_traceback_lines(err))
+        tbacklines = list(_get_traceback_lines(err, max_frames=4))
+
+    assert tbacklines[0] == "Traceback (most recent call last):"
+    assert tbacklines[1:5] == full_lines[1:5]  # the first two frames
+    assert tbacklines[5] == "  [18 frames omitted]"
+    assert tbacklines[6:] == full_lines[-5:]  # the last two frames and the exception
+    assert len(tbacklines) == 1 + 4 * 2 + 1 + 1
+
+
+def test_traceback_lines_bounded_chain():
+    """Chained exceptions are shown with their links, up to the limit."""
+    try:
+        try:
+            try:
+                raise ValueError("first")
+            except ValueError:
+                raise TypeError("second")  # pylint: disable=raise-missing-from
+        except TypeError as err:
+            raise KeyError("third") from err
+    except KeyError as err:
+        full_lines = list(_get_traceback_lines(err))
+        all_lines = list(_get_traceback_lines(err, max_frames=10, max_chain=5))
+        tbacklines = list(_get_traceback_lines(err, max_frames=10, max_chain=2))
+
+    # when all fits the result is the same than the unbounded one (but the error location
+    # markers that some Python versions add)
+    assert all_lines == [line for line in full_lines if not line or line.strip(" ^~")]
+
+    assert tbacklines[0] == "[1 more chained exceptions omitted]"
+    assert tbacklines[1] == "Traceback (most recent call last):"
+    assert tbacklines[4] == "TypeError: second"
+    assert tbacklines[5:7] == [
+        "",
+        "The above exception was the direct cause of the following exception:",
+    ]
+    assert tbacklines[7] == "Traceback (most recent call last):"
+    assert tbacklines[-1] == "KeyError: 'third'"
+    assert "ValueError: first" not in tbacklines
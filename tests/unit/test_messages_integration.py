@@ -24,11 +24,15 @@ Most of the different cases here mimic the specification table in:
     https://docs.google.com/document/d/1Pe-0ED6db53SmrUGIAgVMzxeCOGJQwsZJWf7jzFSagQ/
 """
 
+import json
 import logging
+import pathlib
 import re
 import subprocess
 import sys
 import textwrap
+import time
+import zipfile
 from dataclasses import dataclass
 from unittest.mock import patch
 
@@ -37,6 +41,7 @@ import pytest
 from craft_cli import messages
 from craft_cli.errors import CraftError
 from craft_cli.messages import Emitter, EmitterMode
+from craft_cli.sinks import LogSink
 
 # the timestamp format (including final separator space)
 TIMESTAMP_FORMAT = r"\d\d\d\d-\d\d-\d\d \d\d:\d\d:\d\d.\d\d\d "
@@ -59,6 +64,12 @@ def fix_terminal_width(monkeypatch):
     monkeypatch.setattr(messages, "_get_terminal_width", lambda: 500)
 
 
+@pytest.fixture(autouse=True)
+def force_terminal_output(monkeypatch):
+    """Force the terminal output, as the captured streams are not really terminals."""
+    monkeypatch.setenv("CRAFT_CLI_PLAIN_OUTPUT", "0")
+
+
 @pytest.fixture
 def logger():
     """Provide a logger with an empty set of handlers."""
@@ -411,6 +422,240 @@ def test_04_third_party_output_verbose(capsys, tmp_path, mode):
     assert_outputs(capsys, emit, expected_err=expected, expected_log=expected)
 
 
+@pytest.fixture
+def run_script(tmp_path):
+    """Provide a function to write a script and get the command to run it."""
+
+    def func(content):
+        script = tmp_path / "script.py"
+        script.write_text(textwrap.dedent(content))
+        return [sys.executable, str(script)]
+
+    return func
+
+
+@pytest.mark.parametrize(
+    "mode",
+    [
+        EmitterMode.QUIET,
+        EmitterMode.NORMAL,
+    ],
+)
+def test_run_quietly(capsys, run_script, mode):
+    """Run a subprocess, its outputs only logged."""
+    command = run_script(
+        """
+        import sys, time
+        print("foobar out", flush=True)
+        time.sleep(0.1)
+        print("foobar err", file=sys.stderr, flush=True)
+        """
+    )
+    emit = Emitter()
+    emit.init(mode, "testapp", GREETING)
+    result = emit.run(command, text="Testing run")
+    emit.ended_ok()
+
+    assert result.returncode == 0
+    assert result.stdout_size == result.stderr_size == len("foobar out\n")
+    assert result.duration > 0.1
+    finish_text = (
+        f"Command finished: retcode=0 duration={result.duration:.3f}s stdout=11B stderr=11B"
+    )
+    expected = [
+        Line("Testing run", timestamp=True),
+        Line(":: foobar out", timestamp=True),
+        Line(":! foobar err", timestamp=True),
+        Line(finish_text),
+    ]
+    assert_outputs(capsys, emit, expected_log=expected)
+
+
+@pytest.mark.parametrize(
+    "mode",
+    [
+        EmitterMode.VERBOSE,
+        EmitterMode.TRACE,
+    ],
+)
+def test_run_verbosely(capsys, run_script, mode):
+    """Run a subprocess, its outputs also shown."""
+    command = run_script(
+        """
+        import sys, time
+        print("foobar out", flush=True)
+        time.sleep(0.1)
+        print("foobar err", file=sys.stderr, flush=True)
+        """
+    )
+    emit = Emitter()
+    emit.init(mode, "testapp", GREETING)
+    result = emit.run(command)
+    emit.ended_ok()
+
+    expected_err = [
+        Line(f"Running {sys.executable} {command[1]}", timestamp=True),
+        Line(":: foobar out", timestamp=True),
+        Line(":! foobar err", timestamp=True),
+    ]
+    finish_text = (
+        f"Command finished: retcode=0 duration={result.duration:.3f}s stdout=11B stderr=11B"
+    )
+    expected_log = expected_err + [Line(finish_text)]
+    assert_outputs(capsys, emit, expected_err=expected_err, expected_log=expected_log)
+
+
+def test_run_unfinished_lines_and_bad_utf8(run_script):
+    """The last lines are sent even if not finished, and undecodable bytes are replaced."""
+    command = run_script(
+        """
+        import sys
+        sys.stdout.buffer.write(b"not utf8: \\xff\\nunfinished")
+        """
+    )
+    emit = Emitter()
+    emit.init(EmitterMode.QUIET, "testapp", GREETING)
+    result = emit.run(command)
+    emit.ended_ok()
+
+    assert result.stdout_size == 22
+    log_content = pathlib.Path(emit._log_filepath).read_text()
+    assert ":: not utf8: \N{REPLACEMENT CHARACTER}\n" in log_content
+    assert ":: unfinished\n" in log_content
+
+
+def test_run_failure(run_script):
+    """A non-zero return code is reported with the last lines."""
+    command = run_script(
+        """
+        import sys
+        for idx in range(10):
+            print(f"line {idx}", flush=True)
+        print("bad thing", file=sys.stderr, flush=True)
+        sys.exit(7)
+        """
+    )
+    emit = Emitter()
+    emit.init(EmitterMode.QUIET, "testapp", GREETING)
+    with pytest.raises(CraftError) as exc_cm:
+        emit.run(command, tail_lines=3)
+    emit.ended_ok()
+
+    error = exc_cm.value
+    assert str(error) == f"Command {' '.join(command)!r} failed with exit code 7."
+    assert error.details == ":: line 8\n:: line 9\n:! bad thing"
+
+
+def test_run_failure_not_checked(run_script):
+    """A non-zero return code is just returned if not checked."""
+    command = run_script("import sys; sys.exit(7)")
+    emit = Emitter()
+    emit.init(EmitterMode.QUIET, "testapp", GREETING)
+    result = emit.run(command, check=False)
+    emit.ended_ok()
+    assert result.returncode == 7
+
+
+def test_run_timeout(run_script):
+    """The subprocess is killed if it takes too long."""
+    command = run_script(
+        """
+        import time
+        print("started", flush=True)
+        time.sleep(30)
+        """
+    )
+    emit = Emitter()
+    emit.init(EmitterMode.QUIET, "testapp", GREETING)
+    start = time.monotonic()
+    with pytest.raises(CraftError) as exc_cm:
+        emit.run(command, timeout=0.5)
+    emit.ended_ok()
+
+    assert time.monotonic() - start < 5
+    error = exc_cm.value
+    assert str(error) == f"Command {' '.join(command)!r} timed out after 0.5 seconds."
+    assert error.details == ":: started"
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="the outputs are read differently")
+def test_run_timeout_after_outputs_closed(run_script):
+    """The timeout is still enforced if the subprocess closes its outputs."""
+    command = run_script(
+        """
+        import os, time
+        print("started", flush=True)
+        os.close(1)
+        os.close(2)
+        time.sleep(30)
+        """
+    )
+    emit = Emitter()
+    emit.init(EmitterMode.QUIET, "testapp", GREETING)
+    start = time.monotonic()
+    with pytest.raises(CraftError) as exc_cm:
+        emit.run(command, timeout=0.5)
+    emit.ended_ok()
+
+    assert time.monotonic() - start < 5
+    error = exc_cm.value
+    assert str(error) == f"Command {' '.join(command)!r} timed out after 0.5 seconds."
+    assert error.details == ":: started"
+
+
+@pytest.mark.parametrize("script", ["", "import os; os.close(1); os.close(2)"])
+def test_run_timeout_error_value(run_script, tmp_path, script):
+    """The timeout error holds the indicated timeout, whenever it expires."""
+    printer = messages._Printer(tmp_path / "test.log")
+    runner = messages._SubprocessRunner(printer, None, tail_lines=5)
+    with pytest.raises(subprocess.TimeoutExpired) as exc_cm:
+        runner.run(run_script(script + "\nimport time; time.sleep(30)"), 0.5)
+    printer.stop()
+    assert exc_cm.value.timeout == 0.5
+
+
+def test_run_long_lines(capsys, run_script):
+    """Lines longer than the max are shown truncated, and logged in continuation segments."""
+    command = run_script(
+        """
+        import sys
+        print("0123456789abcdefghijABCDE", flush=True)
+        sys.stdout.write("0123456789" * 20)
+        """
+    )
+    emit = Emitter()
+    emit.init(EmitterMode.VERBOSE, "testapp", GREETING)
+    emit.run(command, text="Testing run", max_line_length=10)
+    emit.ended_ok()
+
+    _, err = capsys.readouterr()
+    shown = [line.split(" ", 2)[2].rstrip() for line in err.splitlines()[2:]]
+    assert shown == [
+        "Testing run",
+        ":: 0123456789",
+        ":: [15 bytes truncated]",
+        ":: 0123456789",
+        ":: [190 bytes truncated]",
+    ]
+    log_lines = pathlib.Path(emit._log_filepath).read_text().splitlines()
+    logged = [line.split(" ", 2)[2] for line in log_lines]
+    assert logged[2:5] == [":: 0123456789", ":+ abcdefghij", ":+ ABCDE"]
+    assert logged[5:25] == [":: 0123456789"] + [":+ 0123456789"] * 19
+    assert logged[25].startswith("Command finished: retcode=0")
+
+
+def test_run_popen_arguments(run_script, tmp_path):
+    """Extra arguments are passed to the subprocess creation."""
+    command = run_script("import os; print(os.getcwd(), os.environ['TESTVAR'])")
+    emit = Emitter()
+    emit.init(EmitterMode.QUIET, "testapp", GREETING)
+    emit.run(command, cwd=tmp_path, env={"TESTVAR": "testvalue"})
+    emit.ended_ok()
+
+    log_content = pathlib.Path(emit._log_filepath).read_text()
+    assert f":: {tmp_path} testvalue\n" in log_content
+
+
 @pytest.mark.parametrize(
     "mode",
     [
@@ -561,6 +806,88 @@ def test_08_09_error_unexpected_verbosely(capsys, mode):
     assert_outputs(capsys, emit, expected_err=expected, expected_log=expected)
 
 
+def test_error_diagnostic_bundle(capsys):
+    """A diagnostic bundle is written and indicated when finishing with an error."""
+    emit = Emitter()
+    emit.init(EmitterMode.QUIET, "testapp", GREETING, diagnostic_bundle=True)
+    emit.trace("Some trace.")
+    try:
+        raise ValueError("pumba")
+    except ValueError as exc:
+        error = CraftError("First message.", details="boom", retcode=3)
+        error.__cause__ = exc
+        with patch("craft_cli.messages._get_traceback_lines", return_value=["foo", "bar"]):
+            emit.error(error)
+
+    bundle_filepath = pathlib.Path(emit._log_filepath).with_name("testapp-ignored.diag.zip")
+    expected_err = [
+        Line("First message."),
+        Line(f"Full execution log: {emit._log_filepath!r}"),
+        Line(f"Diagnostic bundle: {str(bundle_filepath)!r}"),
+    ]
+    expected_log = [
+        Line("Some trace."),
+        Line("First message."),
+        Line("Detailed information: boom"),
+        Line("foo"),
+        Line("bar"),
+        Line(f"Full execution log: {emit._log_filepath!r}"),
+        Line(f"Diagnostic bundle: {str(bundle_filepath)!r}"),
+    ]
+    assert_outputs(
+        capsys,
+        emit,
+        expected_err=expected_err,
+        expected_log=expected_log,
+    )
+
+    with zipfile.ZipFile(bundle_filepath) as bundle:
+        assert sorted(bundle.namelist()) == [
+            "environment.json",
+            "error.json",
+            "log-tail.txt",
+            "traceback.txt",
+        ]
+        error_info = json.loads(bundle.read("error.json"))
+        environment = json.loads(bundle.read("environment.json"))
+        log_tail = bundle.read("log-tail.txt").decode("utf8")
+        traceback_text = bundle.read("traceback.txt").decode("utf8")
+
+    assert error_info == {
+        "type": "craft_cli.errors.CraftError",
+        "message": "First message.",
+        "details": "boom",
+        "resolution": None,
+        "docs_url": None,
+        "reportable": True,
+        "retcode": 3,
+    }
+    assert environment["greeting"] == GREETING
+    assert environment["mode"] == "quiet"
+    assert environment["python_version"] == sys.version
+    assert traceback_text == "foo\nbar\n"
+
+    # the log tail has everything up to the bundle creation
+    assert GREETING in log_tail
+    assert log_tail.endswith(f"Full execution log: {emit._log_filepath!r}\n")
+
+
+def test_error_diagnostic_bundle_not_written(capsys):
+    """The diagnostic bundle is not indicated if it could not be written."""
+    emit = Emitter()
+    emit.init(EmitterMode.QUIET, "testapp", GREETING, diagnostic_bundle=True)
+    with patch("craft_cli.diagnostics.write_bundle", return_value=False):
+        emit.error(CraftError("First message."))
+
+    expected_err = [Line("First message."), Line(f"Full execution log: {emit._log_filepath!r}")]
+    expected_log = [
+        Line("First message."),
+        Line(f"Full execution log: {emit._log_filepath!r}"),
+        Line("The diagnostic bundle could not be written."),
+    ]
+    assert_outputs(capsys, emit, expected_err=expected_err, expected_log=expected_log)
+
+
 def test_logging_when_quiet(capsys, logger):
     """Handle the different logging levels when in quiet mode."""
     emit = Emitter()
@@ -750,3 +1077,56 @@ def test_logging_after_closing(capsys, logger):
         Line("info 1", timestamp=True),
     ]
     assert_outputs(capsys, emit, expected_err=expected, expected_log=expected)
+
+
+def test_plain_output(capsys, monkeypatch):
+    """Complete lines without padding nor overwriting if the plain output is used."""
+    monkeypatch.setenv("CRAFT_CLI_PLAIN_OUTPUT", "1")
+    emit = Emitter()
+    emit.init(EmitterMode.NORMAL, "testapp", GREETING)
+    emit.progress("The meaning of life is 42.")
+    emit.message("The meaning of life is 42.")
+    emit.ended_ok()
+
+    out, err = capsys.readouterr()
+    assert out == "The meaning of life is 42.\n"
+    assert err == "The meaning of life is 42.\n"
+
+
+def test_log_sinks(logger, run_script):
+    """The log records are sent to the log sinks, indicating their kind and level."""
+
+    class RecordingSink(LogSink):
+        def __init__(self, **kwargs):
+            super().__init__(**kwargs)
+            self.records = []
+
+        def write(self, records):
+            self.records.extend(records)
+
+    all_sink = RecordingSink()
+    warning_sink = RecordingSink(level=logging.WARNING)
+    emit = Emitter()
+    emit.init(EmitterMode.QUIET, "testapp", GREETING, log_sinks=[all_sink, warning_sink])
+    emit.message("test message")
+    emit.trace("test trace")
+    logger.warning("test warning")
+    emit.run(run_script("print('test output')"), text="test run")
+    emit.error(CraftError("test error"))
+
+    records = [(record.text, record.kind, record.level) for record in all_sink.records]
+    assert records[:5] == [
+        (GREETING, "message", logging.INFO),
+        ("test message", "message", logging.INFO),
+        ("test trace", "trace", logging.DEBUG),
+        ("test warning", "logging", logging.WARNING),
+        ("test run", "subprocess", logging.INFO),
+    ]
+    assert ("test error", "error", logging.ERROR) in records
+    assert ":: test output" in [text for text, _, _ in records]
+
+    records = [(record.text, record.kind, record.level) for record in warning_sink.records]
+    assert records[:2] == [
+        ("test warning", "logging", logging.WARNING),
+        ("test error", "error", logging.ERROR),
+    ]
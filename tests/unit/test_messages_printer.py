@@ -18,13 +18,14 @@
 
 import shutil
 import sys
-import threading
+import time
 from datetime import datetime
+from unittest.mock import patch
 
 import pytest
 
 from craft_cli import messages
-from craft_cli.messages import _MessageInfo, _Printer, _Spinner
+from craft_cli.messages import _MessageInfo, _Printer
 
 
 @pytest.fixture
@@ -34,15 +35,24 @@ def log_filepath(tmp_path):
 
 
 @pytest.fixture(autouse=True)
-def thread_guard(tmp_path):
-    """Ensure that any started spinner is stopped after the test."""
+def scheduler_guard(tmp_path):
+    """Ensure that nothing scheduled by the test (spinning, flushing) runs after it."""
     # let's run the test first
     yield
 
-    # stop all spinner threads
-    for thread in threading.enumerate():
-        if isinstance(thread, _Spinner):
-            thread.stop()
+    # cancel all the pending scheduled calls
+    with messages._scheduler.condition:
+        for scheduled in messages._scheduler.heap:
+            scheduled.cancel()
+
+
+@pytest.fixture(autouse=True)
+def no_frames(monkeypatch):
+    """Write to terminals immediately, so the tests can check the output right away.
+
+    The tests for the frames (see `_FrameWriter`) set their own interval.
+    """
+    monkeypatch.setattr(messages, "_FRAME_INTERVAL", 0)
 
 
 @pytest.fixture(autouse=True)
@@ -477,6 +487,399 @@ def test_writebar_having_previous_message_ephemeral(capsys, monkeypatch, log_fil
     assert not err
 
 
+# -- tests for the plain output
+
+
+@pytest.mark.parametrize(
+    "plain_output, envvar, isatty, expected",
+    [
+        (None, None, False, True),
+        (None, None, True, False),
+        (None, "1", True, True),
+        (None, "0", False, False),
+        (None, "garbage", False, True),
+        (True, "0", True, True),
+        (False, "1", False, False),
+    ],
+)
+def test_plain_output_selection(monkeypatch, log_filepath, plain_output, envvar, isatty, expected):
+    """The plain output is selected by parameter, environment, or stream capabilities."""
+    if envvar is None:
+        monkeypatch.delenv("CRAFT_CLI_PLAIN_OUTPUT", raising=False)
+    else:
+        monkeypatch.setenv("CRAFT_CLI_PLAIN_OUTPUT", envvar)
+    monkeypatch.setattr(sys.stdout, "isatty", lambda: isatty)
+    printer = _Printer(log_filepath, plain_output=plain_output)
+    assert printer._use_plain_output(sys.stdout) is expected
+
+
+def test_writeplain_simple(capsys, log_filepath):
+    """Messages are written in complete lines, without any padding, when flushed."""
+    printer = _Printer(log_filepath)
+    printer._write_plain(_MessageInfo(sys.stdout, "test text"))
+    printer._write_plain(_MessageInfo(sys.stdout, "other text", ephemeral=True))
+
+    # nothing yet, as it's buffered
+    out, err = capsys.readouterr()
+    assert not out
+    assert not err
+
+    printer.plain_writer.flush()
+    out, err = capsys.readouterr()
+    assert out == "test text\nother text\n"
+    assert not err
+
+
+def test_writeplain_with_timestamp(capsys, log_filepath):
+    """A timestamp was indicated to use."""
+    printer = _Printer(log_filepath)
+    fake_now = datetime(2009, 9, 1, 12, 13, 15, 123456)
+    msg = _MessageInfo(sys.stdout, "test text", use_timestamp=True, created_at=fake_now)
+    printer._write_plain(msg)
+    printer.plain_writer.flush()
+
+    out, _ = capsys.readouterr()
+    assert out == "2009-09-01 12:13:15.123 test text\n"
+
+
+def test_writeplain_progress_bar(capsys, log_filepath):
+    """A progress bar is written as a simple line with the numerical progress."""
+    printer = _Printer(log_filepath)
+    msg = _MessageInfo(sys.stderr, "test text", ephemeral=True, bar_progress=20, bar_total=100)
+    printer._write_plain(msg)
+    printer.plain_writer.flush()
+
+    _, err = capsys.readouterr()
+    assert err == "test text [20/100]\n"
+
+
+def test_writeplain_streams_order(capsys, log_filepath):
+    """Changing the stream writes what was pending in the previous one."""
+    printer = _Printer(log_filepath)
+    printer._write_plain(_MessageInfo(sys.stderr, "text 1"))
+    printer._write_plain(_MessageInfo(sys.stdout, "text 2"))
+
+    out, err = capsys.readouterr()
+    assert not out
+    assert err == "text 1\n"
+
+    printer.plain_writer.flush()
+    out, err = capsys.readouterr()
+    assert out == "text 2\n"
+    assert not err
+
+
+def test_writeplain_buffer_size(capsys, monkeypatch, log_filepath):
+    """The pending text is written if it gets too big."""
+    monkeypatch.setattr(messages, "_PLAIN_BUFFER_SIZE", 10)
+    printer = _Printer(log_filepath)
+    printer._write_plain(_MessageInfo(sys.stdout, "text 1"))
+    out, _ = capsys.readouterr()
+    assert not out
+
+    printer._write_plain(_MessageInfo(sys.stdout, "text 2"))
+    out, _ = capsys.readouterr()
+    assert out == "text 1\ntext 2\n"
+
+
+def test_writeplain_flush_interval(capsys, monkeypatch, log_filepath):
+    """The pending text is written after some time."""
+    monkeypatch.setattr(messages, "_PLAIN_FLUSH_INTERVAL", 0.01)
+    printer = _Printer(log_filepath)
+    printer._write_plain(_MessageInfo(sys.stdout, "test text"))
+    assert printer.plain_writer.timer is not None
+    for _ in range(100):
+        if printer.plain_writer.timer is None:
+            break
+        time.sleep(0.01)
+    else:
+        pytest.fail("Waited too long for the pending text to be written")
+
+    out, _ = capsys.readouterr()
+    assert out == "test text\n"
+
+
+def test_writeplain_ephemeral_rate_limited(capsys, monkeypatch, log_filepath):
+    """Ephemeral messages are skipped if they come too fast, whatever their text."""
+    monkeypatch.setattr(messages, "_PLAIN_EPHEMERAL_INTERVAL", 1000)
+    printer = _Printer(log_filepath)
+    printer._write_plain(_MessageInfo(sys.stderr, "text 1", ephemeral=True))  # shown
+    printer._write_plain(_MessageInfo(sys.stderr, "text 1", ephemeral=True))  # skipped
+    printer._write_plain(_MessageInfo(sys.stderr, "text 2", ephemeral=True))  # skipped
+    printer._write_plain(_MessageInfo(sys.stderr, "text 3", ephemeral=True))  # skipped
+
+    # enough time passes
+    printer.prv_plain_ephemeral_moment -= 1000
+    printer._write_plain(_MessageInfo(sys.stderr, "text 4", ephemeral=True))  # shown
+    printer.plain_writer.flush()
+
+    _, err = capsys.readouterr()
+    assert err == "text 1\ntext 4\n"
+    assert printer.held_plain_ephemeral is None
+
+
+def test_writeplain_ephemeral_held_until_permanent(capsys, monkeypatch, log_filepath):
+    """The latest skipped ephemeral message is shown before the next permanent one."""
+    monkeypatch.setattr(messages, "_PLAIN_EPHEMERAL_INTERVAL", 1000)
+    printer = _Printer(log_filepath)
+    printer._write_plain(_MessageInfo(sys.stderr, "text 1", ephemeral=True))  # shown
+    printer._write_plain(_MessageInfo(sys.stderr, "text 2", ephemeral=True))  # held
+    printer._write_plain(_MessageInfo(sys.stderr, "text 3", ephemeral=True))  # held
+    printer._write_plain(_MessageInfo(sys.stdout, "permanent"))
+    printer._write_plain(_MessageInfo(sys.stdout, "other permanent"))
+    printer.plain_writer.flush()
+
+    out, err = capsys.readouterr()
+    assert err == "text 1\ntext 3\n"
+    assert out == "permanent\nother permanent\n"
+
+
+def test_writeplain_ephemeral_held_until_stop(capsys, monkeypatch, log_filepath):
+    """The latest skipped ephemeral message is shown when stopping."""
+    monkeypatch.setattr(messages, "_PLAIN_EPHEMERAL_INTERVAL", 1000)
+    printer = _Printer(log_filepath)
+    printer._write_plain(_MessageInfo(sys.stderr, "text 1", ephemeral=True))  # shown
+    printer._write_plain(_MessageInfo(sys.stderr, "text 2", ephemeral=True))  # held
+    printer.stop()
+
+    _, err = capsys.readouterr()
+    assert err == "text 1\ntext 2\n"
+
+
+def test_writeplain_progress_bar_completion(capsys, log_filepath):
+    """The completion of a progress bar is always shown."""
+    printer = _Printer(log_filepath)
+    for progress in (10, 50, 90, 100):
+        msg = _MessageInfo(
+            sys.stderr, "test text", ephemeral=True, bar_progress=progress, bar_total=100
+        )
+        printer._write_plain(msg)
+    printer.plain_writer.flush()
+
+    _, err = capsys.readouterr()
+    assert err == "test text [10/100]\ntest text [100/100]\n"
+
+
+def test_show_plain_output(capsys, log_filepath):
+    """Messages shown to streams that are not terminals use the plain output."""
+    printer = _Printer(log_filepath)
+    printer.show(sys.stderr, "test text")
+    printer.progress_bar(sys.stderr, "other text", 20, 100)
+    printer.stop()
+
+    _, err = capsys.readouterr()
+    assert err == "test text\nother text [20/100]\n"
+
+    # nothing is left unfinished for the terminal logic
+    assert printer.prv_msg is None
+    assert printer.unfinished_stream is None
+
+
+def test_show_plain_output_after_terminal(capsys, monkeypatch, log_filepath):
+    """A plain message leaves the terminal clean, completing its line and not spinning."""
+    monkeypatch.setattr(messages, "_get_terminal_width", lambda: 20)
+    monkeypatch.setattr(sys.stderr, "isatty", lambda: True)
+    printer = _Printer(log_filepath)
+    printer.spinner.start()
+    printer.show(sys.stderr, "in terminal")
+    assert printer.spinner.prv_msg is not None
+
+    printer.show(sys.stdout, "in plain")
+    assert printer.spinner.prv_msg is None
+    assert printer.prv_msg is None
+    assert printer.unfinished_stream is None
+
+    printer.show(sys.stderr, "again terminal")
+    printer.stop()
+    out, err = capsys.readouterr()
+    assert out == "in plain\n"
+    assert err == "in terminal" + " " * 8 + "\n" + "again terminal" + " " * 5 + "\n"
+
+
+# -- tests for the frames in the terminal output
+
+
+class CountingStream:
+    """A stream that records the written chunks, and how many times it's flushed."""
+
+    def __init__(self):
+        self.chunks = []
+        self.flushes = 0
+
+    def write(self, text):
+        self.chunks.append(text)
+
+    def flush(self):
+        self.flushes += 1
+
+
+def test_frames_idle_write_immediate(monkeypatch, log_filepath):
+    """When idle the text is written right away, then accumulated until the frame ends."""
+    monkeypatch.setattr(messages, "_FRAME_INTERVAL", 0.05)
+    writer = messages._FrameWriter()
+    stream = CountingStream()
+    writer.write(stream, "text 1")
+    assert stream.chunks == ["text 1"]
+    writer.write(stream, "text 2")
+    writer.write(stream, "text 3")
+    assert stream.chunks == ["text 1"]
+
+    for _ in range(100):
+        if writer.timer is None:
+            break
+        time.sleep(0.01)
+    else:
+        pytest.fail("Waited too long for the frame to end")
+    assert stream.chunks == ["text 1", "text 2text 3"]
+    assert stream.flushes == 2
+
+    # idle again
+    writer.write(stream, "text 4")
+    assert stream.chunks == ["text 1", "text 2text 3", "text 4"]
+    writer.flush()
+
+
+def test_frames_streams_order(monkeypatch, log_filepath):
+    """Changing the stream writes what was pending in the previous one."""
+    monkeypatch.setattr(messages, "_FRAME_INTERVAL", 10)
+    writer = messages._FrameWriter()
+    stream_1 = CountingStream()
+    stream_2 = CountingStream()
+    writer.write(stream_1, "text 1")
+    writer.write(stream_1, "text 2")
+    writer.write(stream_2, "text 3")
+    assert stream_1.chunks == ["text 1", "text 2"]
+    assert stream_2.chunks == []
+    writer.write(stream_2, "text 4")
+    writer.flush()
+    assert stream_2.chunks == ["text 3text 4"]
+
+
+def test_frames_buffer_size(monkeypatch, log_filepath):
+    """The pending text is written if it gets too big."""
+    monkeypatch.setattr(messages, "_FRAME_INTERVAL", 10)
+    monkeypatch.setattr(messages, "_FRAME_BUFFER_SIZE", 10)
+    writer = messages._FrameWriter()
+    stream = CountingStream()
+    writer.write(stream, "text 1")
+    writer.write(stream, "text 2")
+    assert stream.chunks == ["text 1"]
+    writer.write(stream, "text 3")
+    assert stream.chunks == ["text 1", "text 2text 3"]
+    writer.flush()
+
+
+def test_frames_same_final_output(monkeypatch, log_filepath):
+    """The terminal receives the same text (overwritings included) as without frames."""
+    monkeypatch.setattr(messages, "_get_terminal_width", lambda: 40)
+    messages_kwargs = [
+        {"text": "permanent 1"},
+        {"text": "ephemeral 1", "ephemeral": True},
+        {"text": "ephemeral 2", "ephemeral": True},
+        {"text": "permanent 2", "end_line": True},
+        {"text": "progress", "ephemeral": True, "bar_progress": 5, "bar_total": 10},
+        {"text": "permanent 3"},
+    ]
+
+    outputs = []
+    for interval in (0, 10):
+        monkeypatch.setattr(messages, "_FRAME_INTERVAL", interval)
+        printer = _Printer(log_filepath)
+        stream = CountingStream()
+        for kwargs in messages_kwargs:
+            msg = _MessageInfo(stream, **kwargs)
+            if msg.bar_progress is None:
+                printer._write_line(msg)
+            else:
+                printer._write_bar(msg)
+            printer.prv_msg = msg
+        printer.screen_writer.flush()
+        outputs.append(stream.chunks)
+        printer.log.close()
+
+    without_frames, with_frames = outputs
+    assert len(with_frames) < len(without_frames)
+    assert "".join(with_frames) == "".join(without_frames)
+    assert "\rephemeral 2" in "".join(with_frames)
+
+
+def test_frames_pending_written_when_stopping(capsys, monkeypatch, log_filepath):
+    """The pending output is written when the printer stops."""
+    monkeypatch.setattr(messages, "_get_terminal_width", lambda: 20)
+    monkeypatch.setattr(messages, "_FRAME_INTERVAL", 10)
+    printer = _Printer(log_filepath, plain_output=False)
+    printer.show(sys.stdout, "text 1", end_line=True)
+    printer.show(sys.stdout, "text 2")
+    out, _ = capsys.readouterr()
+    assert out == "text 1" + " " * 13 + "\n"
+
+    printer.stop()
+    out, _ = capsys.readouterr()
+    assert out == "text 2" + " " * 13 + "\n"
+
+
+def test_frames_syscalls_per_100k_lines(monkeypatch, log_filepath):
+    """Measure how many writes are done for 100k lines (as in a verbose subprocess output)."""
+    monkeypatch.setattr(messages, "_get_terminal_width", lambda: 80)
+    monkeypatch.setattr(messages, "_FRAME_INTERVAL", 10)
+    printer = _Printer(log_filepath)
+    stream = CountingStream()
+    for idx in range(100_000):
+        msg = _MessageInfo(stream, f":: line {idx}", end_line=True)
+        printer._write_line(msg)
+        printer.prv_msg = msg
+    printer.screen_writer.flush()
+
+    # without frames it would be two writes (and flushes) per line; with them, one per
+    # buffer size (the whole output is ~8 MB)
+    assert len(stream.chunks) == stream.flushes
+    assert len(stream.chunks) < 150
+    assert "".join(stream.chunks).count("\n") == 100_000
+
+
+@pytest.mark.parametrize("end_line", [False, True])
+def test_single_write_writeline(monkeypatch, log_filepath, end_line):
+    """A line completing the previous one in the same stream is written at once."""
+    monkeypatch.setattr(messages, "_get_terminal_width", lambda: 20)
+    printer = _Printer(log_filepath)
+    stream = CountingStream()
+    printer.prv_msg = _MessageInfo(stream, "previous text")
+    printer._write_line(_MessageInfo(stream, "test text", end_line=end_line))
+
+    expected = "\ntest text" + " " * 10 + ("\n" if end_line else "")
+    assert stream.chunks == [expected]
+    assert stream.flushes == 1
+
+
+def test_single_write_writeline_other_stream(monkeypatch, log_filepath):
+    """Completing the previous line in other stream needs a write there."""
+    monkeypatch.setattr(messages, "_get_terminal_width", lambda: 20)
+    printer = _Printer(log_filepath)
+    stream_1 = CountingStream()
+    stream_2 = CountingStream()
+    printer.prv_msg = _MessageInfo(stream_1, "previous text")
+    printer._write_line(_MessageInfo(stream_2, "test text", end_line=True))
+
+    assert stream_1.chunks == ["\n"]
+    assert stream_2.chunks == ["test text" + " " * 10 + "\n"]
+
+
+def test_single_write_spin_and_bar(monkeypatch, log_filepath):
+    """A spinner tick or a progress bar cost one write."""
+    monkeypatch.setattr(messages, "_get_terminal_width", lambda: 40)
+    printer = _Printer(log_filepath)
+    stream = CountingStream()
+    msg = _MessageInfo(stream, "test text")
+    printer._write_line(msg)
+    printer.prv_msg = msg
+    printer._write_line(msg, spintext=" - (2.1s)")
+    printer._write_bar(_MessageInfo(stream, "test text", bar_progress=5, bar_total=10))
+
+    assert len(stream.chunks) == stream.flushes == 3
+    assert stream.chunks[1].startswith("\rtest text - (2.1s)")
+    assert stream.chunks[2].startswith("\ntest text [")
+
+
 # -- tests for the logging handling
 
 
@@ -670,15 +1073,44 @@ def test_show_when_stopped(recording_printer):
 
 
 def test_init_printer_ok(log_filepath):
-    """Printer is initiated as usual."""
+    """Printer is initiated as usual, the spinner is not started yet."""
+    printer = _Printer(log_filepath)
+    assert not printer.spinner.is_alive()
+
+
+def test_spinner_started_on_terminal(log_filepath, monkeypatch):
+    """The spinner is started when a message is shown in a terminal."""
+    monkeypatch.setattr(sys.stderr, "isatty", lambda: True)
     printer = _Printer(log_filepath)
+    printer.show(sys.stderr, "test text")
     assert printer.spinner.is_alive()
 
+    # the same spinner is kept for further messages
+    spinner = printer.spinner
+    printer.show(sys.stderr, "test text")
+    assert printer.spinner is spinner
+    assert spinner.is_alive()
 
-def test_init_printer_testmode(log_filepath, monkeypatch):
-    """Printer is initiated as usual."""
+
+@pytest.mark.parametrize("stream", [None, sys.stdout, sys.stderr])
+def test_spinner_not_started_without_terminal(log_filepath, monkeypatch, stream):
+    """The spinner is never started if messages don't go to a terminal."""
+    monkeypatch.setattr(sys.stdout, "isatty", lambda: False)
+    monkeypatch.setattr(sys.stderr, "isatty", lambda: False)
+    printer = _Printer(log_filepath)
+    printer.show(stream, "test text")
+    printer.progress_bar(stream, "test text", 20, 100)
+    printer.stop()
+    assert not printer.spinner.is_alive()
+    assert printer.spinner.prv_msg is None
+
+
+def test_spinner_not_started_testmode(log_filepath, monkeypatch):
+    """The spinner is never started in test mode, even in a terminal."""
     monkeypatch.setattr(messages, "TESTMODE", True)
+    monkeypatch.setattr(sys.stderr, "isatty", lambda: True)
     printer = _Printer(log_filepath)
+    printer.show(sys.stderr, "test text")
     assert not printer.spinner.is_alive()
 
 
@@ -715,17 +1147,99 @@ def test_stop_streams_unfinished_err(capsys, log_filepath):
     assert err == "\n"
 
 
-def test_stop_spinner_ok(log_filepath):
+def test_stop_spinner_ok(log_filepath, monkeypatch):
     """Stop the spinner."""
+    monkeypatch.setattr(sys.stderr, "isatty", lambda: True)
     printer = _Printer(log_filepath)
+    printer.show(sys.stderr, "test text")
     assert printer.spinner.is_alive()
     printer.stop()
     assert not printer.spinner.is_alive()
 
 
+def test_stop_spinner_not_started(log_filepath):
+    """Stopping is fine if the spinner was never started."""
+    printer = _Printer(log_filepath)
+    printer.stop()
+    assert not printer.spinner.is_alive()
+    assert printer.stopped
+
+
 def test_stop_spinner_testmode(log_filepath, monkeypatch):
     """Stop the spinner."""
     monkeypatch.setattr(messages, "TESTMODE", True)
     printer = _Printer(log_filepath)
     printer.stop()
     assert not printer.spinner.is_alive()
+
+
+# -- tests for showing several lines at once
+
+
+def test_writeline_multiline(capsys, monkeypatch, log_filepath):
+    """All the lines of a multiline message are completed."""
+    monkeypatch.setattr(messages, "_get_terminal_width", lambda: 20)
+    printer = _Printer(log_filepath)
+
+    msg = _MessageInfo(sys.stdout, "first line\nsecond line")
+    printer._write_line(msg)
+
+    out, _ = capsys.readouterr()
+    assert out == "first line" + " " * 9 + "\n" + "second line" + " " * 8
+
+
+def test_show_lines_terminal(capsys, monkeypatch, log_filepath):
+    """Several lines are written to the screen and the log, once each."""
+    monkeypatch.setattr(messages, "_get_terminal_width", lambda: 20)
+    printer = _Printer(log_filepath, plain_output=False)
+    with patch.object(printer, "_write_line", wraps=printer._write_line) as write_mock:
+        printer.show_lines(sys.stderr, ["line 1  ", "line 2"])
+    printer.stop()
+
+    assert write_mock.call_count == 1
+    _, err = capsys.readouterr()
+    assert err == "line 1" + " " * 13 + "\n" + "line 2" + " " * 13 + "\n"
+    log_lines = log_filepath.read_text().splitlines()
+    assert [line[24:] for line in log_lines] == ["line 1", "line 2"]
+
+
+def test_show_lines_timestamp(capsys, log_filepath):
+    """All the lines shown get the same timestamp."""
+    printer = _Printer(log_filepath, plain_output=True)
+    printer.show_lines(sys.stderr, ["line 1", "line 2"], use_timestamp=True)
+    printer.stop()
+
+    _, err = capsys.readouterr()
+    timestamp = log_filepath.read_text()[:23]
+    assert err == f"{timestamp} line 1\n{timestamp} line 2\n"
+
+
+def test_show_lines_different_log(capsys, log_filepath):
+    """Different lines can be sent to the log."""
+    printer = _Printer(log_filepath, plain_output=True)
+    printer.show_lines(sys.stderr, ["short"], log_lines=["long 1", "long 2"])
+    printer.stop()
+
+    _, err = capsys.readouterr()
+    assert err == "short\n"
+    log_lines = log_filepath.read_text().splitlines()
+    assert [line[24:] for line in log_lines] == ["long 1", "long 2"]
+
+
+def test_show_lines_no_stream(capsys, log_filepath):
+    """Without stream the lines are only logged."""
+    printer = _Printer(log_filepath)
+    printer.show_lines(None, ["line 1", "line 2"])
+    printer.stop()
+
+    assert capsys.readouterr() == ("", "")
+    log_lines = log_filepath.read_text().splitlines()
+    assert [line[24:] for line in log_lines] == ["line 1", "line 2"]
+
+
+def test_show_lines_when_stopped(capsys, log_filepath):
+    """Noop after stopping."""
+    printer = _Printer(log_filepath)
+    printer.stop()
+    printer.show_lines(sys.stderr, ["line 1"])
+    assert capsys.readouterr() == ("", "")
@@ -17,6 +17,9 @@
 """Tests that check the stream context manager and auxiliary class."""
 
 import os
+import pathlib
+import re
+import selectors
 import sys
 import threading
 import time
@@ -24,7 +27,7 @@ import time
 import pytest
 
 from craft_cli import messages
-from craft_cli.messages import _PipeReaderThread, _StreamContextManager
+from craft_cli.messages import _PipeReaderThread, _ScreenFeeder, _StreamContextManager
 
 
 @pytest.fixture(autouse=True)
@@ -145,3 +148,289 @@ def test_pipereader_chunk_assembler(recording_printer, monkeypatch):
     msg1, msg2 = recording_printer.written_lines
     assert msg1.text == ":: ------abcde---"
     assert msg2.text == ":: otherline---"
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="the stop is signalled differently")
+def test_pipereader_stop_remaining(recording_printer):
+    """Stopping writes all the remaining data, and finishes the thread."""
+    prt = _PipeReaderThread(recording_printer, sys.stdout)
+    prt.start()
+    os.write(prt.write_pipe, b"".join(b"line %d\n" % idx for idx in range(1000)))
+    prt.stop()
+
+    assert len(recording_printer.written_lines) == 1000
+    assert recording_printer.written_lines[-1].text == ":: line 999"
+    assert not prt.is_alive()
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="the stop is signalled differently")
+def test_pipereader_stop_latency(recording_printer):
+    """Stopping an idle reader returns right away, without waiting for a poll timeout."""
+    # the best of several stops is used, so a loaded machine doesn't make it fail, but it
+    # is still well below the 100 ms of the previous polling
+    latencies = []
+    for _ in range(5):
+        prt = _PipeReaderThread(recording_printer, sys.stdout)
+        prt.start()
+        os.write(prt.write_pipe, b"line\n")
+        time.sleep(0.01)  # let the thread process the line and get back to wait
+
+        start = time.monotonic()
+        prt.stop()
+        latencies.append(time.monotonic() - start)
+
+    assert min(latencies) < 0.05
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="the stop is signalled differently")
+def test_pipereader_no_idle_wakeups(recording_printer, monkeypatch):
+    """The thread does not wake up when there is nothing to read."""
+    waits = []
+
+    class RecordingSelector(selectors.DefaultSelector):  # type: ignore
+        def select(self, timeout=None):
+            waits.append(timeout)
+            return super().select(timeout)
+
+    monkeypatch.setattr(messages.selectors, "DefaultSelector", RecordingSelector)
+    prt = _PipeReaderThread(recording_printer, sys.stdout)
+    prt.start()
+    time.sleep(0.3)
+    os.write(prt.write_pipe, b"line\n")
+    time.sleep(0.05)
+    prt.stop()
+
+    # one wait for the line, other for the stop; never with a timeout
+    assert waits == [None, None]
+    (msg,) = recording_printer.written_lines  # pylint: disable=unbalanced-tuple-unpacking
+    assert msg.text == ":: line"
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="the stop is signalled differently")
+def test_pipereader_pipes_closed(recording_printer):
+    """All the pipes are closed after stopping, which can be done more than once."""
+    prt = _PipeReaderThread(recording_printer, sys.stdout)
+    prt.start()
+    prt.stop()
+    prt.stop()
+
+    for fd in (prt.read_pipe, prt.write_pipe, prt.stop_read_pipe, prt.stop_write_pipe):
+        with pytest.raises(OSError):
+            os.fstat(fd)
+
+
+def test_pipereader_long_line_split(recording_printer):
+    """A line longer than the max is shown truncated, and logged in continuation segments."""
+    prt = _PipeReaderThread(recording_printer, sys.stdout, max_line_length=10)
+    prt.start()
+    os.write(prt.write_pipe, b"0123456789abcdefghijABCDE\nshort\n")
+    prt.stop()
+
+    shown = [msg.text for msg in recording_printer.written_lines]
+    assert shown == [":: 0123456789", ":: [15 bytes truncated]", ":: short"]
+    logged = [msg.text for msg in recording_printer.logged]
+    assert logged == [":: 0123456789", ":+ abcdefghij", ":+ ABCDE", ":: short"]
+
+
+def test_pipereader_long_line_in_chunks(recording_printer, monkeypatch):
+    """The memory used does not depend on the line length, even if it comes in chunks."""
+    monkeypatch.setattr(messages, "_PIPE_READER_CHUNK_SIZE", 4)
+    prt = _PipeReaderThread(recording_printer, None, max_line_length=10)
+
+    # feed it directly to check the kept content after each chunk
+    kept_sizes = []
+    for _ in range(100):
+        prt._write(b"abc")
+        kept_sizes.append(len(prt.assembler.remaining))
+    prt._write(b"\n")
+
+    assert max(kept_sizes) <= 10
+    logged = [msg.text for msg in recording_printer.logged]
+    assert logged[0] == ":: abcabcabca"
+    assert all(text.startswith(":+ ") for text in logged[1:])
+    assert "".join(text[3:] for text in logged) == "abc" * 100
+    assert recording_printer.written_lines == []
+
+
+def test_pipereader_long_line_multibyte(recording_printer):
+    """Segments are not cut in the middle of a multi-byte character."""
+    prt = _PipeReaderThread(recording_printer, None, max_line_length=4)
+    prt._write("aaañññ\n".encode("utf8"))
+
+    logged = [msg.text for msg in recording_printer.logged]
+    assert logged == [":: aaa", ":+ ññ", ":+ ñ"]
+
+
+def test_pipereader_long_line_no_boundary(recording_printer):
+    """Segments cut in the middle of a character (no boundary to use) are still written."""
+    prt = _PipeReaderThread(recording_printer, None, max_line_length=2)
+    prt._write("😀\n".encode("utf8"))
+
+    logged = [msg.text for msg in recording_printer.logged]
+    assert logged == [":: \ufffd", ":+ \ufffd\ufffd"]
+
+
+def test_pipereader_long_line_unfinished(recording_printer):
+    """A long line not finished when the pipe reader stops is still completed."""
+    prt = _PipeReaderThread(recording_printer, sys.stdout, max_line_length=5)
+    prt.start()
+    os.write(prt.write_pipe, b"0123456789abc")
+    prt.stop()
+
+    shown = [msg.text for msg in recording_printer.written_lines]
+    assert shown == [":: 01234", ":: [8 bytes truncated]"]
+    logged = [msg.text for msg in recording_printer.logged]
+    assert logged == [":: 01234", ":+ 56789", ":+ abc"]
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="the pipe is drained differently")
+def test_pipereader_not_blocked_by_screen(recording_printer, monkeypatch):
+    """A slow screen does not stop the pipe from being drained into the log."""
+    release = threading.Event()
+    written = []
+
+    def slow_write_line(message, *, spintext=None):
+        release.wait()
+        written.append(message.text)
+
+    monkeypatch.setattr(recording_printer, "_write_line", slow_write_line)
+    prt = _PipeReaderThread(recording_printer, sys.stdout)
+    prt.start()
+
+    # more than what fits in the OS pipe buffer, this would block if the pipe is not drained
+    os.write(prt.write_pipe, b"".join(b"line %d\n" % idx for idx in range(20000)))
+    for _ in range(500):
+        queue = prt.screen_feeder.queue
+        if len(recording_printer.logged) == 20000 and queue and queue[-1] == ":: line 19999":
+            break
+        time.sleep(0.01)
+    assert len(recording_printer.logged) == 20000
+    assert written == []
+
+    release.set()
+    prt.stop()
+    assert written[-1] == ":: line 19999"
+    # the whole queue, plus the line being shown when blocked and up to two omitted markers
+    # (before and after that line)
+    assert len(written) <= messages._SCREEN_QUEUE_SIZE + 3
+
+
+# -- tests for the screen feeder
+
+
+def test_screenfeeder_shows_lines(recording_printer):
+    """The queued lines are shown in order, without logging them."""
+    feeder = _ScreenFeeder(recording_printer, sys.stdout)
+    feeder.start()
+    feeder.put(":: line 1")
+    feeder.put(":: line 2")
+    feeder.stop()
+
+    msg1, msg2 = recording_printer.written_lines
+    assert msg1.text == ":: line 1"
+    assert msg1.stream == sys.stdout
+    assert msg1.use_timestamp is True
+    assert msg1.end_line is True
+    assert msg2.text == ":: line 2"
+    assert recording_printer.logged == []
+
+
+def test_screenfeeder_drops_oldest(recording_printer):
+    """If the queue is full the oldest lines are dropped, showing how many instead."""
+    feeder = _ScreenFeeder(recording_printer, sys.stdout, queue_size=3)
+    for idx in range(4216):
+        feeder.put(f":: line {idx}")
+    feeder.start()
+    feeder.stop()
+
+    shown = [msg.text for msg in recording_printer.written_lines]
+    assert shown == [
+        ":: … 4,213 lines omitted, see log",
+        ":: line 4213",
+        ":: line 4214",
+        ":: line 4215",
+    ]
+    assert recording_printer.logged == []
+
+
+def test_screenfeeder_stop_without_start(recording_printer):
+    """It can be stopped even if not started."""
+    feeder = _ScreenFeeder(recording_printer, sys.stdout)
+    feeder.stop()
+    assert recording_printer.written_lines == []
+
+
+# -- tests for the raw capture
+
+
+@pytest.fixture
+def log_printer(tmp_path):
+    """Provide a real printer, to check what is written in the log."""
+    printer = messages._Printer(tmp_path / "test.log")
+    yield printer
+    if not printer.stopped:
+        printer.stop()
+
+
+def get_log_lines(printer):
+    """Return the lines in the printer's log file, as bytes."""
+    return pathlib.Path(printer.log.name).read_bytes().split(b"\n")
+
+
+def test_pipereader_raw_capture_only_without_stream(recording_printer):
+    """The raw capture is only used if the output is not shown."""
+    assert _PipeReaderThread(recording_printer, None, raw_capture=True).raw_capture
+    assert not _PipeReaderThread(recording_printer, sys.stderr, raw_capture=True).raw_capture
+    assert not _PipeReaderThread(recording_printer, None).raw_capture
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="raw capture is not supported")
+@pytest.mark.parametrize("splice_available", [True, False])
+def test_pipereader_raw_capture(log_printer, monkeypatch, splice_available):
+    """The output is moved as is to the log, between descriptive records."""
+    if splice_available and not hasattr(os, "splice"):
+        pytest.skip("splice not available")
+    monkeypatch.setattr(messages, "_SPLICE_AVAILABLE", splice_available)
+    monkeypatch.setattr(messages, "_RAW_CAPTURE_CHUNK_SIZE", 7)
+
+    prt = _PipeReaderThread(log_printer, None, raw_capture=True)
+    prt.start()
+    os.write(prt.write_pipe, b"first line\n")
+    os.write(prt.write_pipe, b"not utf8: \xff\nunfinished")
+    prt.stop()
+    log_printer.show(None, "other message")
+    log_printer.stop()
+
+    log_lines = get_log_lines(log_printer)
+    mode = b"splice" if splice_available else b"copy"
+    assert log_lines[0].endswith(b" :: Capturing the raw output in the log (mode: " + mode + b")")
+    assert log_lines[1:4] == [b"first line", b"not utf8: \xff", b"unfinished"]
+    assert re.match(rb".* :: Raw output captured: 33 bytes in \d+\.\d\d\d seconds$", log_lines[4])
+    assert log_lines[5].endswith(b" other message")
+    assert prt.raw_captured == 33
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="raw capture is not supported")
+def test_pipereader_raw_capture_empty(log_printer):
+    """Nothing captured."""
+    prt = _PipeReaderThread(log_printer, None, raw_capture=True)
+    prt.start()
+    prt.stop()
+    log_printer.stop()
+
+    log_lines = get_log_lines(log_printer)
+    assert re.match(rb".* :: Capturing the raw output in the log \(mode: \w+\)$", log_lines[0])
+    assert re.match(rb".* :: Raw output captured: 0 bytes in \d+\.\d\d\d seconds$", log_lines[1])
+    assert log_lines[2:] == [b""]
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="raw capture is not supported")
+def test_streamcm_raw_capture(log_printer):
+    """The context manager passes the raw capture option."""
+    with _StreamContextManager(log_printer, "initial text", None, raw_capture=True) as fd:
+        os.write(fd, b"raw output\n")
+    log_printer.stop()
+
+    log_lines = get_log_lines(log_printer)
+    assert log_lines[0].endswith(b" initial text")
+    assert log_lines[2] == b"raw output"
@@ -0,0 +1,97 @@
+# Copyright 2022 Canonical Ltd.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+"""Tests for the full text search."""
+
+import pytest
+
+from craft_cli.search import SearchIndex, tokenize
+
+DOCUMENTS = {
+    "upload": [("upload", 5), ("Upload a charm to the store", 3)],
+    "release": [("release", 5), ("Release a revision to a channel", 3)],
+    "revisions": [("revisions", 5), ("List the revisions in the store", 3)],
+    "login": [("login", 5), ("Login to the store", 3), ("--export file to store credentials", 1)],
+}
+
+
+@pytest.fixture
+def index():
+    """Provide an index for some documents."""
+    return SearchIndex.from_documents(DOCUMENTS)
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("", []),
+        ("Upload a charm", ["upload", "a", "charm"]),
+        ("--export-file, FOO_BAR2", ["export", "file", "foo", "bar2"]),
+    ],
+)
+def test_tokenize(text, expected):
+    """Split the texts in words."""
+    assert tokenize(text) == expected
+
+
+def test_search_simple(index):
+    """Find the documents with the word."""
+    assert index.search("channel") == ["release"]
+
+
+def test_search_nothing(index):
+    """Nothing found."""
+    assert index.search("whatever") == []
+    assert index.search("") == []
+
+
+def test_search_ranked_by_field():
+    """Words in more relevant fields score more."""
+    index = SearchIndex.from_documents({"doc1": [("foo", 1)], "doc2": [("foo bar", 5)]})
+    assert index.search("foo") == ["doc2", "doc1"]
+
+
+def test_search_ranked_by_occurrences(index):
+    """Words found in more fields of the same document score more."""
+    assert index.search("store") == ["login", "revisions", "upload"]
+
+
+def test_search_ranked_by_rarity(index):
+    """Words found in fewer documents are more relevant."""
+    # "store" is in three documents, "login" only in one
+    assert index.search("store login")[0] == "login"
+
+
+def test_search_ranked_by_matched_terms(index):
+    """Documents matching more terms come first."""
+    assert index.search("store charm") == ["upload", "login", "revisions"]
+
+
+def test_search_prefix(index):
+    """Terms also match the words they start, but scoring less."""
+    assert index.search("rev") == ["revisions", "release"]
+    assert index.search("cred") == ["login"]
+
+
+def test_search_case_insensitive(index):
+    """The case doesn't matter."""
+    assert index.search("CHANNEL") == ["release"]
+
+
+def test_serialization(index):
+    """The index can be serialized and loaded."""
+    loaded = SearchIndex.from_json(index.to_json())
+    for query in ["store", "rev", "store charm", "channel"]:
+        assert loaded.search(query) == index.search(query)
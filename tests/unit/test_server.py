@@ -0,0 +1,199 @@
+#
+# Copyright 2022 Canonical Ltd.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+"""Tests for the server mode."""
+
+import os
+import pathlib
+import subprocess
+import sys
+import textwrap
+import threading
+import time
+
+import pytest
+
+from craft_cli import server
+
+pytestmark = pytest.mark.skipif(not hasattr(os, "fork"), reason="POSIX only")
+
+# the application run by the server in the tests
+SERVER_SCRIPT = """
+import os
+import sys
+import time
+
+from craft_cli import EmitterMode, emit, server
+
+
+def main(argv):
+    emit.init(EmitterMode.NORMAL, "testapp", "greeting", log_filepath=argv[0])
+    action = argv[1]
+    if action == "echo":
+        emit.message(" ".join(argv[2:]))
+    elif action == "env":
+        emit.message(f"{os.getcwd()} {os.environ.get('TEST_SERVER_VAR')}")
+    elif action == "sleep":
+        time.sleep(float(argv[2]))
+    elif action == "crash":
+        raise ValueError("boom")
+    elif action == "exit":
+        sys.exit(int(argv[2]))
+    elif action == "die":
+        os._exit(3)
+    emit.ended_ok()
+    if action == "echo":
+        return int(argv[-1])
+    return None
+
+
+server.serve(sys.argv[1], main)
+"""
+
+
+@pytest.fixture
+def server_socket(tmp_path):
+    """Run a server in other process, providing its socket path."""
+    socket_path = tmp_path / "test.sock"
+    script = tmp_path / "server_script.py"
+    script.write_text(SERVER_SCRIPT)
+
+    env = dict(os.environ)
+    env["PYTHONPATH"] = str(pathlib.Path(__file__).parent.parent.parent)
+    proc = subprocess.Popen([sys.executable, str(script), str(socket_path)], env=env)
+    try:
+        for _ in range(500):
+            if socket_path.exists():
+                break
+            time.sleep(0.01)
+        else:
+            pytest.fail("Server didn't start")
+        yield socket_path
+    finally:
+        proc.terminate()
+        proc.wait()
+    assert not socket_path.exists()
+
+
+def test_socket_path(tmp_path, monkeypatch):
+    """The socket is in a per-user directory, created if needed."""
+    runtime_dir = tmp_path / "runtime" / "testapp"
+    monkeypatch.setattr(server.platformdirs, "user_runtime_dir", lambda appname: runtime_dir)
+    socket_path = server.get_socket_path("testapp")
+    assert socket_path == runtime_dir / "testapp.sock"
+    assert runtime_dir.is_dir()
+    assert runtime_dir.stat().st_mode & 0o777 == 0o700
+
+
+def test_client_no_server(tmp_path):
+    """The client tells if the server is not available."""
+    assert server.run_client(tmp_path / "nonexistent.sock", ["whatever"]) is None
+
+
+def test_client_output_and_retcode(server_socket, tmp_path, capfd):
+    """The command runs in the server, writing to the client's streams."""
+    logpath = tmp_path / "test.log"
+    retcode = server.run_client(server_socket, [str(logpath), "echo", "hello", "world", "17"])
+    assert retcode == 17
+
+    out, _ = capfd.readouterr()
+    assert out.startswith("hello world 17")
+
+    # the worker used its own log file
+    assert "hello world 17" in logpath.read_text()
+
+
+def test_client_environment(server_socket, tmp_path, capfd, monkeypatch):
+    """The worker uses the client's environment and current directory."""
+    monkeypatch.setenv("TEST_SERVER_VAR", "test value")
+    monkeypatch.chdir(tmp_path)
+    retcode = server.run_client(server_socket, [str(tmp_path / "test.log"), "env"])
+    assert retcode == 0
+
+    out, _ = capfd.readouterr()
+    assert out.startswith(f"{tmp_path} test value")
+
+
+@pytest.mark.parametrize(
+    "argv, expected_retcode",
+    [
+        (["crash"], 1),
+        (["exit", "5"], 5),
+    ],
+)
+def test_client_worker_failures(server_socket, tmp_path, capfd, argv, expected_retcode):
+    """The return code of workers that crashed or exited is informed."""
+    retcode = server.run_client(server_socket, [str(tmp_path / "test.log")] + argv)
+    assert retcode == expected_retcode
+    if argv == ["crash"]:
+        _, err = capfd.readouterr()
+        assert "ValueError: boom" in err
+
+
+def test_client_worker_died(server_socket, tmp_path, capfd):
+    """The client reports a worker that ended without sending the return code."""
+    retcode = server.run_client(server_socket, [str(tmp_path / "test.log"), "die"])
+    assert retcode == 1
+    _, err = capfd.readouterr()
+    assert "The application server ended the request unexpectedly." in err
+
+
+def test_client_concurrent_requests(server_socket, tmp_path):
+    """Requests run concurrently in different workers."""
+    retcodes = []
+
+    def run(index):
+        logpath = str(tmp_path / f"test-{index}.log")
+        retcodes.append(server.run_client(server_socket, [logpath, "sleep", "1"]))
+
+    threads = [threading.Thread(target=run, args=(index,)) for index in range(3)]
+    t_start = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert time.monotonic() - t_start < 2.5
+    assert retcodes == [0, 0, 0]
+
+
+def test_serve_replaces_stale_socket(tmp_path, monkeypatch):
+    """A leftover socket file is removed when starting."""
+    socket_path = tmp_path / "test.sock"
+    socket_path.write_text("stale")
+
+    def fake_accept(self):
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(server.socket.socket, "accept", fake_accept)
+    monkeypatch.setattr(server.signal, "signal", lambda *args: None)
+    with pytest.raises(KeyboardInterrupt):
+        server.serve(socket_path, lambda argv: None)
+
+    # the socket was cleaned when quitting
+    assert not socket_path.exists()
+
+
+def test_serve_only_posix(monkeypatch, tmp_path):
+    """The server mode needs fork."""
+    monkeypatch.delattr(server.os, "fork")
+    with pytest.raises(RuntimeError) as exc_cm:
+        server.serve(tmp_path / "test.sock", lambda argv: None)
+    assert str(exc_cm.value) == "The server mode is only supported in POSIX systems."
+
+
+def test_script_is_valid():
+    """Keep the server script used in these tests valid Python."""
+    compile(textwrap.dedent(SERVER_SCRIPT), "server_script", "exec")
@@ -0,0 +1,337 @@
+# Copyright 2022 Canonical Ltd.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+"""Tests for the log sinks."""
+
+import logging
+import os
+import socket
+import sys
+import threading
+from datetime import datetime
+
+import pytest
+
+from craft_cli import messages, sinks
+from craft_cli.sinks import LogSink, SinkRecord, SinkWorker, SyslogSink
+
+
+class RecordingSink(LogSink):
+    """A sink that keeps the written batches."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.batches = []
+        self.calls = []
+
+    def open(self):
+        self.calls.append("open")
+
+    def write(self, records):
+        self.batches.append(records)
+
+    def close(self):
+        self.calls.append("close")
+
+
+class BrokenSink(LogSink):
+    """A sink that always fails to write."""
+
+    def write(self, records):
+        raise OSError("broken")
+
+
+def get_record(text, level=logging.INFO):
+    """Build a record."""
+    return SinkRecord(created_at=datetime.now(), text=text, kind="message", level=level)
+
+
+# -- tests for the sink worker
+
+
+def test_worker_writes_in_batches(monkeypatch):
+    """The queued records are written in batches, opening and closing the sink."""
+    monkeypatch.setattr(sinks, "SINK_BATCH_SIZE", 2)
+    sink = RecordingSink()
+    worker = SinkWorker(sink)
+    records = [get_record(f"text {idx}") for idx in range(5)]
+    for record in records:
+        worker.put(record)
+    worker.start()
+    worker.stop()
+    worker.wait(timeout=10)
+
+    assert sink.batches == [records[0:2], records[2:4], records[4:5]]
+    assert sink.calls == ["open", "close"]
+    assert worker.get_report() is None
+
+
+def test_worker_level_filter():
+    """Only the records of the sink's level or above are sent to it."""
+    sink = RecordingSink(level=logging.WARNING)
+    worker = SinkWorker(sink)
+    worker.put(get_record("debug", logging.DEBUG))
+    worker.put(get_record("warning", logging.WARNING))
+    worker.put(get_record("error", logging.ERROR))
+    worker.start()
+    worker.stop()
+    worker.wait(timeout=10)
+
+    (batch,) = sink.batches
+    assert [record.text for record in batch] == ["warning", "error"]
+    assert worker.dropped == 0
+
+
+def test_worker_queue_full():
+    """The records are dropped (not blocking) if the queue is full."""
+    sink = RecordingSink(queue_size=3)
+    worker = SinkWorker(sink)
+    for idx in range(5):
+        worker.put(get_record(f"text {idx}"))
+    worker.start()
+    worker.stop()
+    worker.wait(timeout=10)
+
+    (batch,) = sink.batches
+    assert [record.text for record in batch] == ["text 0", "text 1", "text 2"]
+    assert worker.get_report() == "Log sink RecordingSink: 2 records dropped, 0 failures"
+
+
+def test_worker_write_failures(monkeypatch):
+    """Failed writes drop their records, and too many in a row disable the sink."""
+    monkeypatch.setattr(sinks, "SINK_BATCH_SIZE", 1)
+    worker = SinkWorker(BrokenSink(max_failures=2))
+    for idx in range(5):
+        worker.put(get_record(f"text {idx}"))
+    worker.start()
+    worker.stop()
+    worker.wait(timeout=10)
+
+    assert worker.disabled
+    assert worker.failures == 2
+    assert worker.dropped == 5
+    worker.put(get_record("after disabled"))
+    assert worker.dropped == 6
+    assert worker.get_report() == (
+        "Log sink BrokenSink: 6 records dropped, 2 failures (last error: OSError('broken'))"
+    )
+
+
+def test_worker_open_failure():
+    """If the sink can't be opened it's disabled."""
+
+    class UnopenableSink(RecordingSink):
+        def open(self):
+            raise OSError("no way")
+
+    sink = UnopenableSink()
+    worker = SinkWorker(sink)
+    worker.put(get_record("text"))
+    worker.start()
+    worker.join(timeout=10)
+
+    assert worker.disabled
+    assert sink.batches == []
+    assert worker.get_report() == (
+        "Log sink UnopenableSink: 1 records dropped, 1 failures (last error: OSError('no way'))"
+    )
+
+
+def test_worker_slow_sink_abandoned():
+    """A sink still writing when waited for too long is abandoned."""
+    release = threading.Event()
+
+    class SlowSink(LogSink):
+        def write(self, records):
+            release.wait()
+
+    worker = SinkWorker(SlowSink())
+    worker.put(get_record("text 1"))
+    worker.put(get_record("text 2"))
+    worker.start()
+    worker.stop()
+    worker.wait(timeout=0.05)
+
+    assert worker.is_alive()
+    assert worker.disabled
+    assert worker.get_report() == (
+        "Log sink SlowSink: 0 records dropped, 1 failures "
+        "(last error: TimeoutError('the sink took too long to finish'))"
+    )
+    release.set()
+    worker.join()
+
+
+def test_sink_write_not_implemented():
+    """Sinks must implement the writing."""
+    with pytest.raises(NotImplementedError):
+        LogSink().write([])
+
+
+# -- tests for the integration with the printer
+
+
+def test_printer_sends_records(tmp_path):
+    """The printer sends all the logged records to the sinks, with their kind and level."""
+    sink = RecordingSink()
+    printer = messages._Printer(tmp_path / "test.log", log_sinks=[sink])
+    printer.show(None, "test message")
+    printer.show(None, "test trace", kind="trace")
+    printer.show(None, "test logging", kind="logging", level=logging.WARNING)
+    printer.show(None, "not logged", avoid_logging=True)
+    printer.show_lines(None, ["line 1", "line 2"], kind="error")
+    printer.stop()
+
+    records = [record for batch in sink.batches for record in batch]
+    assert [(record.text, record.kind, record.level) for record in records] == [
+        ("test message", "message", logging.INFO),
+        ("test trace", "trace", logging.DEBUG),
+        ("test logging", "logging", logging.WARNING),
+        ("line 1", "error", logging.ERROR),
+        ("line 2", "error", logging.ERROR),
+    ]
+    assert all(isinstance(record.created_at, datetime) for record in records)
+    assert sink.calls == ["open", "close"]
+
+
+def test_printer_reports_problems(tmp_path):
+    """The problems of the sinks are reported in the log file when stopping."""
+    log_filepath = tmp_path / "test.log"
+    printer = messages._Printer(log_filepath, log_sinks=[BrokenSink(max_failures=1)])
+    printer.show(None, "test message")
+    printer.stop()
+
+    log_lines = log_filepath.read_text().splitlines()
+    assert log_lines[0].endswith(" test message")
+    assert log_lines[1].endswith(
+        " Log sink BrokenSink: 1 records dropped, 1 failures (last error: OSError('broken'))"
+    )
+
+
+# -- tests for the syslog sink
+
+
+@pytest.fixture
+def syslog_socket(tmp_path):
+    """Provide a local stand-in for the syslog socket."""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    sock.bind(str(tmp_path / "log"))
+    sock.settimeout(5)
+    yield sock
+    sock.close()
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="no UNIX datagram sockets")
+@pytest.mark.parametrize(
+    "level, severity",
+    [
+        (logging.CRITICAL, 2),
+        (logging.ERROR, 3),
+        (logging.WARNING, 4),
+        (logging.INFO, 6),
+        (logging.DEBUG, 7),
+        (5, 7),
+    ],
+)
+def test_syslog_datagram(syslog_socket, level, severity):
+    """Each record is sent as a datagram with the level, appname, pid and kind."""
+    sink = SyslogSink("testapp", path=syslog_socket.getsockname())
+    sink.open()
+    created_at = datetime(2022, 3, 4, 5, 6, 7)
+    record = SinkRecord(created_at=created_at, text="test text", kind="trace", level=level)
+    sink.write([record])
+    sink.close()
+
+    datagram = syslog_socket.recv(4096)
+    priority = 8 + severity  # the "user" facility
+    expected = f"<{priority}>Mar  4 05:06:07 testapp[{os.getpid()}]: [trace] test text"
+    assert datagram == expected.encode("utf8")
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="no UNIX datagram sockets")
+def test_syslog_facility_and_truncation(syslog_socket, monkeypatch):
+    """The facility can be specified, and too long messages are truncated."""
+    monkeypatch.setattr(sinks, "SYSLOG_MAX_MESSAGE_SIZE", 40)
+    sink = SyslogSink("testapp", path=syslog_socket.getsockname(), facility=16)
+    sink.open()
+    sink.write([get_record("x" * 100)])
+    sink.close()
+
+    datagram = syslog_socket.recv(4096)
+    assert len(datagram) == 40
+    assert datagram.startswith(b"<134>")
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="no UNIX datagram sockets")
+def test_syslog_batch(syslog_socket):
+    """All the records in the batch are sent."""
+    sink = SyslogSink("testapp", path=syslog_socket.getsockname())
+    sink.open()
+    sink.write([get_record(f"text {idx}") for idx in range(3)])
+    sink.close()
+
+    datagrams = [syslog_socket.recv(4096) for _ in range(3)]
+    assert [datagram.split(b"] ")[-1] for datagram in datagrams] == [
+        b"text 0",
+        b"text 1",
+        b"text 2",
+    ]
+    assert sink.dropped == 0
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="no UNIX datagram sockets")
+def test_syslog_not_blocking(syslog_socket):
+    """If the socket is full the records are dropped, never blocking."""
+    sink = SyslogSink("testapp", path=syslog_socket.getsockname())
+    sink.open()
+    records = [get_record("x" * 1000) for _ in range(1000)]
+    for _ in range(10):
+        batch, records = records[:100], records[100:]
+        sink.write(batch)
+    sink.close()
+
+    received = 0
+    syslog_socket.setblocking(False)
+    while True:
+        try:
+            syslog_socket.recv(4096)
+        except BlockingIOError:
+            break
+        received += 1
+    assert sink.dropped > 0
+    assert received + sink.dropped == 1000
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="no UNIX datagram sockets")
+def test_syslog_no_socket(tmp_path):
+    """If the socket can't be used the sink fails to open."""
+    sink = SyslogSink("testapp", path=str(tmp_path / "missing"))
+    with pytest.raises(OSError):
+        sink.open()
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="no UNIX datagram sockets")
+def test_syslog_drops_reported(syslog_socket, tmp_path):
+    """The records dropped by the sink are reported in the log file at the end."""
+    log_filepath = tmp_path / "test.log"
+    sink = SyslogSink("testapp", path=syslog_socket.getsockname())
+    printer = messages._Printer(log_filepath, log_sinks=[sink])
+    for idx in range(1000):
+        printer.show(None, "x" * 1000)
+    printer.stop()
+
+    assert sink.dropped > 0
+    last_line = log_filepath.read_text().splitlines()[-1]
+    assert last_line.endswith(f" Log sink SyslogSink: {sink.dropped} records dropped, 0 failures")
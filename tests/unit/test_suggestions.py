@@ -0,0 +1,89 @@
+# Copyright 2022 Canonical Ltd.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+"""Tests for the suggestions of similar words."""
+
+import difflib
+import itertools
+
+import pytest
+
+from craft_cli.suggestions import SuggestionIndex, join_suggestions
+
+
+@pytest.mark.parametrize(
+    "word, expected",
+    [
+        ("buld", ["build"]),
+        ("biuld", ["build"]),
+        ("lgo", ["log"]),
+        ("uplod", ["upload"]),
+        ("status", ["status"]),
+        ("zzzzzz", []),
+    ],
+)
+def test_suggest_simple(word, expected):
+    """Suggest the similar words."""
+    index = SuggestionIndex(["build", "clean", "log", "upload", "status", "login"])
+    assert index.suggest(word) == expected
+
+
+def test_suggest_ranked():
+    """The best suggestions come first."""
+    index = SuggestionIndex(["--output", "--outputs", "--out", "--other"])
+    assert index.suggest("--outpt") == ["--output", "--outputs", "--out"]
+
+
+def test_suggest_limit():
+    """No more than the indicated quantity of suggestions is returned."""
+    index = SuggestionIndex(["abcdefg", "abcdefh", "abcdefi"])
+    assert index.suggest("abcef", limit=2) == ["abcdefi", "abcdefh"]
+
+
+def test_suggest_tied_candidates():
+    """Candidates tied in shared trigrams beyond the cap are chosen deterministically."""
+    words = [f"cmd{idx:02d}" for idx in range(50)]
+    for order in (words, words[::-1]):
+        index = SuggestionIndex(order)
+        assert index.suggest("cmd") == ["cmd49", "cmd48", "cmd47"]
+    assert index.suggest("cmd") == difflib.get_close_matches("cmd", words)
+
+
+def test_suggest_empty_index():
+    """Nothing to suggest if there are no words."""
+    assert SuggestionIndex([]).suggest("foo") == []
+
+
+def test_suggest_same_as_difflib():
+    """The suggestions are the same than difflib's, for a lot of commands."""
+    verbs = ["list", "create", "remove", "upload", "release", "close", "register", "status"]
+    nouns = ["snap", "charm", "bundle", "track", "revision", "resource", "library", "key"]
+    words = [f"{verb}-{noun}" for verb, noun in itertools.product(verbs, nouns)]
+    index = SuggestionIndex(words)
+    for word in ["list-snaps", "upolad-charm", "remve-key", "relase", "stauts-track", "xyz"]:
+        assert index.suggest(word) == difflib.get_close_matches(word, words)
+
+
+@pytest.mark.parametrize(
+    "similar, expected",
+    [
+        (["foo"], "'foo'"),
+        (["foo", "bar"], "'foo' or 'bar'"),
+        (["foo", "bar", "baz"], "'foo', 'bar' or 'baz'"),
+    ],
+)
+def test_join_suggestions(similar, expected):
+    """Join the suggestions in a text."""
+    assert join_suggestions(similar) == expected